@@ -0,0 +1,394 @@
+"""Compile planner fan-outs into single server-side bulk operations.
+
+Runs between the planner and the executor. Plans often spell a set-wide
+change as "list things, then change each one", which the executor would turn
+into one API call (and one transaction) per row. `compile_plan` recognises
+these shapes and replaces them with one bulk step:
+
+- room price/capacity updates over all rooms, a floor, or a list of room
+  numbers -> `bulk_update_rooms` (PUT /rooms/bulk)
+- status changes over a student's payments -> `bulk_set_payment_status`
+  (PUT /payments/bulk-status)
+- room assignment for every unassigned student -> `allocate_rooms`
+  (POST /rooms/allocate)
+
+Both plan formats are handled: text steps ("List all rooms", "Update each
+room price to 32000") and structured steps whose parameters reference a
+`list_rooms` / `list_students` / `payments_by_name` step ("$s1.*.room_no").
+Listing steps that only fed the fan-out are dropped.
+
+Bulk steps change many rows at once, so the executor does not run them
+directly: it `hold`s them for the session and asks for one confirmation
+("confirm bulk <id>"), which `take_confirmation` recognises on the next
+message.
+"""
+import re
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import tools as t
+
+BULK_TOOLS = {
+    "bulk_update_rooms": t.bulk_update_rooms,
+    "bulk_set_payment_status": t.bulk_set_payment_status,
+    "allocate_rooms": t.allocate_rooms,
+}
+
+_ARITH = re.compile(r"(\d+(?:\.\d+)?)\s*([*+/-])\s*(\d+(?:\.\d+)?)")
+_REF = re.compile(r"^\$([A-Za-z_][\w-]*)")
+
+
+def _arith(text: str) -> Optional[float]:
+    """Value of the first "a <op> b" expression in text."""
+    match = _ARITH.search(text)
+    if not match:
+        return None
+    a, op, b = float(match.group(1)), match.group(2), float(match.group(3))
+    if op == "/" and b == 0:
+        return None
+    value = {"*": a * b, "+": a + b, "-": a - b, "/": a / b}[op]
+    return int(value) if value == int(value) else value
+
+
+def room_filter(text: str) -> Dict[str, Any]:
+    """RoomBulkFilter for a room update described in text; empty means every room."""
+    text = text.lower()
+    floor = re.search(r"\b(ground|[a-z]|\d+)(?:st|nd|rd|th)?\s+floor\b", text) \
+        or re.search(r"\bfloor\s+([a-z]|\d+)\b", text)
+    if floor:
+        return {"floor": "G" if floor.group(1) in ("ground", "g") else floor.group(1).upper()}
+    rooms = re.search(r"\brooms?\s+((?:[a-z]?\d+(?:\s*,\s*|\s+and\s+|\s*$|\s+))+)", text)
+    if rooms and not re.search(r"\b(?:all|each|every)\s+rooms?\b", text):
+        room_nos = [room.upper() for room in re.findall(r"[a-z]?\d+", rooms.group(1))]
+        if room_nos:
+            return {"room_nos": room_nos}
+    return {}
+
+
+def _room_patch(text: str, computed_values: Dict[str, Any], user_input: str) -> Optional[Dict[str, Any]]:
+    """RoomBulkPatch for a room update described in text, or None if no value is known yet."""
+    lower = text.lower()
+    percent = re.search(r"(\d+(?:\.\d+)?)\s*(?:%|percent)", lower)
+    if percent:
+        sign = -1 if re.search(r"\b(?:decrease|reduce|lower|cut|drop)\b", lower) else 1
+        return {"price_change_percent": sign * float(percent.group(1))}
+    capacity = re.search(r"capacity\D{0,12}(\d+)", lower)
+    if capacity and "price" not in lower:
+        return {"capacity": int(capacity.group(1))}
+    price = computed_values.get("price")
+    # Only look after "price" so room ranges such as "101-105" are not read as arithmetic
+    amount = lower[lower.find("price"):] if "price" in lower else lower
+    if not price:
+        price = _arith(amount)
+    if not price:
+        target = re.search(r"(?:to|=|at|of)\s*(?:rs\.?|inr|₹)?\s*(\d+(?:\.\d+)?)\b", amount)
+        if target:
+            price = float(target.group(1))
+    if not price and user_input:
+        price = _arith(user_input)
+    if not price:
+        return None
+    return {"price": int(price) if float(price) == int(price) else float(price)}
+
+
+def _is_room_update(text: str) -> bool:
+    lower = text.lower()
+    return re.search(r"\b(?:update|set|change|increase|raise|decrease|reduce|lower)\b", lower) is not None \
+        and "room" in lower and any(word in lower for word in ("price", "capacity", "percent", "%"))
+
+
+def _is_room_listing(text: str) -> bool:
+    lower = text.lower()
+    return any(phrase in lower for phrase in ("list all rooms", "list_rooms", "fetch all rooms", "get all rooms"))
+
+
+def _is_student_listing(text: str) -> bool:
+    lower = text.lower()
+    return any(phrase in lower for phrase in (
+        "list all students", "list_students", "fetch all students", "get all students", "unassigned students",
+    )) and "assign" not in lower.replace("unassigned", "")
+
+
+def _payment_status_change(text: str) -> Optional[Dict[str, Any]]:
+    """bulk_set_payment_status parameters for "mark all pending payments of Asha as paid"."""
+    match = re.search(
+        r"\b(?:set|mark|update|change)\s+(?:all|every|each)\s+(?:of\s+)?(?:(pending|paid|failed)\s+)?payments?\s+"
+        r"(?:of|for)\s+(?:student\s+)?(.+?)\s+(?:to|as)\s+(pending|paid|failed)\b",
+        text, re.IGNORECASE,
+    )
+    if not match:
+        return None
+    parameters = {"status": match.group(3).capitalize(), "student_name": match.group(2).strip(" '\"")}
+    if match.group(1):
+        parameters["from_status"] = match.group(1).capitalize()
+    return parameters
+
+
+def _is_mass_allocation(text: str) -> bool:
+    lower = text.lower()
+    return "assign" in lower.replace("unassigned", "") and "room" in lower and "student" in lower and \
+        any(word in lower for word in ("all", "each", "every", "unassigned"))
+
+
+def _compile_text(todo: List[Any], computed_values: Dict[str, Any], user_input: str) -> Tuple[List[Any], List[str]]:
+    """Rewrite text-step fan-outs. Compiled steps get no id, so the plan keeps running in order."""
+    values = dict(computed_values)
+    compiled: List[Any] = []
+    notes: List[str] = []
+    fed = {"rooms": False, "students": False}
+    for raw in todo:
+        if not isinstance(raw, str):
+            compiled.append(raw)
+            continue
+        if "calculate" in raw.lower() and "price" not in values:
+            value = _arith(raw)
+            if value is not None:
+                values["price"] = value
+        if _is_room_update(raw):
+            patch = _room_patch(raw, values, user_input)
+            if patch is not None:
+                compiled.append({"action": "bulk_update_rooms",
+                                 "parameters": {"filter": room_filter(raw), "patch": patch}})
+                notes.append(f"'{raw}' -> bulk_update_rooms")
+                fed["rooms"] = True
+                continue
+        payment_change = _payment_status_change(raw)
+        if payment_change:
+            compiled.append({"action": "bulk_set_payment_status", "parameters": payment_change})
+            notes.append(f"'{raw}' -> bulk_set_payment_status")
+            continue
+        if _is_mass_allocation(raw):
+            floor = room_filter(raw).get("floor")
+            compiled.append({"action": "allocate_rooms", "parameters": {"floor": floor} if floor else {}})
+            notes.append(f"'{raw}' -> allocate_rooms")
+            fed["students"] = True
+            continue
+        compiled.append(raw)
+
+    # Listings that only existed to feed a fan-out are no longer needed
+    result = []
+    for step in compiled:
+        if isinstance(step, str) and ((fed["rooms"] and _is_room_listing(step))
+                                      or (fed["students"] and _is_student_listing(step))):
+            notes.append(f"dropped '{step}'")
+            continue
+        result.append(step)
+    return result, notes
+
+
+def _references(value: Any) -> List[str]:
+    if isinstance(value, str):
+        match = _REF.match(value)
+        return [match.group(1)] if match else []
+    if isinstance(value, dict):
+        return [ref for item in value.values() for ref in _references(item)]
+    if isinstance(value, (list, tuple)):
+        return [ref for item in value for ref in _references(item)]
+    return []
+
+
+def _compile_structured(todo: List[Any]) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """Rewrite fan-outs among structured steps ({"id", "action", "parameters", "depends_on"})."""
+    steps = []
+    for index, raw in enumerate(todo):
+        if isinstance(raw, str):
+            steps.append({"id": f"s{index + 1}", "action": raw, "parameters": {}, "depends_on": []})
+            continue
+        step = dict(raw) if isinstance(raw, dict) else raw.dict()
+        step.setdefault("id", f"s{index + 1}")
+        step["id"] = str(step["id"] or f"s{index + 1}")
+        step["action"] = step.get("action") or step.get("description") or ""
+        step["parameters"] = dict(step.get("parameters") or {})
+        step["depends_on"] = list(step.get("depends_on") or [])
+        steps.append(step)
+    by_id = {step["id"]: step for step in steps}
+    notes: List[str] = []
+    replaced: Dict[str, str] = {}  # removed step id -> id of the bulk step that absorbed it
+
+    def source(step, key, action):
+        """Id of the `action` step that step's parameter `key` is computed from, if any."""
+        refs = _references(step["parameters"].get(key))
+        return refs[0] if refs and by_id.get(refs[0], {}).get("action") == action else None
+
+    def bulk(step, action, parameters, absorbed):
+        depends = [dep for dep in step["depends_on"] if dep not in absorbed]
+        return {"id": step["id"], "action": action, "parameters": parameters, "depends_on": depends}
+
+    compiled: List[Dict[str, Any]] = []
+    room_groups: Dict[str, Dict[str, Any]] = {}
+    payment_groups: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    feeders: Dict[str, str] = {}  # listing step id -> bulk step id that replaced its consumers
+    for step in steps:
+        action, params = step["action"], step["parameters"]
+        if action == "update_room":
+            data = params.get("data") or {}
+            feeder = source(step, "room_no", "list_rooms")
+            if feeder and not by_id[feeder]["parameters"].get("status"):
+                compiled.append(bulk(step, "bulk_update_rooms", {"filter": {}, "patch": data}, {feeder}))
+                feeders[feeder] = step["id"]
+                notes.append(f"{step['id']}: update_room over {feeder} -> bulk_update_rooms")
+                continue
+            if isinstance(params.get("room_no"), str) and not _references(params) and data and \
+                    set(data) <= {"price", "capacity"}:
+                key = repr(sorted(data.items()))
+                group = room_groups.get(key)
+                if group is None:
+                    room_groups[key] = bulk(step, "bulk_update_rooms",
+                                            {"filter": {"room_nos": [params["room_no"]]}, "patch": data}, set())
+                    compiled.append(room_groups[key])
+                else:
+                    group["parameters"]["filter"]["room_nos"].append(params["room_no"])
+                    group["depends_on"] += [d for d in step["depends_on"] if d not in group["depends_on"]]
+                    replaced[step["id"]] = group["id"]
+                continue
+        if action == "set_payments_status_by_name":
+            feeder = source(step, "payment_id", "payments_by_name")
+            if feeder:
+                parameters = {"status": params.get("status"),
+                              "student_name": by_id[feeder]["parameters"].get("student_name")}
+                compiled.append(bulk(step, "bulk_set_payment_status", parameters, {feeder}))
+                feeders[feeder] = step["id"]
+                notes.append(f"{step['id']}: set_payments_status_by_name over {feeder} -> bulk_set_payment_status")
+                continue
+            if isinstance(params.get("payment_id"), int) and not _references(params):
+                key = (str(params.get("student_name")), str(params.get("status")))
+                group = payment_groups.get(key)
+                if group is None:
+                    payment_groups[key] = bulk(step, "bulk_set_payment_status",
+                                               {"status": params.get("status"), "payment_ids": [params["payment_id"]]},
+                                               set())
+                    compiled.append(payment_groups[key])
+                else:
+                    group["parameters"]["payment_ids"].append(params["payment_id"])
+                    replaced[step["id"]] = group["id"]
+                continue
+        if action == "assign_any_empty_room_by_name":
+            feeder = source(step, "student_name", "list_students")
+            if feeder:
+                compiled.append(bulk(step, "allocate_rooms", {}, {feeder}))
+                feeders[feeder] = step["id"]
+                notes.append(f"{step['id']}: {action} over {feeder} -> allocate_rooms")
+                continue
+        compiled.append(step)
+
+    # Singleton groups stay as the original one-row call
+    for groups, single, count_key in ((room_groups, "update_room", "room_nos"),
+                                      (payment_groups, "set_payments_status_by_name", "payment_ids")):
+        for group in groups.values():
+            items = group["parameters"].get("filter", group["parameters"]).get(count_key)
+            if len(items) == 1:
+                original = by_id[group["id"]]
+                group.update({"action": single, "parameters": original["parameters"]})
+            else:
+                notes.append(f"{group['id']}: {len(items)} {single} steps -> {group['action']}")
+
+    # Drop listing steps nothing else reads, and point references to absorbed steps at the bulk step
+    used = {ref for step in compiled for ref in step["depends_on"] + _references(step["parameters"])}
+    result = []
+    for step in compiled:
+        if step["id"] in feeders and step["id"] not in used:
+            notes.append(f"dropped {step['id']} ({step['action']})")
+            continue
+        depends = []
+        for dep in step["depends_on"]:
+            dep = replaced.get(dep, dep)
+            if dep != step["id"] and dep not in depends:
+                depends.append(dep)
+        step["depends_on"] = depends
+        result.append(step)
+    return result, notes
+
+
+def compile_plan(plan: Dict[str, Any], user_input: str = "") -> Dict[str, Any]:
+    """Plan with per-row fan-outs replaced by bulk steps; `plan["compiled"]` lists the rewrites."""
+    todo = plan.get("todo") or []
+    structured = any(not isinstance(step, str) and (step.get("id") if isinstance(step, dict) else getattr(step, "id", None))
+                     for step in todo)
+    if structured:
+        compiled, notes = _compile_structured(todo)
+    else:
+        compiled, notes = _compile_text(todo, plan.get("computed_values") or {}, user_input)
+    if not notes:
+        return plan
+    return {**plan, "todo": compiled, "compiled": notes}
+
+
+def describe(operation: Dict[str, Any]) -> str:
+    """One-line description of a bulk step for the confirmation prompt."""
+    action, params = operation["action"], operation.get("parameters") or {}
+    if action == "bulk_update_rooms":
+        changes = []
+        for key, value in (params.get("patch") or {}).items():
+            changes.append(f"change price by {value:+g}%" if key == "price_change_percent" else f"set {key} to {value}")
+        patch = ", ".join(changes)
+        where = params.get("filter") or {}
+        if where.get("room_nos"):
+            target = f"rooms {', '.join(map(str, where['room_nos']))}"
+        elif where.get("floor"):
+            target = f"all rooms on floor {where['floor']}"
+        else:
+            target = "all rooms"
+        return f"{patch[:1].upper()}{patch[1:]} on {target}"
+    if action == "bulk_set_payment_status":
+        if params.get("payment_ids"):
+            target = f"payments {', '.join(map(str, params['payment_ids']))}"
+        else:
+            target = f"all {(params.get('from_status') or '').lower() + ' ' if params.get('from_status') else ''}" \
+                     f"payments of {params.get('student_name')}"
+        return f"Mark {target} as {params.get('status')}"
+    if action == "allocate_rooms":
+        floor = f" on floor {params['floor']}" if params.get("floor") else ""
+        return f"Assign rooms{floor} to every unassigned student"
+    return action
+
+
+# ---------- Confirmation ----------
+HOLD_SECONDS = 600
+
+# session_id -> (bulk_id, held at, operations)
+_PENDING: Dict[str, Tuple[str, float, List[Dict[str, Any]]]] = {}
+
+
+def hold(session_id: str, operations: List[Dict[str, Any]]) -> str:
+    """Keep bulk operations until the session confirms them; returns the id to confirm."""
+    bulk_id = uuid.uuid4().hex[:8]
+    _PENDING[session_id] = (bulk_id, time.monotonic(), operations)
+    return bulk_id
+
+
+def take_confirmation(session_id: str, text: str) -> Optional[Tuple[str, List[Dict[str, Any]]]]:
+    """("confirm" | "cancel" | "expired", operations) if text answers this session's held operations.
+
+    Any other message drops the held operations: a confirmation only applies
+    to the plan shown right before it.
+    """
+    answer = text.strip().lower()
+    match = re.fullmatch(r"(confirm|cancel)\s+bulk\s+([0-9a-f]+)", answer)
+    pending = _PENDING.pop(session_id, None)
+    if pending and time.monotonic() - pending[1] > HOLD_SECONDS:
+        pending = None
+    if match:
+        if not pending or pending[0] != match.group(2):
+            return "expired", []
+        return match.group(1), pending[2]
+    if pending and answer in ("yes", "y", "confirm", "ok"):
+        return "confirm", pending[2]
+    if pending and answer in ("no", "n", "cancel"):
+        return "cancel", pending[2]
+    return None
+
+
+async def run_operations(operations: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Run confirmed bulk operations in order; {summary, data} envelope."""
+    summaries: List[str] = []
+    data: List[Any] = []
+    for operation in operations:
+        try:
+            result = await BULK_TOOLS[operation["action"]](**(operation.get("parameters") or {}))
+        except Exception as e:
+            summaries.append(f"❌ {describe(operation)} failed: {e}")
+            continue
+        summaries.append(result.get("summary", ""))
+        data.extend(result.get("data") or [])
+    return {"summary": " ".join(summaries), "data": data}
@@ -12,11 +12,17 @@ class Settings:
     groq_api_key: str = os.getenv("GROQ_API_KEY", "")
     groq_model: str = os.getenv("GROQ_MODEL", "gemma2-9b-it")
     hms_api_base: str = os.getenv("HMS_API_BASE", "http://localhost:8000")
+    hms_api_token: str = os.getenv("HMS_API_TOKEN", "")  # bearer token for the HTTP transport
+    # "http" or "inprocess"; empty means in-process inside the API, HTTP elsewhere
+    tool_transport: str = os.getenv("AGENT_TOOL_TRANSPORT", "")
 
 
     # timeouts/retries
     http_timeout: float = float(os.getenv("HTTP_TIMEOUT", 20))
     http_retries: int = int(os.getenv("HTTP_RETRIES", 2))
 
+    # independent plan steps the executor runs at once
+    max_parallel_steps: int = int(os.getenv("AGENT_MAX_PARALLEL_STEPS", 4))
+
 
 settings = Settings()
\ No newline at end of file
@@ -1,6 +1,9 @@
 from __future__ import annotations
-from typing import Annotated, Dict, Any, List, Optional
+from typing import Annotated, AsyncIterator, Dict, Any, List, Optional
+import asyncio
 import operator
+import re
+import time
 from langgraph.graph import StateGraph, END, START
 import json
 from langchain_core.messages import HumanMessage, AIMessage, ToolMessage, SystemMessage
@@ -11,6 +14,8 @@ from langchain_core.runnables import RunnableConfig
 
 from .config import settings
 from . import tools as t
+from .plan_runner import PlanStep, execution_timing, normalize_plan, run_plan
+from .bulk_compiler import BULK_TOOLS, compile_plan, describe, hold, room_filter, run_operations, take_confirmation
 
 # 1) Bind tools to LangChain (with Pydantic schemas)
 @tool("find_student_by_name", args_schema=t.FindStudentByNameInput)
@@ -73,6 +78,11 @@ async def tool_update_room(room_no: str, data: Dict[str, Any]):
     """Update a room's fields by room_no (capacity, status, price, etc.)."""
     return await t.update_room(room_no, data)
 
+@tool("bulk_update_rooms", args_schema=t.BulkUpdateRoomsInput)
+async def tool_bulk_update_rooms(filter: Dict[str, Any], patch: Dict[str, Any]):
+    """Update price/capacity of all rooms matching a filter (floor, price band, room_nos) in one call."""
+    return await t.bulk_update_rooms(filter, patch)
+
 @tool("payments_by_name", args_schema=t.PaymentsByNameInput)
 async def tool_payments_by_name(student_name: str):
     """List payments for the first student matching the given name."""
@@ -93,6 +103,17 @@ async def tool_set_payments_status_by_name(student_name: str, status: str, payme
     """Set status for all payments (or a specific payment_id) for a student by name."""
     return await t.set_payments_status_by_name(student_name, status, payment_id)
 
+@tool("bulk_set_payment_status", args_schema=t.BulkSetPaymentStatusInput)
+async def tool_bulk_set_payment_status(status: str, student_name: str | None = None,
+                                       payment_ids: List[int] | None = None, from_status: str | None = None):
+    """Set the status of all payments of a student (or of the given payment ids) in one call."""
+    return await t.bulk_set_payment_status(status, student_name, payment_ids, from_status)
+
+@tool("allocate_rooms", args_schema=t.AllocateRoomsInput)
+async def tool_allocate_rooms(student_ids: List[int] | None = None, floor: str | None = None):
+    """Assign rooms to many students in one call; no student_ids means every unassigned student."""
+    return await t.allocate_rooms(student_ids, floor)
+
 # 2) Collect all tools
 TOOLS = [
     tool_find_student_by_name,
@@ -107,10 +128,13 @@ TOOLS = [
     tool_delete_room,
     tool_list_rooms,
     tool_update_room,
+    tool_bulk_update_rooms,
     tool_payments_by_name,
     tool_assign_any_empty_room_by_name,
     tool_create_payment_by_name,
     tool_set_payments_status_by_name,
+    tool_bulk_set_payment_status,
+    tool_allocate_rooms,
 ]
 
 # 3) Build the Agent
@@ -142,8 +166,8 @@ SYSTEM_PROMPT = (
     ""
     "Available tools: "
     "- find_student_by_name, create_student, update_student, delete_student "
-    "- list_students, assign_room, create_room, delete_room, list_rooms, update_room "
-    "- payments_by_name, create_payment_by_name, set_payments_status_by_name "
+    "- list_students, assign_room, create_room, delete_room, list_rooms, update_room, bulk_update_rooms "
+    "- payments_by_name, create_payment_by_name, set_payments_status_by_name, bulk_set_payment_status, allocate_rooms "
     ""
     "Example responses: "
     "- Summary: 'Found 3 students matching 'shiva'. Please select one.' "
@@ -160,11 +184,16 @@ PLANNER_PROMPT = (
     "- Each step should be a single action that can be executed "
     "- Include computed values in the plan "
     "- Be specific about what needs to be done "
+    "- A step that calls one tool can be an object: "
+    "  {'id': 's1', 'action': '<tool name>', 'parameters': {...}, 'depends_on': []} "
+    "- Give independent steps (e.g. payments of three different students) an empty depends_on so they run in parallel "
+    "- To use an earlier step's output, list its id in depends_on and reference it in parameters as '$s1' or '$s1.data.0.name' "
     ""
     "Available tools: "
     "- find_student_by_name, create_student, update_student, delete_student "
-    "- list_students, assign_room, create_room, delete_room, list_rooms, update_room "
-    "- payments_by_name, create_payment_by_name, set_payments_status_by_name "
+    "- list_students, assign_room, create_room, delete_room, list_rooms, update_room, bulk_update_rooms "
+    "- payments_by_name, create_payment_by_name, set_payments_status_by_name, bulk_set_payment_status, allocate_rooms "
+    "- Change many records with one bulk tool call instead of one step per record "
     "Use these tools to plan the steps. Only use tools that are relevant to the user's request. It is very important to use the tools to plan the steps."
     "Output Format (JSON only): "
     "{"
@@ -186,6 +215,12 @@ PLANNER_PROMPT = (
     ""
     "- User: 'show all students and their room assignments' "
     "- Plan: {'todo': ['List all students', 'List all rooms', 'Match students with rooms'], 'summary': 'Display all students and their room assignments'}"
+    ""
+    "- User: 'show payments of asha, ravi and meena' "
+    "- Plan: {'todo': [{'id': 's1', 'action': 'payments_by_name', 'parameters': {'student_name': 'asha'}, 'depends_on': []}, "
+    "{'id': 's2', 'action': 'payments_by_name', 'parameters': {'student_name': 'ravi'}, 'depends_on': []}, "
+    "{'id': 's3', 'action': 'payments_by_name', 'parameters': {'student_name': 'meena'}, 'depends_on': []}], "
+    "'summary': 'Payments of three students'}"
 )
 
 # 4) Define LangGraph State
@@ -351,8 +386,126 @@ def call_model(state: AgentState, config: RunnableConfig):
     response = llm_with_tools.invoke(messages, config=config)
     return {"messages": [response]}
 
+TOOLS_BY_NAME = {tool_.name: tool_ for tool_ in TOOLS}
+
+def _count(result: Any) -> int:
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, dict) and isinstance(result.get("data"), list):
+        return len(result["data"])
+    return 0
+
+def _price_from_user_input(state: AgentState):
+    user_input = state.get("user_input", "")
+    if user_input:
+        # Look for math expressions in user input
+        math_match = re.search(r'(\d+[\+\-\*\/]\d+)', user_input.lower())
+        if math_match:
+            expr = math_match.group(1)
+            try:
+                return expr, eval(expr)
+            except Exception:
+                pass
+    return None, None
+
+async def _execute_step(step: PlanStep, params: Dict[str, Any], state: AgentState,
+                        computed_values: Dict[str, Any], config: RunnableConfig) -> Dict[str, Any]:
+    """Run one plan step; returns the fields merged into its result entry."""
+    print(f"DEBUG: Executing step {step.id}: {step.action}")
+
+    # Bulk writes are held for one confirmation instead of running now
+    if step.action in BULK_TOOLS:
+        return {"status": "awaiting_confirmation", "result": None,
+                "operation": {"action": step.action, "parameters": params}}
+
+    # Structured step naming a tool: call it with the (resolved) parameters
+    tool_ = TOOLS_BY_NAME.get(step.action)
+    if tool_ is not None:
+        result = await tool_.ainvoke(params, config=config)
+        return {"status": "completed", "result": result, "count": _count(result)}
+
+    step_str = step.action.lower()
+    if "list_rooms" in step_str or "fetch all rooms" in step_str or "get all rooms" in step_str:
+        print(f"DEBUG: Detected list_rooms step")
+        rooms = await tool_list_rooms.ainvoke({}, config=config)
+        return {"status": "completed", "result": rooms, "count": len(rooms) if isinstance(rooms, list) else 0}
+
+    if "list_students" in step_str or "fetch all students" in step_str or "get all students" in step_str:
+        print(f"DEBUG: Detected list_students step")
+        students = await tool_list_students.ainvoke({}, config=config)
+        return {"status": "completed", "result": students, "count": len(students) if isinstance(students, list) else 0}
+
+    if "update" in step_str and "room" in step_str and "price" in step_str:
+        print(f"DEBUG: Detected update room price step")
+        # Extract price from computed values or calculate
+        price = computed_values.get("price")
+        if not price:
+            # Try to extract from step description
+            price_match = re.search(r'(\d+)', step_str)
+            if price_match:
+                price = int(price_match.group(1))
+        # If still no price, try to extract from user input
+        if not price:
+            expr, price = _price_from_user_input(state)
+            if price:
+                print(f"DEBUG: Calculated price from user input: {expr} = {price}")
+        print(f"DEBUG: Using price: {price}")
+        if not price:
+            return {"status": "failed", "error": "No price value found for room updates"}
+
+        # Price only known at run time (the compile stage could not fold it): one bulk update
+        operation = {"action": "bulk_update_rooms",
+                     "parameters": {"filter": room_filter(step_str), "patch": {"price": price}}}
+        return {"status": "awaiting_confirmation", "result": None, "operation": operation, "price_applied": price}
+
+    if "calculate" in step_str or "math" in step_str or "*" in step_str or "+" in step_str or "-" in step_str or "/" in step_str:
+        print(f"DEBUG: Detected math calculation step")
+        try:
+            # Look for math expressions in the step description
+            math_match = re.search(r'(\d+[\+\-\*\/]\d+)', step_str)
+            if math_match:
+                expr = math_match.group(1)
+                result = eval(expr)  # Safe for simple math
+            else:
+                # Try to extract from the original user input
+                if not state.get("user_input"):
+                    return {"status": "failed", "error": "No math expression found"}
+                expr, result = _price_from_user_input(state)
+                if expr is None:
+                    return {"status": "failed", "error": "No math expression found in step or user input"}
+            # Store in computed values for later use
+            computed_values["price"] = result
+            print(f"DEBUG: Calculated {expr} = {result}, stored in computed_values")
+            return {"status": "completed", "result": f"{expr} = {result}", "computed_value": result}
+        except Exception as e:
+            return {"status": "failed", "error": f"Math calculation failed: {e}"}
+
+    print(f"DEBUG: Generic step execution")
+    # Generic step - mark as completed with note
+    return {"status": "completed", "result": "Step executed", "note": "Generic step execution"}
+
+def _hold_for_confirmation(state: AgentState, operations: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Hold bulk operations for the session; envelope whose first datum asks for confirmation."""
+    bulk_id = hold(state.get("session_id") or "default", operations)
+    description = "; ".join(describe(operation) for operation in operations)
+    return {
+        "summary": f"⚠️ Please confirm: {description}. Reply 'confirm bulk {bulk_id}' or 'cancel bulk {bulk_id}'.",
+        "data": [{"confirm": True, "bulk_id": bulk_id, "description": description, "operations": operations}],
+    }
+
+def compile_node(state: AgentState):
+    """Rewrite per-row fan-outs in the plan into bulk steps (see agent/bulk_compiler.py)."""
+    plan = state.get("plan")
+    if not plan or not isinstance(plan, dict):
+        return {}
+    compiled = compile_plan(plan, state.get("user_input", ""))
+    if compiled is plan:
+        return {}
+    print(f"DEBUG: Compiled plan rewrites: {compiled['compiled']}")
+    return {"plan": compiled}
+
 async def executor_node(state: AgentState, config: RunnableConfig):
-    """Execution agent that runs planned tasks one by one without breakdowns."""
+    """Execution agent that runs planned tasks, independent steps concurrently (see agent/plan_runner.py)."""
     plan = state.get("plan", {})
     if not plan or not isinstance(plan, dict):
         return {"messages": [AIMessage(content="No valid plan found.")]}
@@ -366,168 +519,23 @@ async def executor_node(state: AgentState, config: RunnableConfig):
     print(f"DEBUG: Todo items: {todo}")
     
     try:
-        for i, step in enumerate(todo):
-            step_str = str(step).lower()
-            step_result = {"step": i + 1, "description": step, "status": "pending"}
-            
-            print(f"DEBUG: Executing step {i+1}: {step}")
-            
-            try:
-                # Execute step based on content
-                if "list_rooms" in step_str or "fetch all rooms" in step_str or "get all rooms" in step_str:
-                    print(f"DEBUG: Detected list_rooms step")
-                    rooms = await tool_list_rooms.ainvoke({}, config=config)
-                    step_result.update({
-                        "status": "completed",
-                        "result": rooms,
-                        "count": len(rooms) if isinstance(rooms, list) else 0
-                    })
-                    results.append(step_result)
-                    
-                elif "list_students" in step_str or "fetch all students" in step_str or "get all students" in step_str:
-                    print(f"DEBUG: Detected list_students step")
-                    students = await tool_list_students.ainvoke({}, config=config)
-                    step_result.update({
-                        "status": "completed",
-                        "result": students,
-                        "count": len(students) if isinstance(students, list) else 0
-                    })
-                    results.append(step_result)
-                    
-                elif "update" in step_str and "room" in step_str and "price" in step_str:
-                    print(f"DEBUG: Detected update room price step")
-                    # Extract price from computed values or calculate
-                    price = computed_values.get("price")
-                    if not price:
-                        # Try to extract from step description
-                        import re
-                        price_match = re.search(r'(\d+)', step_str)
-                        if price_match:
-                            price = int(price_match.group(1))
-                    
-                    # If still no price, try to extract from user input
-                    if not price:
-                        user_input = state.get("user_input", "")
-                        if user_input:
-                            # Look for math expressions in user input
-                            math_match = re.search(r'(\d+[\+\-\*\/]\d+)', user_input.lower())
-                            if math_match:
-                                expr = math_match.group(1)
-                                try:
-                                    price = eval(expr)
-                                    print(f"DEBUG: Calculated price from user input: {expr} = {price}")
-                                except:
-                                    pass
-                    
-                    print(f"DEBUG: Using price: {price}")
-                    
-                    if price:
-                        # Get all rooms first
-                        rooms = await tool_list_rooms.ainvoke({}, config=config)
-                        updated_rooms = []
-                        
-                        for room in rooms:
-                            if isinstance(room, dict) and "room_no" in room:
-                                try:
-                                    updated = await tool_update_room.ainvoke(
-                                        {"room_no": room["room_no"], "data": {"price": price}},
-                                        config=config
-                                    )
-                                    updated_rooms.append(updated)
-                                except Exception as e:
-                                    step_result["errors"] = step_result.get("errors", [])
-                                    step_result["errors"].append(f"Room {room.get('room_no', 'unknown')}: {str(e)}")
-                        
-                        step_result.update({
-                            "status": "completed",
-                            "result": updated_rooms,
-                            "count": len(updated_rooms),
-                            "price_applied": price
-                        })
-                    else:
-                        step_result.update({
-                            "status": "failed",
-                            "error": "No price value found for room updates"
-                        })
-                    
-                    results.append(step_result)
-                    
-                elif "calculate" in step_str or "math" in step_str or "*" in step_str or "+" in step_str or "-" in step_str or "/" in step_str:
-                    print(f"DEBUG: Detected math calculation step")
-                    # Handle math expressions
-                    try:
-                        import re
-                        # Look for math expressions in the step description
-                        math_match = re.search(r'(\d+[\+\-\*\/]\d+)', step_str)
-                        if math_match:
-                            expr = math_match.group(1)
-                            result = eval(expr)  # Safe for simple math
-                            step_result.update({
-                                "status": "completed",
-                                "result": f"{expr} = {result}",
-                                "computed_value": result
-                            })
-                            # Store in computed values for later use
-                            computed_values["price"] = result
-                            print(f"DEBUG: Calculated {expr} = {result}, stored in computed_values")
-                        else:
-                            # Try to extract from the original user input
-                            user_input = state.get("user_input", "")
-                            if user_input:
-                                math_match = re.search(r'(\d+[\+\-\*\/]\d+)', user_input.lower())
-                                if math_match:
-                                    expr = math_match.group(1)
-                                    result = eval(expr)
-                                    step_result.update({
-                                        "status": "completed",
-                                        "result": f"{expr} = {result}",
-                                        "computed_value": result
-                                    })
-                                    computed_values["price"] = result
-                                    print(f"DEBUG: Calculated from user input {expr} = {result}")
-                                else:
-                                    step_result.update({
-                                        "status": "failed",
-                                        "error": "No math expression found in step or user input"
-                                    })
-                            else:
-                                step_result.update({
-                                    "status": "failed",
-                                    "error": "No math expression found"
-                                })
-                    except Exception as e:
-                        step_result.update({
-                            "status": "failed",
-                            "error": f"Math calculation failed: {e}"
-                        })
-                    
-                    results.append(step_result)
-                    
-                else:
-                    print(f"DEBUG: Generic step execution")
-                    # Generic step - mark as completed with note
-                    step_result.update({
-                        "status": "completed",
-                        "result": "Step executed",
-                        "note": "Generic step execution"
-                    })
-                    results.append(step_result)
-                    
-            except Exception as e:
-                # Handle step execution errors
-                print(f"DEBUG: Step {i+1} failed with error: {e}")
-                step_result.update({
-                    "status": "failed",
-                    "error": str(e)
-                })
-                results.append(step_result)
+        steps = normalize_plan(todo)
+        started = time.perf_counter()
+        results = await run_plan(
+            steps,
+            lambda step, params: _execute_step(step, params, state, computed_values, config),
+            max_concurrency=settings.max_parallel_steps,
+        )
+        wall_ms = (time.perf_counter() - started) * 1000
         
         # Generate comprehensive summary
         total_steps = len(todo)
         completed_steps = len([r for r in results if r.get("status") == "completed"])
         failed_steps = len([r for r in results if r.get("status") == "failed"])
+        skipped_steps = len([r for r in results if r.get("status") == "skipped"])
+        operations = [r["operation"] for r in results if r.get("status") == "awaiting_confirmation"]
         
-        print(f"DEBUG: Execution complete. {completed_steps}/{total_steps} steps completed")
+        print(f"DEBUG: Execution complete. {completed_steps}/{total_steps} steps completed in {wall_ms:.0f} ms")
         
         # Create summary based on plan type
         if "update" in str(todo).lower() and "room" in str(todo).lower():
@@ -541,17 +549,27 @@ async def executor_node(state: AgentState, config: RunnableConfig):
         
         if failed_steps > 0:
             summary += f" {failed_steps} step(s) failed."
+        if skipped_steps > 0:
+            summary += f" {skipped_steps} step(s) skipped."
+        data = results
+        if operations:
+            confirmation = _hold_for_confirmation(state, operations)
+            summary = f"{confirmation['summary']} ({completed_steps}/{total_steps} other steps completed.)"
+            data = confirmation["data"] + results
         
         # Final response
         final_response = {
             "summary": summary,
-            "data": results,
+            "data": data,
             "plan": plan,
             "execution_stats": {
                 "total_steps": total_steps,
                 "completed": completed_steps,
                 "failed": failed_steps,
-                "computed_values": computed_values
+                "skipped": skipped_steps,
+                "awaiting_confirmation": len(operations),
+                "computed_values": computed_values,
+                "timing": execution_timing(results, wall_ms),
             }
         }
         
@@ -571,6 +589,7 @@ async def executor_node(state: AgentState, config: RunnableConfig):
 # Add nodes
 graph.add_node("planner", planner_node)
 graph.add_node("agent", call_model)
+graph.add_node("compile", compile_node)
 graph.add_node("executor", executor_node)
 
 # Add edges
@@ -617,15 +636,16 @@ def main_router(state: AgentState):
     
     if any(keyword in content for keyword in complex_keywords):
         print(f"DEBUG: Routing to executor (complex request)")
-        return "executor"  # Go to executor with the plan
+        return "executor"  # Compile, then execute the plan
     else:
         print(f"DEBUG: Routing to agent (simple request)")
         return "agent"  # Go to simple agent
 
 graph.add_conditional_edges("planner", main_router, {
-    "executor": "executor",
+    "executor": "compile",
     "agent": "agent"
 })
+graph.add_edge("compile", "executor")
 
 # Executor goes directly to END
 graph.add_edge("executor", END)
@@ -639,6 +659,22 @@ def router(state: AgentState):
 
 graph.add_conditional_edges("agent", router, {"tool": "tool", END: END})
 
+# Normalize tool outputs to an envelope {summary, data}
+def _envelope_from_result(answer):
+    try:
+        if isinstance(answer, dict) and "summary" in answer and "data" in answer:
+            return {"summary": str(answer.get("summary", "")), "data": answer.get("data") or []}
+        if isinstance(answer, list):
+            count = len(answer)
+            preview = answer[:10]
+            return {"summary": f"Found {count} record(s). Showing {len(preview)}.", "data": preview}
+        if isinstance(answer, dict):
+            return {"summary": "1 record.", "data": [answer]}
+        # fallback to text
+        return {"summary": str(answer), "data": []}
+    except Exception:
+        return {"summary": str(answer), "data": []}
+
 # Tool execution node
 async def tool_node(state: AgentState, config: RunnableConfig):
     last = state["messages"][-1]
@@ -646,23 +682,13 @@ async def tool_node(state: AgentState, config: RunnableConfig):
     for call in last.tool_calls:
         name = call["name"]
         args = call["args"]
+        if name in BULK_TOOLS:
+            # Same confirmation as planned bulk steps
+            envelope = _hold_for_confirmation(state, [{"action": name, "parameters": args}])
+            tool_msgs.append(ToolMessage(content=json.dumps(envelope), tool_call_id=call["id"]))
+            continue
         tool = next(t for t in TOOLS if t.name == name)
         result = await tool.ainvoke(args, config=config)
-        # Normalize tool outputs to an envelope {summary, data}
-        def _envelope_from_result(answer):
-            try:
-                if isinstance(answer, dict) and "summary" in answer and "data" in answer:
-                    return {"summary": str(answer.get("summary", "")), "data": answer.get("data") or []}
-                if isinstance(answer, list):
-                    count = len(answer)
-                    preview = answer[:10]
-                    return {"summary": f"Found {count} record(s). Showing {len(preview)}.", "data": preview}
-                if isinstance(answer, dict):
-                    return {"summary": "1 record.", "data": [answer]}
-                # fallback to text
-                return {"summary": str(answer), "data": []}
-            except Exception:
-                return {"summary": str(answer), "data": []}
         envelope = _envelope_from_result(result)
         payload = json.dumps(envelope)
         tool_msgs.append(ToolMessage(content=payload, tool_call_id=call["id"]))
@@ -683,23 +709,99 @@ def _get_history(session_id: str) -> List[Any]:
         _CHAT_HISTORY[session_id] = [SystemMessage(content=SYSTEM_PROMPT)]
     return _CHAT_HISTORY[session_id]
 
-async def agentwardan_chat(user_input: str, session_id: str = "default"):
-    history = _get_history(session_id)
-    history.append(HumanMessage(content=user_input))
-    
-    # Create initial state with both system and user messages
-    state = {
-        "messages": history,
-        "user_input": user_input  # Explicitly store user input
-    }
-    
-    print(f"DEBUG: Initial state created with {len(history)} messages")
-    print(f"DEBUG: User input: {user_input}")
-    
-    result = await app.ainvoke(state)
-    reply = result["messages"][-1]
+def _remember(session_id: str, history: List[Any], reply: Any) -> None:
     history.append(reply)
     # trim to last 20 exchanges (+ system)
     if len(history) > 41:
         _CHAT_HISTORY[session_id] = [history[0]] + history[-40:]
+
+async def _answer_confirmation(user_input: str, session_id: str) -> Optional[AIMessage]:
+    """Reply to a held bulk change (run or drop it) without planning again; None if user_input is not one."""
+    answer = take_confirmation(session_id, user_input)
+    if answer is None:
+        return None
+    verdict, operations = answer
+    if verdict == "confirm":
+        envelope = await run_operations(operations)
+    elif verdict == "cancel":
+        envelope = {"summary": "Cancelled. No records were changed.", "data": []}
+    else:
+        envelope = {"summary": "That bulk change is no longer pending. Please ask again.", "data": []}
+    return AIMessage(content=json.dumps(envelope))
+
+def _initial_state(history: List[Any], user_input: str, session_id: str) -> Dict[str, Any]:
+    # Create initial state with both system and user messages
+    print(f"DEBUG: Initial state created with {len(history)} messages")
+    print(f"DEBUG: User input: {user_input}")
+    return {
+        "messages": history,
+        "user_input": user_input,  # Explicitly store user input
+        "session_id": session_id,  # Held bulk changes are per session
+    }
+
+async def agentwardan_chat(user_input: str, session_id: str = "default"):
+    history = _get_history(session_id)
+    history.append(HumanMessage(content=user_input))
+
+    reply = await _answer_confirmation(user_input, session_id)
+    if reply is None:
+        result = await app.ainvoke(_initial_state(history, user_input, session_id))
+        reply = result["messages"][-1]
+    _remember(session_id, history, reply)
     return reply.content
+
+# Graph nodes reported as progress events by agentwardan_stream
+STREAMED_NODES = {"planner", "compile", "executor", "agent", "tool"}
+
+async def agentwardan_stream(user_input: str, session_id: str = "default") -> AsyncIterator[Dict[str, Any]]:
+    """Run one chat turn, yielding progress frames as the graph runs.
+
+    Frames (dicts with a "type"):
+    - {"type": "node_start", "node": "planner"}
+    - {"type": "token", "node": "agent", "text": "..."}: LLM output as it is generated
+    - {"type": "tool_result", "tool": "list_rooms", "result": {"summary", "data"}}
+    - {"type": "node_end", "node": "planner", "ms": 812.4}
+    - {"type": "answer", "content": "..."}: the final reply, as agentwardan_chat returns it
+
+    Closing the iterator (or cancelling the task consuming it) stops the run.
+    Tool calls already sent to the API still finish there.
+    """
+    history = _get_history(session_id)
+    history.append(HumanMessage(content=user_input))
+
+    reply = await _answer_confirmation(user_input, session_id)
+    if reply is not None:
+        _remember(session_id, history, reply)
+        yield {"type": "answer", "content": reply.content}
+        return
+
+    started: Dict[str, float] = {}
+    final_state = None
+    try:
+        async for event in app.astream_events(_initial_state(history, user_input, session_id), version="v2"):
+            kind, name = event["event"], event.get("name")
+            node = (event.get("metadata") or {}).get("langgraph_node")
+            if kind == "on_chain_start" and name in STREAMED_NODES and node == name:
+                started[event["run_id"]] = time.perf_counter()
+                yield {"type": "node_start", "node": name}
+            elif kind == "on_chain_end" and event["run_id"] in started:
+                ms = (time.perf_counter() - started.pop(event["run_id"])) * 1000
+                yield {"type": "node_end", "node": name, "ms": round(ms, 1)}
+            elif kind == "on_chat_model_stream":
+                text = getattr(event["data"].get("chunk"), "content", "")
+                if isinstance(text, str) and text:
+                    yield {"type": "token", "node": node, "text": text}
+            elif kind == "on_tool_end":
+                yield {"type": "tool_result", "tool": name, "result": _envelope_from_result(event["data"].get("output"))}
+            elif kind == "on_chain_end" and not event.get("parent_ids"):
+                final_state = event["data"].get("output")
+    except (asyncio.CancelledError, GeneratorExit):
+        _remember(session_id, history, AIMessage(content=json.dumps({"summary": "Stopped by the user.", "data": []})))
+        raise
+
+    if not final_state or not final_state.get("messages"):
+        reply = AIMessage(content=json.dumps({"summary": "The agent finished without a reply.", "data": []}))
+    else:
+        reply = final_state["messages"][-1]
+    _remember(session_id, history, reply)
+    yield {"type": "answer", "content": reply.content}
@@ -1,6 +1,7 @@
 # agent/graph2.py
 
-from typing import Any, Dict, List, TypedDict
+import time
+from typing import Any, Dict, List, Optional, TypedDict
 from langchain_core.messages import HumanMessage, AIMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_chroma import Chroma
@@ -12,6 +13,9 @@ from langchain_core.tools import tool
 from langgraph.graph import StateGraph, END
 from dotenv import load_dotenv
 from . import tools as t
+from .config import settings
+from .plan_runner import PlanStep, execution_timing, normalize_plan, run_plan
+from .bulk_compiler import BULK_TOOLS, compile_plan
 import os
 
 load_dotenv()
@@ -54,13 +58,17 @@ class AgentState(TypedDict):
     messages: List[Any]
     plan: Dict[str, Any]
     results: List[str]
+    steps: List[Dict[str, Any]]  # per-step status and timing from the executor
+    execution_stats: Dict[str, Any]
     summary: str
     context: str
 
 # ── PLAN MODEL ─────────────────────────────
 class Step(BaseModel):
+    id: Optional[str] = None
     action: str
     parameters: Dict[str, Any] = {}
+    depends_on: Optional[List[str]] = None
 
 class Plan(BaseModel):
     todo: List[Step]
@@ -101,8 +109,16 @@ You have access to the following tools:
 - assign_any_empty_room_by_name: Assign any empty room to student
 - create_payment_by_name: Create payment by student name
 - set_payments_status_by_name: Update payment status
+- bulk_update_rooms: Update price/capacity of many rooms at once (filter, patch)
+- bulk_set_payment_status: Set the status of all payments of a student at once
+- allocate_rooms: Assign rooms to every unassigned student at once
 - rag_tool: Retrieve hostel info (rules, timings, fees)
 
+Give every step an "id" ("s1", "s2", ...) and a "depends_on" list of the step ids it needs.
+Steps that do not need each other (e.g. payments of three different students) get an empty
+"depends_on" and run in parallel. To pass an earlier result into a parameter, write "$s1" or a
+path into it such as "$s1.data.0.name", and list that step in "depends_on".
+
 Always decide which tool(s) to use to answer the query.
 If the query is about hostel info, mess timings, hostel fee → use rag_tool.
 For student queries, use find_student_by_name or other student tools.
@@ -253,41 +269,55 @@ def planner_node(state: AgentState):
 
     return {"plan": plan, "results": []}
 
+def compile_node(state: AgentState):
+    """Rewrites per-row fan-outs in the plan into bulk steps."""
+    plan = state.get("plan", {})
+    user_input = state["messages"][-1].content if state.get("messages") else ""
+    return {"plan": compile_plan(plan, user_input)}
+
+async def _run_step(step: PlanStep, params: Dict[str, Any], state: AgentState) -> Dict[str, Any]:
+    action = step.action
+    tool_fn = ALL_TOOLS.get(action)
+
+    if action in BULK_TOOLS:
+        # Bulk steps from the compile node; this CLI runs them without a confirmation round-trip
+        try:
+            return {"status": "completed", "result": await BULK_TOOLS[action](**params)}
+        except Exception as e:
+            return {"status": "failed", "error": f"[Error executing {action}: {e}]"}
+    if callable(tool_fn):
+        try:
+            if hasattr(tool_fn, "arun"):
+                result = await tool_fn.arun(params)
+            elif hasattr(tool_fn, "func"):
+                result = await tool_fn.func(**params)
+            else:
+                result = await tool_fn(**params) if params else await tool_fn(state["messages"][-1].content)
+        except Exception as e:
+            return {"status": "failed", "error": f"[Error executing {action}: {e}]"}
+        return {"status": "completed", "result": result}
+    return {"status": "failed", "error": f"Unknown action: {action}"}
+
 async def executor_node(state: AgentState):
-    """Executes the steps defined in the plan."""
+    """Executes the steps defined in the plan, independent ones concurrently."""
     plan = state.get("plan", {})
     todo = plan.get("todo", [])
-    results = []
-
-    for step in todo:
-        if isinstance(step, dict):
-            action = step.get("action", "")
-            params = step.get("parameters", {})
-        elif hasattr(step, "action"):
-            action = step.action
-            params = step.parameters
-        else:
-            action = str(step)
-            params = {}
-
-        tool_fn = ALL_TOOLS.get(action)
-
-        if callable(tool_fn):
-            try:
-                if hasattr(tool_fn, "arun"):
-                    result = await tool_fn.arun(params)
-                elif hasattr(tool_fn, "func"):
-                    result = await tool_fn.func(**params)
-                else:
-                    result = await tool_fn(**params) if params else await tool_fn(state["messages"][-1].content)
-            except Exception as e:
-                result = f"[Error executing {action}: {e}]"
-        else:
-            result = f"Unknown action: {action}"
-
-        results.append(str(result))
-
-    return {"results": results}
+
+    started = time.perf_counter()
+    steps = await run_plan(
+        normalize_plan(todo),
+        lambda step, params: _run_step(step, params, state),
+        max_concurrency=settings.max_parallel_steps,
+    )
+    wall_ms = (time.perf_counter() - started) * 1000
+
+    # The answer node reads results as text, in plan order
+    results = [
+        str(step["result"]) if step["status"] == "completed"
+        else step.get("error") or f"[Skipped {step['description']}]"
+        for step in steps
+    ]
+    return {"results": results, "steps": steps, "execution_stats": execution_timing(steps, wall_ms)}
 
 def answer_node(state: AgentState) -> AgentState:
     """Generates the final answer to the user."""
@@ -306,6 +336,7 @@ def answer_node(state: AgentState) -> AgentState:
 # ── GRAPH ─────────────────────────────────────────────
 graph = StateGraph(AgentState)
 graph.add_node("planner", planner_node)
+graph.add_node("compile", compile_node)
 graph.add_node("executor", executor_node)
 graph.add_node("answer", answer_node)
 
@@ -315,7 +346,8 @@ executor_node.__doc__ = "Executes the steps defined in the plan."
 answer_node.__doc__ = "Generates the final answer to the user."
 
 graph.set_entry_point("planner")
-graph.add_edge("planner", "executor")
+graph.add_edge("planner", "compile")
+graph.add_edge("compile", "executor")
 graph.add_edge("executor", "answer")
 graph.add_edge("answer", END)
 
@@ -327,7 +359,7 @@ if __name__ == "__main__":
 
     async def main():
         print("🤖 Hostel Assistant (with tools + chat history). Type 'quit' to exit.")
-        state: AgentState = {"messages": [], "plan": {}, "results": [], "summary": "", "context": ""}
+        state: AgentState = {"messages": [], "plan": {}, "results": [], "steps": [], "execution_stats": {}, "summary": "", "context": ""}
         while True:
             q = input("You: ")
             if q.lower() in {"quit", "exit"}:
@@ -0,0 +1,232 @@
+"""Service-level handlers behind `InProcessTransport`.
+
+Each handler mirrors the API route a tool calls: same service function,
+request/response schemas, role checks and error codes, so in-process and HTTP
+calls return the same JSON for the same user (the transport's `act_as`
+caller). Only the routes the agent tools use are covered. Routes that
+share a prefix are listed most specific first ("/rooms/bulk" before
+"/rooms/{room_no}").
+"""
+import functools
+import re
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from models.models import Room, Student, UserRole
+from schemas.payments import (
+    PaymentBulkStatusUpdate, PaymentCreate, PaymentCreateByName, PaymentOut, PaymentStatus, PaymentUpdate
+)
+from schemas.room import AllocationRequest, DeleteRoom, RoomBulkUpdate, RoomCreate, RoomOut, RoomWithStudents, UpdateRoom
+from schemas.student import StudentBalanceOut, StudentCreate, StudentUpdate
+from services.balance_services import get_student_balance
+from services.payment_services import (
+    bulk_set_payment_status, create_payment, delete_payment, get_payments_by_student_name, list_payment_rows,
+    update_payment
+)
+from services.room_services import (
+    allocate_rooms, bulk_update_rooms, create_room, delete_room, list_rooms_with_totals, update_room
+)
+from services.student_services import create_student, delete_student, find_students, student_response, update_student
+from .transport import current_caller
+
+# (method, path regex, status code on success, handler(db, params, body, **path_args))
+ROUTES: List[Tuple[str, "re.Pattern[str]", int, Callable[..., Any]]] = []
+
+
+def route(method: str, pattern: str, status_code: int = 200, roles: Optional[Iterable[UserRole]] = None):
+    """Register a handler; `roles` mirrors the route's require_role dependency."""
+    allowed = {role.value for role in roles} if roles else None
+
+    def register(handler):
+        @functools.wraps(handler)
+        def checked(db, params, body, **path_args):
+            if allowed is not None and current_caller().role not in allowed:
+                raise HTTPException(status_code=403, detail="Forbidden")
+            return handler(db, params, body, **path_args)
+
+        ROUTES.append((method, re.compile(f"^{pattern}$"), status_code, checked))
+        return handler
+    return register
+
+
+def _is_admin() -> bool:
+    return current_caller().role == UserRole.admin.value
+
+
+def _own_student_id() -> Optional[int]:
+    """The caller's student id if they are a student with a linked record."""
+    caller = current_caller()
+    return caller.student_id if caller.role == UserRole.student.value else None
+
+
+def _param(params: Dict[str, Any], name: str, convert: Callable[[Any], Any]):
+    """Query parameter converted like FastAPI would; 422 if it does not parse."""
+    value = params.get(name)
+    if value is None or value == "":
+        return None
+    try:
+        return convert(value)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=422, detail=f"Invalid value for query parameter '{name}': {value!r}")
+
+
+def _not_found(call: Callable[[], Any]):
+    """Run a service call whose ValueError the route reports as 404."""
+    try:
+        return call()
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+# ---------- Students ----------
+@route("GET", r"/students/")
+def list_students(db, params, body):
+    if _is_admin():
+        return find_students(db, params.get("name"))
+    student_id = _own_student_id()
+    if not student_id:
+        raise HTTPException(status_code=403, detail="Forbidden")
+    student = db.query(Student).filter_by(id=student_id).first()
+    if not student:
+        raise HTTPException(status_code=404, detail="Student not found")
+    return [student_response(student, db)]
+
+
+@route("POST", r"/students/", 201, roles=[UserRole.admin])
+def add_student(db, params, body):
+    data = StudentCreate.model_validate(body or {})
+    return student_response(create_student(data.name, db, data.room_no), db)
+
+
+@route("GET", r"/students/(?P<student_id>\d+)")
+def get_student(db, params, body, student_id):
+    student = db.query(Student).filter_by(id=int(student_id)).first()
+    if not student:
+        raise HTTPException(status_code=404, detail="Student not found")
+    return student_response(student, db)
+
+
+@route("PUT", r"/students/(?P<student_id>\d+)", roles=[UserRole.admin])
+def put_student(db, params, body, student_id):
+    return update_student(int(student_id), StudentUpdate.model_validate(body or {}), db)
+
+
+@route("DELETE", r"/students/(?P<student_id>\d+)", roles=[UserRole.admin])
+def remove_student(db, params, body, student_id):
+    return delete_student(int(student_id), db)
+
+
+@route("GET", r"/students/(?P<student_id>\d+)/balance")
+def get_balance(db, params, body, student_id):
+    if not _is_admin() and _own_student_id() != int(student_id):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    balance = get_student_balance(int(student_id), db)
+    if balance:
+        return StudentBalanceOut.model_validate(balance)
+    if not db.query(Student.id).filter_by(id=int(student_id)).first():
+        raise HTTPException(status_code=404, detail="Student not found")
+    return StudentBalanceOut(student_id=int(student_id))
+
+
+# ---------- Rooms ----------
+@route("GET", r"/rooms/", roles=[UserRole.admin])
+def get_rooms(db, params, body):
+    return [RoomWithStudents.model_validate(room) for room in list_rooms_with_totals(db)]
+
+
+@route("POST", r"/rooms/", roles=[UserRole.admin])
+def add_room(db, params, body):
+    data = RoomCreate.model_validate(body or {})
+    return RoomOut.model_validate(create_room(data.room_no, data.price, db, capacity=data.capacity))
+
+
+@route("DELETE", r"/rooms/", roles=[UserRole.admin])
+def remove_room(db, params, body):
+    return delete_room(DeleteRoom.model_validate(body or {}).room_no, db)
+
+
+@route("PUT", r"/rooms/bulk", roles=[UserRole.admin])
+def bulk_update(db, params, body):
+    return bulk_update_rooms(RoomBulkUpdate.model_validate(body or {}), db)
+
+
+@route("POST", r"/rooms/allocate", roles=[UserRole.admin])
+def allocate(db, params, body):
+    return allocate_rooms(AllocationRequest.model_validate(body or {}), db)
+
+
+@route("GET", r"/rooms/(?P<room_no>[^/]+)")
+def get_room_by_no(db, params, body, room_no):
+    room = db.query(Room).filter_by(room_no=room_no).first()
+    if not room:
+        raise HTTPException(status_code=404, detail="Room not found")
+    return RoomWithStudents.model_validate(room)
+
+
+@route("PUT", r"/rooms/(?P<room_no>[^/]+)")
+def put_room(db, params, body, room_no):
+    update = UpdateRoom.model_validate(body or {})
+    return RoomOut.model_validate(_not_found(lambda: update_room(room_no, update, db)))
+
+
+# ---------- Payments ----------
+@route("GET", r"/payments/")
+def get_all_payments(db, params, body):
+    if not _is_admin():
+        student_id = _own_student_id()
+        if not student_id:
+            raise HTTPException(status_code=403, detail="Forbidden")
+        return list_payment_rows(db, student_id=student_id)
+    return list_payment_rows(
+        db,
+        _param(params, "month", int),
+        _param(params, "year", int),
+        _param(params, "status", PaymentStatus),
+        student_id=_param(params, "student_id", int),
+    )
+
+
+@route("POST", r"/payments/", 201)
+def add_payment(db, params, body):
+    data = PaymentCreate.model_validate(body or {})
+    return PaymentOut.model_validate(create_payment(
+        data.student_id, data.amount, data.status, data.month, data.year, data.payment_method, db
+    ))
+
+
+@route("POST", r"/payments/by-name/(?P<student_name>[^/]+)", 201)
+def add_payment_by_name(db, params, body, student_name):
+    data = PaymentCreateByName.model_validate(body or {})
+    student = db.query(Student).filter_by(name=student_name).first()
+    if not student:
+        raise HTTPException(status_code=404, detail="Student not found")
+    return PaymentOut.model_validate(create_payment(
+        student.id, data.amount, data.status or PaymentStatus.pending, data.month, data.year, data.payment_method, db
+    ))
+
+
+@route("GET", r"/payments/student/(?P<name>[^/]+)")
+def payments_of_student(db, params, body, name):
+    return _not_found(lambda: get_payments_by_student_name(name, db))
+
+
+@route("PUT", r"/payments/bulk-status")
+def bulk_status(db, params, body):
+    if not _is_admin():
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return bulk_set_payment_status(PaymentBulkStatusUpdate.model_validate(body or {}), db)
+
+
+@route("PUT", r"/payments/(?P<payment_id>\d+)")
+def update_payment_details(db, params, body, payment_id):
+    data = PaymentUpdate.model_validate(body or {})
+    return PaymentOut.model_validate(_not_found(lambda: update_payment(
+        int(payment_id), db, amount=data.amount, status=data.status, month=data.month,
+        year=data.year, payment_method=data.payment_method,
+    )))
+
+
+@route("DELETE", r"/payments/(?P<payment_id>\d+)")
+def remove_payment(db, params, body, payment_id):
+    return _not_found(lambda: delete_payment(int(payment_id), db))
@@ -0,0 +1,198 @@
+"""Dependency-aware execution of planner `todo` steps.
+
+A plan step is either a plain string (the original format) or a dict:
+
+    {"id": "s2", "action": "payments_by_name", "parameters": {"student_name": "$s1.data.0.name"},
+     "depends_on": ["s1"]}
+
+- `id` defaults to "s<position>" (1-based).
+- `action` is a tool name or a free-text step. `description` is accepted as
+  an alias.
+- A parameter value of the form "$<id>" or "$<id>.<key>.<index>..." is
+  replaced with that step's result, or a part of it, before the step runs.
+  Referencing a step also makes it a dependency.
+
+Steps whose dependencies have finished run concurrently (`asyncio.gather`),
+at most `max_concurrency` at a time. A plan in which no step declares an `id`
+or `depends_on` is the original format and runs strictly in order, because
+its steps may rely on one another implicitly; as in the original executor, a
+failed step does not stop the ones after it. A step whose declared dependency
+failed, or that sits on a dependency cycle, is reported as skipped and never
+runs.
+
+Every step result carries its timing in ms, relative to the start of the
+plan: `queued_ms` (when its dependencies were done), `start_ms` (when it got a
+concurrency slot) and `duration_ms`.
+"""
+import asyncio
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+_REF = re.compile(r"^\$([A-Za-z_][\w-]*)((?:\.[\w-]+)*)$")
+
+
+@dataclass
+class PlanStep:
+    index: int
+    id: str
+    action: str
+    parameters: Dict[str, Any] = field(default_factory=dict)
+    depends_on: List[str] = field(default_factory=list)
+    # Steps that must finish first whether or not they succeed (original-format order)
+    after: List[str] = field(default_factory=list)
+
+
+def _get(step: Any, key: str, default=None):
+    if isinstance(step, dict):
+        return step.get(key, default)
+    return getattr(step, key, default)
+
+
+def _references(value: Any) -> List[str]:
+    """Step ids referenced anywhere inside a parameter value."""
+    if isinstance(value, str):
+        match = _REF.match(value)
+        return [match.group(1)] if match else []
+    if isinstance(value, dict):
+        return [ref for item in value.values() for ref in _references(item)]
+    if isinstance(value, (list, tuple)):
+        return [ref for item in value for ref in _references(item)]
+    return []
+
+
+def normalize_plan(todo: List[Any]) -> List[PlanStep]:
+    """PlanStep list for string, dict or pydantic steps, with implicit dependencies filled in."""
+    structured = any(
+        not isinstance(step, str) and (_get(step, "id") is not None or _get(step, "depends_on") is not None)
+        for step in todo
+    )
+    steps: List[PlanStep] = []
+    for index, raw in enumerate(todo):
+        if isinstance(raw, str):
+            action, parameters, step_id, depends_on = raw, {}, None, None
+        else:
+            action = _get(raw, "action") or _get(raw, "description") or ""
+            parameters = dict(_get(raw, "parameters") or {})
+            step_id, depends_on = _get(raw, "id"), _get(raw, "depends_on")
+        step_id = str(step_id) if step_id is not None else f"s{index + 1}"
+        depends = [str(dep) for dep in (depends_on or [])] if structured else []
+        after = [steps[-1].id] if steps and not structured else []
+        for ref in _references(parameters):
+            if ref not in depends and ref != step_id:
+                depends.append(ref)
+        steps.append(PlanStep(index, step_id, str(action), parameters, depends, after))
+    return steps
+
+
+def _lookup(value: Any, path: List[str]) -> Any:
+    for key in path:
+        if isinstance(value, dict) and "data" in value and key not in value and key.isdigit():
+            value = value["data"]  # "$s1.0.id" reads into a {summary, data} envelope
+        if isinstance(value, (list, tuple)):
+            value = value[int(key)]
+        elif isinstance(value, dict):
+            value = value[key]
+        else:
+            raise KeyError(key)
+    return value
+
+
+def resolve_references(value: Any, outputs: Dict[str, Any]) -> Any:
+    """Replace "$<id>.path" strings with the referenced step output."""
+    if isinstance(value, str):
+        match = _REF.match(value)
+        if not match or match.group(1) not in outputs:
+            return value
+        path = [part for part in match.group(2).split(".") if part]
+        try:
+            return _lookup(outputs[match.group(1)], path)
+        except (KeyError, IndexError, ValueError, TypeError):
+            raise ValueError(f"Cannot resolve {value}: step output has no such field")
+    if isinstance(value, dict):
+        return {key: resolve_references(item, outputs) for key, item in value.items()}
+    if isinstance(value, list):
+        return [resolve_references(item, outputs) for item in value]
+    return value
+
+
+def _cyclic(steps: List[PlanStep]) -> set:
+    """Ids of steps that can never become ready (on or behind a cycle, or depending on an unknown id)."""
+    ids = {step.id for step in steps}
+    done: set = set()
+    pending = list(steps)
+    progress = True
+    while pending and progress:
+        progress = False
+        for step in list(pending):
+            if all(dep in done for dep in (*step.depends_on, *step.after) if dep in ids):
+                done.add(step.id)
+                pending.remove(step)
+                progress = True
+    return {step.id for step in pending}
+
+
+async def run_plan(
+    steps: List[PlanStep],
+    execute: Callable[[PlanStep, Dict[str, Any]], Awaitable[Dict[str, Any]]],
+    max_concurrency: int = 4,
+) -> List[Dict[str, Any]]:
+    """Run `execute(step, resolved_parameters)` for every step, respecting dependencies.
+
+    `execute` returns the step's result fields (at least "status"; its
+    "result" is what later steps can reference). Results come back in plan
+    order.
+    """
+    started = time.perf_counter()
+    elapsed = lambda: round((time.perf_counter() - started) * 1000, 1)
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    finished = {step.id: asyncio.Event() for step in steps}
+    outputs: Dict[str, Any] = {}
+    succeeded: set = set()
+    stuck = _cyclic(steps)
+    known = set(finished)
+
+    async def run(step: PlanStep) -> Dict[str, Any]:
+        record: Dict[str, Any] = {"step": step.index + 1, "id": step.id, "description": step.action}
+        if step.depends_on:
+            record["depends_on"] = step.depends_on
+        try:
+            unknown = [dep for dep in step.depends_on if dep not in known]
+            if unknown:
+                return {**record, "status": "skipped", "error": f"Unknown dependency {', '.join(unknown)}"}
+            if step.id in stuck:
+                return {**record, "status": "skipped", "error": "Dependency cycle"}
+            for dep in (*step.depends_on, *step.after):
+                await finished[dep].wait()
+            failed = [dep for dep in step.depends_on if dep not in succeeded]
+            if failed:
+                return {**record, "status": "skipped", "error": f"Dependency {', '.join(failed)} did not complete"}
+
+            queued = elapsed()
+            async with semaphore:
+                start = elapsed()
+                try:
+                    result = await execute(step, resolve_references(step.parameters, outputs))
+                except Exception as e:
+                    result = {"status": "failed", "error": str(e)}
+                record.update(result)
+                record["timing"] = {"queued_ms": queued, "start_ms": start, "duration_ms": round(elapsed() - start, 1)}
+            if record.get("status") == "completed":
+                outputs[step.id] = record.get("result")
+                succeeded.add(step.id)
+            return record
+        finally:
+            finished[step.id].set()
+
+    return list(await asyncio.gather(*(run(step) for step in steps)))
+
+
+def execution_timing(results: List[Dict[str, Any]], wall_ms: float) -> Dict[str, Any]:
+    """Plan-level timing: wall clock against the sum of step durations."""
+    busy = sum(r["timing"]["duration_ms"] for r in results if "timing" in r)
+    return {
+        "wall_ms": round(wall_ms, 1),
+        "step_ms_total": round(busy, 1),
+        "parallel_speedup": round(busy / wall_ms, 2) if wall_ms > 0 else None,
+    }
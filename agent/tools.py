@@ -2,17 +2,7 @@ from __future__ import annotations
 from typing import Optional, List, Dict, Any
 from pydantic import BaseModel, Field
 import httpx
-from .config import settings
-
-# Utility: shared async client factory
-class HttpClient:
-    _client: Optional[httpx.AsyncClient] = None
-
-    @classmethod
-    def client(cls) -> httpx.AsyncClient:
-        if cls._client is None:
-            cls._client = httpx.AsyncClient(timeout=settings.http_timeout)
-        return cls._client
+from .transport import get_transport
 
 # ---------- Students ----------
 class FindStudentByNameInput(BaseModel):
@@ -20,9 +10,7 @@ class FindStudentByNameInput(BaseModel):
 
 async def find_student_by_name(name: str) -> List[Dict[str, Any]]:
     """Return students whose name matches (ilike)."""
-    url = f"{settings.hms_api_base}/students/?name={name}"
-    client = HttpClient.client()
-    r = await client.get(url)
+    r = await get_transport().get("/students/", params={"name": name})
     r.raise_for_status()
     return r.json()
 
@@ -33,9 +21,7 @@ class CreateStudentInput(BaseModel):
     room_no: Optional[str] = None
 
 async def create_student(**payload) -> Dict[str, Any]:
-    url = f"{settings.hms_api_base}/students/"
-    client = HttpClient.client()
-    r = await client.post(url, json=payload)
+    r = await get_transport().post("/students/", json=payload)
     r.raise_for_status()
     return r.json()
 
@@ -44,9 +30,7 @@ class UpdateStudentInput(BaseModel):
     data: Dict[str, Any]
 
 async def update_student(student_id: int, data: Dict[str, Any]) -> Dict[str, Any]:
-    url = f"{settings.hms_api_base}/students/{student_id}"
-    client = HttpClient.client()
-    r = await client.put(url, json=data)
+    r = await get_transport().put(f"/students/{student_id}", json=data)
     r.raise_for_status()
     return r.json()
 
@@ -55,10 +39,9 @@ class DeleteStudentInput(BaseModel):
     confirm: bool = Field(default=False, description="Must be true to execute deletion")
 
 async def delete_student(student_id: int, confirm: bool = False) -> Dict[str, Any]:
-    client = HttpClient.client()
+    transport = get_transport()
     # Fetch details for potential undo and to validate existence
-    get_url = f"{settings.hms_api_base}/students/{student_id}"
-    get_resp = await client.get(get_url)
+    get_resp = await transport.get(f"/students/{student_id}")
     if get_resp.status_code == 404:
         return {"summary": f"Student {student_id} not found.", "data": []}
     get_resp.raise_for_status()
@@ -68,8 +51,7 @@ async def delete_student(student_id: int, confirm: bool = False) -> Dict[str, An
             "summary": f"Confirm delete student id {student_id}?",
             "data": [{"confirm": True, "student_id": student_id}],
         }
-    del_url = f"{settings.hms_api_base}/students/{student_id}"
-    del_resp = await client.delete(del_url)
+    del_resp = await transport.delete(f"/students/{student_id}")
     del_resp.raise_for_status()
     undo_payload = {
         "type": "recreate_student",
@@ -90,9 +72,7 @@ async def list_students(room_no: Optional[str] = None) -> List[Dict[str, Any]]:
     params = {}
     if room_no:
         params["room_no"] = room_no
-    url = f"{settings.hms_api_base}/students/"
-    client = HttpClient.client()
-    r = await client.get(url, params=params)
+    r = await get_transport().get("/students/", params=params)
     r.raise_for_status()
     return r.json()
 
@@ -148,9 +128,7 @@ class CreateRoomInput(BaseModel):
     status: Optional[str] = Field(default="available")
 
 async def create_room(**payload) -> Dict[str, Any]:
-    url = f"{settings.hms_api_base}/rooms/"
-    client = HttpClient.client()
-    r = await client.post(url, json=payload)
+    r = await get_transport().post("/rooms/", json=payload)
     r.raise_for_status()
     return r.json()
 
@@ -159,10 +137,9 @@ class DeleteRoomInput(BaseModel):
     confirm: bool = Field(default=False, description="Must be true to execute deletion")
 
 async def delete_room(room_no: str, confirm: bool = False) -> Dict[str, Any]:
-    client = HttpClient.client()
+    transport = get_transport()
     # Fetch room for undo
-    get_url = f"{settings.hms_api_base}/rooms/{room_no}"
-    get_resp = await client.get(get_url)
+    get_resp = await transport.get(f"/rooms/{room_no}")
     if get_resp.status_code == 404:
         return {"summary": f"Room {room_no} not found.", "data": []}
     get_resp.raise_for_status()
@@ -172,8 +149,7 @@ async def delete_room(room_no: str, confirm: bool = False) -> Dict[str, Any]:
             "summary": f"Confirm delete room {room_no}?",
             "data": [{"confirm": True, "room_no": room_no}],
         }
-    del_url = f"{settings.hms_api_base}/rooms/"
-    del_resp = await client.request("DELETE", del_url, json={"room_no": room_no})
+    del_resp = await transport.delete("/rooms/", json={"room_no": room_no})
     del_resp.raise_for_status()
     undo_payload = {
         "type": "recreate_room",
@@ -195,9 +171,7 @@ async def list_rooms(status: Optional[str] = None) -> List[Dict[str, Any]]:
     params = {}
     if status:
         params["status"] = status
-    url = f"{settings.hms_api_base}/rooms/"
-    client = HttpClient.client()
-    r = await client.get(url, params=params)
+    r = await get_transport().get("/rooms/", params=params)
     r.raise_for_status()
     return r.json()
 
@@ -209,12 +183,40 @@ async def update_room(room_no: str, data: Dict[str, Any]) -> Dict[str, Any]:
     """Update room fields via PUT /rooms/{room_no}.
     Accepts keys: new_room_no, price, capacity.
     """
-    url = f"{settings.hms_api_base}/rooms/{room_no}"
-    client = HttpClient.client()
-    r = await client.put(url, json=data)
+    r = await get_transport().put(f"/rooms/{room_no}", json=data)
     r.raise_for_status()
     return r.json()
 
+class BulkUpdateRoomsInput(BaseModel):
+    filter: Dict[str, Any] = Field(default_factory=dict, description="room_nos, floor, min_price, max_price; empty matches all rooms")
+    patch: Dict[str, Any] = Field(..., description="price, capacity or price_change_percent")
+
+async def bulk_update_rooms(filter: Dict[str, Any], patch: Dict[str, Any]) -> Dict[str, Any]:
+    """Update every matching room in one request via PUT /rooms/bulk."""
+    r = await get_transport().put("/rooms/bulk", json={"filter": filter or {}, "patch": patch})
+    r.raise_for_status()
+    result = r.json()
+    return {"summary": f"Updated {result.get('updated', 0)} room(s).", "data": result.get("rooms") or []}
+
+class AllocateRoomsInput(BaseModel):
+    student_ids: List[int] = Field(default_factory=list, description="Students to place; empty allocates every unassigned student")
+    floor: Optional[str] = Field(None, description="Preferred floor prefix, e.g. 'G' or '2'")
+
+async def allocate_rooms(student_ids: Optional[List[int]] = None, floor: Optional[str] = None) -> Dict[str, Any]:
+    """Place many students in one request via POST /rooms/allocate."""
+    payload: Dict[str, Any] = {"students": [{"student_id": sid} for sid in student_ids or []]}
+    if floor:
+        payload["floor"] = floor
+    r = await get_transport().post("/rooms/allocate", json=payload)
+    r.raise_for_status()
+    result = r.json()
+    assigned = result.get("assigned") or []
+    unassigned = result.get("unassigned") or []
+    summary = f"Assigned rooms to {len(assigned)} student(s)."
+    if unassigned:
+        summary += f" {len(unassigned)} could not be placed."
+    return {"summary": summary, "data": assigned + unassigned}
+
 # ---------- Payments ----------
 class CreatePaymentInput(BaseModel):
     student_id: int
@@ -223,9 +225,7 @@ class CreatePaymentInput(BaseModel):
     status: Optional[str] = Field(default="pending")
 
 async def create_payment(**payload) -> Dict[str, Any]:
-    url = f"{settings.hms_api_base}/payments/"
-    client = HttpClient.client()
-    r = await client.post(url, json=payload)
+    r = await get_transport().post("/payments/", json=payload)
     r.raise_for_status()
     created = r.json()
     student_id = created.get("student_id")
@@ -234,8 +234,7 @@ async def create_payment(**payload) -> Dict[str, Any]:
     data = [created]
     try:
         if isinstance(student_id, int):
-            all_for_student = await list_payments(student_id=student_id)
-            s = _payment_insights_summary(all_for_student, student_name=None)
+            s = _balance_summary(await student_balance(student_id), student_name=None)
             if s:
                 summary = f"{summary} {s}"
     except Exception:
@@ -247,9 +246,7 @@ class UpdatePaymentInput(BaseModel):
     data: Dict[str, Any]
 
 async def update_payment(payment_id: int, data: Dict[str, Any]) -> Dict[str, Any]:
-    url = f"{settings.hms_api_base}/payments/{payment_id}"
-    client = HttpClient.client()
-    r = await client.put(url, json=data)
+    r = await get_transport().put(f"/payments/{payment_id}", json=data)
     r.raise_for_status()
     updated = r.json()
     student_id = updated.get("student_id")
@@ -257,8 +254,7 @@ async def update_payment(payment_id: int, data: Dict[str, Any]) -> Dict[str, Any
     data_out = [updated]
     try:
         if isinstance(student_id, int):
-            all_for_student = await list_payments(student_id=student_id)
-            s = _payment_insights_summary(all_for_student, student_name=None)
+            s = _balance_summary(await student_balance(student_id), student_name=None)
             if s:
                 summary = f"{summary} {s}"
     except Exception:
@@ -269,9 +265,7 @@ class DeletePaymentInput(BaseModel):
     payment_id: int
 
 async def delete_payment(payment_id: int) -> Dict[str, Any]:
-    url = f"{settings.hms_api_base}/payments/{payment_id}"
-    client = HttpClient.client()
-    r = await client.delete(url)
+    r = await get_transport().delete(f"/payments/{payment_id}")
     r.raise_for_status()
     return {"ok": True, "deleted_id": payment_id}
 
@@ -285,22 +279,47 @@ async def list_payments(status: Optional[str] = None, student_id: Optional[int]
         params["status"] = status
     if student_id:
         params["student_id"] = student_id
-    url = f"{settings.hms_api_base}/payments/"
-    client = HttpClient.client()
-    r = await client.get(url, params=params)
+    r = await get_transport().get("/payments/", params=params)
     r.raise_for_status()
     return r.json()
 
+class BulkSetPaymentStatusInput(BaseModel):
+    status: str = Field(..., description="Pending, Paid or Failed")
+    student_name: Optional[str] = Field(None, description="Exact student name")
+    payment_ids: Optional[List[int]] = None
+    from_status: Optional[str] = Field(None, description="Only change payments currently in this status")
+
+async def bulk_set_payment_status(status: str, student_name: Optional[str] = None,
+                                  payment_ids: Optional[List[int]] = None,
+                                  from_status: Optional[str] = None) -> Dict[str, Any]:
+    """Set the status of many payments in one request via PUT /payments/bulk-status."""
+    payload: Dict[str, Any] = {"status": _payment_status(status)}
+    if student_name:
+        payload["student_name"] = student_name
+    if payment_ids:
+        payload["payment_ids"] = payment_ids
+    if from_status:
+        payload["from_status"] = _payment_status(from_status)
+    r = await get_transport().put("/payments/bulk-status", json=payload)
+    r.raise_for_status()
+    result = r.json()
+    return {
+        "summary": f"Updated {result.get('updated', 0)} payment(s) to '{result.get('status')}'.",
+        "data": [{"payment_id": pid, "status": result.get("status")} for pid in result.get("payment_ids") or []],
+    }
+
+def _payment_status(status: str) -> str:
+    """API spelling of a payment status ("paid" -> "Paid")."""
+    return status.strip().capitalize() if isinstance(status, str) else status
+
 # Convenience: payments by student name
 class PaymentsByNameInput(BaseModel):
     student_name: str
 
 async def payments_by_name(student_name: str) -> List[Dict[str, Any]]:
     # Try direct endpoint first (exact name match)
-    client = HttpClient.client()
     try:
-        url = f"{settings.hms_api_base}/payments/student/{student_name}"
-        r = await client.get(url)
+        r = await get_transport().get(f"/payments/student/{student_name}")
         r.raise_for_status()
         payments = r.json()
         summary = _payment_insights_summary(payments, student_name=student_name)
@@ -333,6 +352,26 @@ async def payments_by_name(student_name: str) -> List[Dict[str, Any]]:
         summary = _payment_insights_summary(payments, student_name=exact_name)
         return {"summary": summary, "data": payments}
 
+async def student_balance(student_id: int) -> Dict[str, Any]:
+    """Running totals maintained by the API, instead of summing every payment here."""
+    r = await get_transport().get(f"/students/{student_id}/balance")
+    r.raise_for_status()
+    return r.json()
+
+def _balance_summary(balance: Dict[str, Any], student_name: Optional[str]) -> str:
+    try:
+        name_part = f"{student_name} has " if student_name else ""
+        last_paid = ""
+        if balance.get("last_paid_year"):
+            last_paid = f" Last paid for {balance['last_paid_month']:02d}/{balance['last_paid_year']}."
+        return (
+            f"{name_part}{balance.get('paid_count', 0)} paid (₹{int(balance.get('total_paid') or 0)}), "
+            f"{balance.get('pending_count', 0)} pending (₹{int(balance.get('pending') or 0)}). "
+            f"Total due ₹{int(balance.get('total_due') or 0)}.{last_paid}"
+        )
+    except Exception:
+        return ""
+
 def _payment_insights_summary(payments: List[Dict[str, Any]], student_name: Optional[str]) -> str:
     try:
         total_count = len(payments)
@@ -378,29 +417,20 @@ async def assign_any_empty_room_by_name(student_name: str) -> Dict[str, Any]:
     sid = matches[0].get("id") or matches[0].get("student_id")
     if not isinstance(sid, int):
         return {"summary": "Matched student has no valid id.", "data": []}
-    rooms = await list_rooms()
-    candidates: List[Dict[str, Any]] = []
-    for room in rooms:
-        try:
-            capacity = int(room.get("capacity") or 0)
-            students = room.get("students") or []
-            if isinstance(students, dict):
-                students = list(students.values())
-            available = capacity - len(students)
-            if available > 0:
-                candidates.append({"room_no": room.get("room_no"), "available": available})
-        except Exception:
-            continue
-    if not candidates:
+    r = await get_transport().post("/rooms/allocate", json={"students": [{"student_id": sid}]})
+    r.raise_for_status()
+    result = r.json()
+    assigned = result.get("assigned") or []
+    if not assigned:
+        unassigned = result.get("unassigned") or []
+        reason = unassigned[0].get("reason") if unassigned else "No empty rooms available."
         return {
-            "summary": "No empty rooms available. Try updating capacity or freeing a room.",
+            "summary": f"Could not assign a room to student id {sid}: {reason}.",
             "data": [],
         }
-    best = sorted(candidates, key=lambda r: r["available"], reverse=True)[0]
-    result = await assign_room(sid, best["room_no"])
     return {
-        "summary": f"Assigned room {best['room_no']} to student id {sid}.",
-        "data": [result],
+        "summary": f"Assigned room {assigned[0]['room_no']} to student id {sid}.",
+        "data": assigned,
     }
 
 # Convenience: create payment by student name
@@ -411,7 +441,6 @@ class CreatePaymentByNameInput(BaseModel):
 
 async def create_payment_by_name(student_name: str, amount: float, status: Optional[str] = None) -> Dict[str, Any]:
     from datetime import datetime
-    url = f"{settings.hms_api_base}/payments/by-name/{student_name}"
     now = datetime.now()
     payload = {
         "amount": amount,
@@ -421,8 +450,7 @@ async def create_payment_by_name(student_name: str, amount: float, status: Optio
     }
     if status:
         payload["status"] = status
-    client = HttpClient.client()
-    r = await client.post(url, json=payload)
+    r = await get_transport().post(f"/payments/by-name/{student_name}", json=payload)
     r.raise_for_status()
     created = r.json()
     # Fetch all payments for insights
@@ -450,14 +478,15 @@ async def set_payments_status_by_name(student_name: str, status: str, payment_id
         payments_list = payments
     if not payments_list:
         return {"summary": f"No payments found for '{student_name}'.", "data": []}
-    updated: List[Dict[str, Any]] = []
-    targets = [p for p in payments_list if payment_id is None or p.get("id") == payment_id]
-    for p in targets:
-        pid = p.get("id")
-        amount = p.get("amount", 0)
-        # Backend expects both amount and status in PUT
-        res = await update_payment(pid, {"amount": amount, "status": status})
-        updated.append(res)
+    if not all(isinstance(p, dict) and isinstance(p.get("id"), int) for p in payments_list):
+        # Several students matched the name: pass the choices back for disambiguation
+        return payments
+    targets = [p["id"] for p in payments_list if payment_id is None or p.get("id") == payment_id]
+    if not targets:
+        return {"summary": f"No payment {payment_id} found for '{student_name}'.", "data": []}
+    # One server-side statement for every matching payment
+    result = await bulk_set_payment_status(status, payment_ids=targets)
+    updated = result["data"]
     # After updates, recompute insights
     try:
         latest = await payments_by_name(student_name)
@@ -0,0 +1,173 @@
+"""How agent tools reach the hostel API.
+
+Tools describe each call as an API request (method, path such as "/rooms/bulk",
+query params, JSON body) and hand it to the active transport. Both transports
+return an `httpx.Response`, so tools read status codes and JSON the same way
+whichever one is in use:
+
+- `HttpTransport` sends the request to `settings.hms_api_base`. Use it when
+  the agent runs as a separate process or on another host.
+- `InProcessTransport` is for an agent running inside the API process
+  (routes/agentwardan.py switches to it). It calls the matching `services/*`
+  function (see `inprocess_routes`) directly on its own DB session in a worker
+  thread. This avoids the loopback HTTP round trip and the per-request token
+  lookup. Calls run as the user the agent endpoint authenticated, set with
+  `act_as`, and get the same role checks as the API routes. Without a caller
+  they are refused with 401, like a request without a token.
+
+Select one with AGENT_TOOL_TRANSPORT=http|inprocess. When it is unset, the
+agent uses HTTP standalone and in-process inside the API.
+"""
+from __future__ import annotations
+import asyncio
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+import httpx
+
+from .config import settings
+
+
+@dataclass(frozen=True)
+class Caller:
+    """The API user in-process tool calls act for."""
+    id: int
+    username: str
+    role: str  # a UserRole value, e.g. "Admin"
+    student_id: Optional[int] = None
+
+
+# Per task; asyncio.to_thread copies it into the worker thread running the handler
+_caller: ContextVar[Optional[Caller]] = ContextVar("agent_tool_caller", default=None)
+
+
+def act_as(user) -> Caller:
+    """Make the current task's in-process tool calls run as `user` (a User row or Caller)."""
+    if not isinstance(user, Caller):
+        user = Caller(user.id, user.username, getattr(user.role, "value", user.role), user.student_id)
+    _caller.set(user)
+    return user
+
+
+def current_caller() -> Optional[Caller]:
+    return _caller.get()
+
+
+class Transport:
+    name = "base"
+
+    async def request(self, method: str, path: str, params: Optional[Dict[str, Any]] = None,
+                      json: Any = None) -> httpx.Response:
+        raise NotImplementedError
+
+    async def get(self, path: str, params: Optional[Dict[str, Any]] = None) -> httpx.Response:
+        return await self.request("GET", path, params=params)
+
+    async def post(self, path: str, json: Any = None) -> httpx.Response:
+        return await self.request("POST", path, json=json)
+
+    async def put(self, path: str, json: Any = None) -> httpx.Response:
+        return await self.request("PUT", path, json=json)
+
+    async def delete(self, path: str, json: Any = None) -> httpx.Response:
+        return await self.request("DELETE", path, json=json)
+
+    async def aclose(self) -> None:
+        pass
+
+
+class HttpTransport(Transport):
+    name = "http"
+
+    def __init__(self, base_url: Optional[str] = None, token: Optional[str] = None):
+        self.base_url = (base_url or settings.hms_api_base).rstrip("/")
+        self.token = settings.hms_api_token if token is None else token
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            headers = {"Authorization": f"Bearer {self.token}"} if self.token else None
+            self._client = httpx.AsyncClient(base_url=self.base_url, timeout=settings.http_timeout, headers=headers)
+        return self._client
+
+    async def request(self, method, path, params=None, json=None):
+        return await self.client().request(method, path, params=params, json=json)
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class InProcessTransport(Transport):
+    name = "inprocess"
+
+    def __init__(self, session_factory: Optional[Callable[[], Any]] = None):
+        # Deferred so a standalone (HTTP) agent never imports the API's services
+        from database.db import Session
+        from . import inprocess_routes
+
+        self.session_factory = session_factory or Session
+        self.routes = inprocess_routes.ROUTES
+
+    async def request(self, method, path, params=None, json=None):
+        method = method.upper()
+        split = urlsplit(path)
+        query = dict(parse_qsl(split.query))
+        query.update({key: value for key, value in (params or {}).items() if value is not None})
+        if current_caller() is None:
+            status_code, payload = 401, {"detail": "Not authenticated"}
+        else:
+            status_code, payload = await asyncio.to_thread(self._dispatch, method, split.path, query, json)
+        request = httpx.Request(method, f"{settings.hms_api_base.rstrip('/')}{split.path}", params=query)
+        return httpx.Response(status_code, json=payload, request=request)
+
+    def _dispatch(self, method: str, path: str, params: Dict[str, Any], body: Any) -> Tuple[int, Any]:
+        """Run the matching handler; errors map to the status codes the API would send."""
+        from fastapi import HTTPException
+        from fastapi.encoders import jsonable_encoder
+        from pydantic import ValidationError
+
+        for route_method, pattern, status_code, handler in self.routes:
+            match = pattern.match(path)
+            if route_method != method or match is None:
+                continue
+            path_args = {key: unquote(value) for key, value in match.groupdict().items()}
+            db = self.session_factory()
+            try:
+                return status_code, jsonable_encoder(handler(db, params, body, **path_args))
+            except HTTPException as e:
+                return e.status_code, {"detail": e.detail}
+            except ValidationError as e:
+                return 422, {"detail": jsonable_encoder(e.errors(include_url=False, include_context=False))}
+            except ValueError as e:
+                return 400, {"detail": str(e)}
+            except Exception as e:
+                print(f"In-process {method} {path} failed: {e}")
+                return 500, {"detail": "Internal Server Error"}
+            finally:
+                db.close()
+        return 404, {"detail": "Not Found"}
+
+
+_TRANSPORTS = {"http": HttpTransport, "inprocess": InProcessTransport}
+_transport: Optional[Transport] = None
+
+
+def set_transport(transport) -> Transport:
+    """Switch the transport used by every tool; accepts a name or a Transport instance."""
+    global _transport
+    if isinstance(transport, str):
+        if transport not in _TRANSPORTS:
+            raise ValueError(f"Unknown tool transport '{transport}' (expected one of {', '.join(_TRANSPORTS)})")
+        transport = _TRANSPORTS[transport]()
+    _transport = transport
+    return transport
+
+
+def get_transport() -> Transport:
+    if _transport is None:
+        set_transport(settings.tool_transport or "http")
+    return _transport
@@ -0,0 +1,33 @@
+"""Add composite index on payments (student_id, status, year, month)
+
+Revision ID: c4e8a2f1d9b3
+Revises: 0feed92a9bbd
+Create Date: 2025-10-19 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e8a2f1d9b3'
+down_revision: Union[str, Sequence[str], None] = '0feed92a9bbd'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'ix_payments_student_status_period',
+        'payments',
+        ['student_id', 'status', 'year', 'month'],
+        unique=False,
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_payments_student_status_period', table_name='payments', if_exists=True)
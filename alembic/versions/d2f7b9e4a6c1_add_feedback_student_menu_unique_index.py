@@ -0,0 +1,45 @@
+"""Add unique index on feedback (student_id, menu_id)
+
+Revision ID: d2f7b9e4a6c1
+Revises: c4e8a2f1d9b3
+Create Date: 2025-10-26 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2f7b9e4a6c1'
+down_revision: Union[str, Sequence[str], None] = 'c4e8a2f1d9b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Keep the earliest feedback of any duplicated (student, menu) pair. If any
+    # rows are removed, run utils/rebuild_menu_rating_stats.py afterwards.
+    op.execute(
+        """
+        DELETE FROM feedback
+        WHERE id NOT IN (
+            SELECT min_id FROM (
+                SELECT MIN(id) AS min_id FROM feedback GROUP BY student_id, menu_id
+            ) AS keep
+        )
+        """
+    )
+    op.create_index(
+        'uq_feedback_student_menu',
+        'feedback',
+        ['student_id', 'menu_id'],
+        unique=True,
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('uq_feedback_student_menu', table_name='feedback', if_exists=True)
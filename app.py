@@ -1,11 +1,16 @@
 import os
-from fastapi import FastAPI, Request
+from fastapi import Depends, FastAPI, Request
 from starlette.responses import FileResponse
+from fastapi.responses import ORJSONResponse
 from fastapi.templating import Jinja2Templates
 from contextlib import asynccontextmanager
 from database.db import init_db
 from utils.seed_rooms import init_rooms
 from utils.seed_admin import seed_admin
+from services.rollup_services import ensure_payment_rollups
+from services.balance_services import ensure_student_balances
+from services.menu_stats_services import ensure_menu_rating_stats
+from services.feedback_ingest import ingestor as feedback_ingestor
 from routes.student_routes import router as student_router
 from routes.payment_routes_updated import router as payment_router
 from routes.room_routes import router as room_router
@@ -16,12 +21,20 @@ from routes.upi_routes import router as upi_router
 from routes.menu_routes import router as menu_router
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
+from utils.compression import CompressionMiddleware, compression_stats
+from utils.auth import require_role
+from models.models import User, UserRole
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     init_db()
     init_rooms()
     seed_admin()
+    ensure_payment_rollups()
+    ensure_student_balances()
+    ensure_menu_rating_stats()
+    feedback_ingestor.start()
     yield
+    feedback_ingestor.stop()
 
 # Configure CORS origins
 cors_origins = os.getenv("CORS_ORIGINS", "http://localhost:8000,http://127.0.0.1:8000")
@@ -30,7 +43,7 @@ if cors_origins:
 else:
     origins = ["http://localhost:8000", "http://127.0.0.1:8000"]
 
-app = FastAPI(title="Hostel Management System API", lifespan=lifespan)
+app = FastAPI(title="Hostel Management System API", lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # Add CORS middleware
 app.add_middleware(
@@ -41,6 +54,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# gzip/brotli for JSON, HTML and CSV; receipts, QR images and SSE pass through
+app.add_middleware(CompressionMiddleware, minimum_size=int(os.getenv("COMPRESSION_MIN_SIZE", "1024")))
+
 
 # Serve static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -80,6 +96,10 @@ async def admin_upi_settings(request: Request):
 async def admin_payments(request: Request):
     return templates.TemplateResponse("admin_payments.html", {"request": request})
 
+@app.get("/metrics/compression")
+async def compression_metrics(current_user: User = Depends(require_role([UserRole.admin]))):
+    return compression_stats()
+
 if __name__ == "__main__":
     import uvicorn
 
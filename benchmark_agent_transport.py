@@ -0,0 +1,143 @@
+# benchmark_agent_transport.py
+"""Per-tool latency of the agent tools over the HTTP and in-process transports.
+
+Seeds a throwaway SQLite database (default 300 students, 75 rooms, 3000
+payments), serves the student/room/payment routers with uvicorn on a local
+port, and runs each tool N times (default 50) through both transports:
+
+  http:      tool -> httpx -> uvicorn -> route (auth, validation) -> service
+  inprocess: tool -> worker thread -> service, same schemas as the route
+
+Read tools also compare the two results, which must be identical.
+
+Usage: python benchmark_agent_transport.py [iterations]
+"""
+import asyncio
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+ITERATIONS = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+_db_file = os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{_db_file}"
+os.environ["AGENT_TOOL_TRANSPORT"] = "http"
+
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import insert
+
+from agent import tools
+from agent.transport import Caller, HttpTransport, InProcessTransport, act_as, set_transport
+from database.db import Session, init_db
+from models.models import Payment, Room, Student
+from routes.payment_routes_updated import router as payment_router
+from routes.room_routes import router as room_router
+from routes.student_routes import router as student_router
+from schemas.payments import PaymentMethod, PaymentStatus
+from services.balance_services import rebuild_student_balances
+from utils.auth import create_access_token
+from utils.seed_admin import seed_admin
+
+
+def seed() -> None:
+    init_db()
+    seed_admin()
+    db = Session()
+    db.execute(insert(Room), [{"room_no": f"{floor}{n:02d}", "price": 4000, "capacity": 4}
+                              for floor in range(1, 4) for n in range(1, 26)])
+    db.execute(insert(Student), [{"name": f"Student {i}", "room_id": i % 75 + 1} for i in range(1, 301)])
+    now = datetime.utcnow()
+    db.execute(insert(Payment), [
+        {
+            "student_id": i % 300 + 1,
+            "room_id": i % 75 + 1,
+            "date": now,
+            "amount": 4000.0,
+            "status": PaymentStatus.paid if i % 3 else PaymentStatus.pending,
+            "month": i % 12 + 1,
+            "year": 2020 + i % 10,
+            "transaction_id": f"TXN_{i:08d}",
+            "payment_method": PaymentMethod.cash,
+            "receipt_generated": False,
+        }
+        for i in range(3000)
+    ])
+    db.commit()
+    rebuild_student_balances(db)
+    db.close()
+
+
+def serve() -> str:
+    app = FastAPI(default_response_class=ORJSONResponse)
+    for router in (student_router, payment_router, room_router):
+        app.include_router(router)
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+
+# (tool, call, read-only); writes are idempotent so every iteration does the same work
+CASES = [
+    ("find_student_by_name", lambda: tools.find_student_by_name("Student 12"), True),
+    ("list_students", lambda: tools.list_students(), True),
+    ("list_rooms", lambda: tools.list_rooms(), True),
+    ("list_payments", lambda: tools.list_payments(student_id=7), True),
+    ("payments_by_name", lambda: tools.payments_by_name("Student 7"), True),
+    ("student_balance", lambda: tools.student_balance(7), True),
+    ("update_room", lambda: tools.update_room("101", {"price": 4500}), False),
+    ("bulk_update_rooms", lambda: tools.bulk_update_rooms({"floor": "2"}, {"price": 4200}), False),
+    ("update_payment", lambda: tools.update_payment(1, {"status": "Paid"}), False),
+]
+
+
+async def measure(call) -> tuple:
+    result = await call()  # warm-up, also the result compared across transports
+    timings = []
+    for _ in range(ITERATIONS):
+        started = time.perf_counter()
+        await call()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return result, statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+
+async def main() -> None:
+    seed()
+    act_as(Caller(1, "admin", "Admin"))  # in-process calls run as the seeded admin, like the HTTP token
+    base_url = serve()
+    transports = [
+        HttpTransport(base_url, token=create_access_token({"sub": "admin", "role": "Admin"})),
+        InProcessTransport(),
+    ]
+    results = {}
+    # Both transports run a tool before the next one, so reads see the same data
+    for name, call, _ in CASES:
+        for transport in transports:
+            set_transport(transport)
+            results[name, transport.name] = await measure(call)
+    for transport in transports:
+        await transport.aclose()
+
+    print(f"{ITERATIONS} calls per tool, milliseconds\n")
+    print(f"{'tool':<22}{'http p50':>10}{'http p95':>10}{'inproc p50':>12}{'inproc p95':>12}{'speedup':>9}  same result")
+    for name, _, read_only in CASES:
+        http_result, http_p50, http_p95 = results[name, "http"]
+        local_result, local_p50, local_p95 = results[name, "inprocess"]
+        same = ("yes" if http_result == local_result else "NO") if read_only else "-"
+        print(f"{name:<22}{http_p50:>10.2f}{http_p95:>10.2f}{local_p50:>12.2f}{local_p95:>12.2f}"
+              f"{http_p50 / local_p50:>8.1f}x  {same}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,109 @@
+# benchmark_payment_lists.py
+"""Compare the old and new serialization paths of the payment list endpoints.
+
+Seeds a throwaway SQLite database with N payments (default 100k) and times
+building the JSON body of GET /payments/all-with-students both ways:
+
+  before: ORM Payment objects -> PaymentOut.from_orm().dict() -> response
+          validation against List[dict] -> jsonable_encoder -> json.dumps
+  after:  projected columns -> PaymentListRow dataclasses -> orjson
+
+Usage: python benchmark_payment_lists.py [rows]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+_db_file = os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{_db_file}"
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from sqlalchemy import insert
+from typing import List
+
+from database.db import Session, init_db
+from models.models import Payment, Room, Student
+from schemas.payments import PaymentMethod, PaymentOut, PaymentStatus
+from services.payment_services import get_all_payments_with_student_info
+
+
+def seed(rows: int) -> None:
+    init_db()
+    db = Session()
+    db.execute(insert(Room), [{"room_no": f"R{i}", "price": 4000, "capacity": 4} for i in range(1, 251)])
+    db.execute(insert(Student), [{"name": f"Student {i}", "room_id": i % 250 + 1} for i in range(1, 1001)])
+    now = datetime.utcnow()
+    db.execute(insert(Payment), [
+        {
+            "student_id": i % 1000 + 1,
+            "room_id": i % 250 + 1,
+            "date": now,
+            "amount": 4000.0,
+            "status": PaymentStatus.paid if i % 3 else PaymentStatus.pending,
+            "month": i % 12 + 1,
+            "year": 2020 + i % 10,
+            "transaction_id": f"TXN_{i:08d}",
+            "payment_method": PaymentMethod.online if i % 2 else PaymentMethod.cash,
+            "receipt_generated": bool(i % 3),
+        }
+        for i in range(rows)
+    ])
+    db.commit()
+    db.close()
+
+
+def before() -> bytes:
+    db = Session()
+    try:
+        results = db.query(Payment, Student.name, Room.room_no).join(
+            Student, Payment.student_id == Student.id
+        ).join(Room, Payment.room_id == Room.id).all()
+        payments = []
+        for payment, student_name, room_no in results:
+            payment_dict = PaymentOut.from_orm(payment).dict()
+            payment_dict["student_name"] = student_name
+            payment_dict["room_no"] = room_no
+            payments.append(payment_dict)
+        content = [p.dict() if hasattr(p, "dict") else p for p in payments]
+        validated = TypeAdapter(List[dict]).validate_python(content)
+        return json.dumps(jsonable_encoder(validated), ensure_ascii=False, separators=(",", ":")).encode()
+    finally:
+        db.close()
+
+
+def after() -> bytes:
+    db = Session()
+    try:
+        return orjson.dumps(get_all_payments_with_student_info(db), option=orjson.OPT_NON_STR_KEYS)
+    finally:
+        db.close()
+
+
+def measure(label: str, fn) -> None:
+    fn()  # warm up caches and the connection pool
+    start = time.perf_counter()
+    body = fn()
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{label:<7} {elapsed * 1000:9.0f} ms  {ROWS / elapsed:12,.0f} rows/s  "
+          f"peak alloc {peak / 1_048_576:8.1f} MiB  body {len(body) / 1_048_576:6.1f} MiB")
+
+
+if __name__ == "__main__":
+    print(f"Seeding {ROWS:,} payments...")
+    seed(ROWS)
+    measure("before", before)
+    measure("after", after)
+    assert len(orjson.loads(after())) == len(json.loads(before())) == ROWS
@@ -1,5 +1,6 @@
 import os
 from sqlalchemy import create_engine
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 # Get database URL from environment variable, fallback to SQLite for local development
@@ -24,6 +25,22 @@ def init_db() -> None:
     import models.upi_settings
     # Create tables if they don't exist (idempotent operation)
     Base.metadata.create_all(bind=engine)
+    _ensure_feedback_unique_index()
+
+
+def _ensure_feedback_unique_index() -> None:
+    """Add uq_feedback_student_menu to a feedback table created before it existed.
+
+    create_all skips indexes of tables that already exist, and the write-behind
+    feedback ingest relies on this one to skip duplicate rows. Existing
+    duplicates block it; alembic revision d2f7b9e4a6c1 removes them first.
+    """
+    from models.models import Feedback
+    index = next(i for i in Feedback.__table__.indexes if i.name == "uq_feedback_student_menu")
+    try:
+        index.create(bind=engine, checkfirst=True)
+    except SQLAlchemyError as e:
+        print(f"Could not create {index.name} (duplicate feedback rows?); run `alembic upgrade head`: {e}")
 
 def get_db():
     db =Session()
@@ -1,5 +1,5 @@
 # models/models.py
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Enum, Text
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Enum, Text, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from database.db import Base
 import enum
@@ -37,6 +37,10 @@ class Student(Base):
 
 class Payment(Base):
     __tablename__ = "payments"
+    __table_args__ = (
+        # Serves "has this student paid for the period" probes (defaulters report)
+        Index("ix_payments_student_status_period", "student_id", "status", "year", "month"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     student_id = Column(Integer, ForeignKey("students.id", ondelete="CASCADE"))
@@ -105,6 +109,10 @@ class Menu(Base):
 
 class Feedback(Base):
     __tablename__ = "feedback"
+    __table_args__ = (
+        # One feedback per student and menu; lets batched inserts skip duplicates
+        Index("uq_feedback_student_menu", "student_id", "menu_id", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     student_id = Column(Integer, ForeignKey("students.id", ondelete="CASCADE"), nullable=False)
@@ -117,3 +125,114 @@ class Feedback(Base):
     # Relationships
     student = relationship("Student", backref="feedbacks")
     menu = relationship("Menu", back_populates="feedbacks")
+
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    key = Column(String(300), primary_key=True)  # "<scope>:<client key>"
+    request_hash = Column(String(64), nullable=False)
+    status_code = Column(Integer, nullable=True)  # NULL while the first request is in flight
+    response_body = Column(Text, nullable=True)  # JSON-encoded response
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+class PaymentMonthlyRollup(Base):
+    __tablename__ = "payment_monthly_rollups"
+    __table_args__ = (
+        Index("ix_payment_rollup_period", "year", "month"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    # The key columns as text ("2025-7|paid|online|12"); status and room_id may be
+    # NULL, which a unique index never matches, so concurrent writers upsert on this
+    bucket = Column(String(64), nullable=False, unique=True)
+    year = Column(Integer, nullable=False)
+    month = Column(Integer, nullable=False)
+    status = Column(Enum(PaymentStatus))
+    payment_method = Column(Enum(PaymentMethod), nullable=False)
+    room_id = Column(Integer, nullable=True)  # copied from payments.room_id
+    payment_count = Column(Integer, default=0, nullable=False)
+    total_amount = Column(Float, default=0, nullable=False)
+
+
+class StudentBalance(Base):
+    __tablename__ = "student_balances"
+
+    student_id = Column(Integer, ForeignKey("students.id", ondelete="CASCADE"), primary_key=True)
+    total_due = Column(Float, default=0, nullable=False)  # paid + pending; failed rows are not owed
+    total_paid = Column(Float, default=0, nullable=False)
+    pending = Column(Float, default=0, nullable=False)
+    paid_count = Column(Integer, default=0, nullable=False)
+    pending_count = Column(Integer, default=0, nullable=False)
+    last_paid_year = Column(Integer, nullable=True)
+    last_paid_month = Column(Integer, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+
+class MenuRatingStats(Base):
+    __tablename__ = "menu_rating_stats"
+
+    menu_id = Column(Integer, ForeignKey("menu.id", ondelete="CASCADE"), primary_key=True)
+    feedback_count = Column(Integer, default=0, nullable=False)
+    rating_sum = Column(Integer, default=0, nullable=False)
+    # Histogram of 1-5 ratings
+    rating_1 = Column(Integer, default=0, nullable=False)
+    rating_2 = Column(Integer, default=0, nullable=False)
+    rating_3 = Column(Integer, default=0, nullable=False)
+    rating_4 = Column(Integer, default=0, nullable=False)
+    rating_5 = Column(Integer, default=0, nullable=False)
+
+
+class MenuTemplate(Base):
+    __tablename__ = "menu_templates"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(100), unique=True, nullable=False)
+    description = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    items = relationship(
+        "MenuTemplateItem", back_populates="template", cascade="all, delete-orphan",
+        order_by="(MenuTemplateItem.day_of_week, MenuTemplateItem.meal_type)",
+    )
+
+
+class MenuTemplateItem(Base):
+    __tablename__ = "menu_template_items"
+    __table_args__ = (
+        UniqueConstraint("template_id", "day_of_week", "meal_type", name="uq_menu_template_slot"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    template_id = Column(Integer, ForeignKey("menu_templates.id", ondelete="CASCADE"), nullable=False)
+    day_of_week = Column(Integer, nullable=False)  # 0 = Monday ... 6 = Sunday, as date.weekday()
+    meal_type = Column(Enum(MealType), nullable=False)
+    items = Column(Text, nullable=False)
+
+    template = relationship("MenuTemplate", back_populates="items")
+
+
+class MealAttendance(Base):
+    __tablename__ = "meal_attendance"
+    __table_args__ = (
+        UniqueConstraint("menu_id", "student_id", name="uq_meal_attendance_menu_student"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    menu_id = Column(Integer, ForeignKey("menu.id", ondelete="CASCADE"), nullable=False)
+    student_id = Column(Integer, ForeignKey("students.id", ondelete="CASCADE"), nullable=False)
+    attending = Column(Boolean, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+
+class MenuHeadcount(Base):
+    __tablename__ = "menu_headcounts"
+
+    menu_id = Column(Integer, ForeignKey("menu.id", ondelete="CASCADE"), primary_key=True)
+    opted_in = Column(Integer, default=0, nullable=False)
+    opted_out = Column(Integer, default=0, nullable=False)
+    # Set when intents are frozen at the cutoff; the counters stop changing then
+    frozen_at = Column(DateTime, nullable=True)
+    total_students = Column(Integer, nullable=True)  # snapshot taken at freeze time
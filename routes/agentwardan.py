@@ -1,17 +1,25 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, status
 from fastapi import Depends
 from pydantic import BaseModel
-from agent.graph import agentwardan_chat
+from agent.graph import agentwardan_chat, agentwardan_stream
+from agent.config import settings as agent_settings
+from agent.transport import act_as, set_transport
 from database.db import Session
 from models.models import Student
-from utils.auth import require_role
+from utils.auth import get_stream_user, require_role
 from models.models import UserRole
 from typing import Any, Dict, List
+import asyncio
 import json
 
 
 router = APIRouter(prefix="/api/agent", tags=["agent"])
 
+# The agent runs inside the API here, so its tools call the services directly,
+# as the user who asked (see act_as) and with the same role checks as the routes
+if not agent_settings.tool_transport:
+    set_transport("inprocess")
+
 
 class AgentQuery(BaseModel):
     query: str
@@ -26,10 +34,6 @@ def _envelope_from_answer(answer: Any) -> Dict[str, Any]:
     - Otherwise, treat as plain text summary with empty data.
     """
     try:
-        # If already dict with summary/data
-        if isinstance(answer, dict) and "summary" in answer and "data" in answer:
-            return {"summary": str(answer.get("summary", "")), "data": answer.get("data") or []}
-
         # If string, try to parse JSON
         if isinstance(answer, str):
             try:
@@ -39,6 +43,10 @@ def _envelope_from_answer(answer: Any) -> Dict[str, Any]:
                 # Non-JSON string, return as summary
                 return {"summary": answer, "data": []}
 
+        # If already dict with summary/data (the executor replies with one as JSON text)
+        if isinstance(answer, dict) and "summary" in answer and "data" in answer:
+            return {"summary": str(answer.get("summary", "")), "data": answer.get("data") or []}
+
         # If list, compute count summary
         if isinstance(answer, list):
             count = len(answer)
@@ -85,6 +93,7 @@ async def agent_query(payload: AgentQuery, user=Depends(require_role([UserRole.a
         finally:
             db.close()
 
+    act_as(user)
     try:
         answer = await agentwardan_chat(payload.query, session_id=payload.session_id or "default")
         envelope = _envelope_from_answer(answer)
@@ -93,22 +102,89 @@ async def agent_query(payload: AgentQuery, user=Depends(require_role([UserRole.a
         return {"summary": f"Agent error: {e}", "data": []}
 
 
+async def _run_ws_query(ws: WebSocket, query: str, session_id: str, stream: bool) -> None:
+    """Answer one query on the socket; the turn ends with a "final", "cancelled" or "error" frame."""
+    try:
+        if stream:
+            async for frame in agentwardan_stream(query, session_id=session_id):
+                if frame["type"] == "answer":
+                    frame = {"type": "final", **_envelope_from_answer(frame["content"])}
+                await ws.send_json(frame)
+        else:
+            answer = await agentwardan_chat(query, session_id=session_id)
+            await ws.send_json({"type": "final", **_envelope_from_answer(answer)})
+    except asyncio.CancelledError:
+        try:
+            await ws.send_json({"type": "cancelled"})
+        except Exception:
+            pass  # The client is gone
+        raise
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        try:
+            await ws.send_json({"type": "error", "error": f"Agent error: {e}"})
+        except Exception:
+            pass
+
+
+def _ws_caller(token: str | None):
+    """The Admin/Agent user a WebSocket token belongs to, or None."""
+    if not token:
+        return None
+    db = Session()
+    try:
+        user = get_stream_user(token, db)
+    except HTTPException:
+        return None
+    finally:
+        db.close()
+    return user if user.role in (UserRole.admin, UserRole.agent) else None
+
+
 @router.websocket("/ws/agent")
-async def agent_ws(ws: WebSocket):
-    """Simple WS that accepts a JSON: {"query": "..."} and returns {"answer": "..."}.
-    For now we return once; can be extended to streaming tokens.
+async def agent_ws(ws: WebSocket, token: str | None = None):
+    """Agent chat over a WebSocket, streamed as JSON frames.
+
+    Browsers cannot set headers on a WebSocket, so the access token comes as the
+    `token` query parameter; like POST /query it must belong to an admin or agent,
+    otherwise the socket is closed with 1008 (policy violation).
+
+    Client messages:
+    - {"query": "...", "session_id": "..."} starts a turn; add "stream": false to get
+      only the final frame.
+    - {"type": "stop"} cancels the running turn.
+
+    Server frames carry a "type": node_start, token, tool_result and node_end
+    while the turn runs (see agent.graph.agentwardan_stream), then exactly one of
+    final ({"summary", "data"} like POST /query), cancelled or error. One turn
+    runs at a time per socket; disconnecting cancels it.
     """
+    user = _ws_caller(token)
+    if user is None:
+        await ws.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    act_as(user)  # turns run in tasks created below, which inherit the caller
     await ws.accept()
+    running: asyncio.Task | None = None
     try:
         while True:
             data = await ws.receive_json()
+            if data.get("type") == "stop":
+                if running and not running.done():
+                    running.cancel()
+                continue
             user_query = data.get("query", "")
             session_id = data.get("session_id") or "default"
             if not user_query:
-                await ws.send_json({"summary": "query is required", "data": []})
+                await ws.send_json({"type": "error", "error": "query is required"})
+                continue
+            if running and not running.done():
+                await ws.send_json({"type": "error", "error": "A query is already running. Send a stop message first."})
                 continue
-            answer = await agentwardan_chat(user_query, session_id=session_id)
-            envelope = _envelope_from_answer(answer)
-            await ws.send_json(envelope)
+            running = asyncio.create_task(_run_ws_query(ws, user_query, session_id, data.get("stream", True)))
     except WebSocketDisconnect:
         pass
+    finally:
+        if running and not running.done():
+            running.cancel()
@@ -1,18 +1,27 @@
-from fastapi import APIRouter, HTTPException, Depends, status, Query
+from fastapi import APIRouter, HTTPException, Depends, status, Query, Request, Response
 from models.models import User, UserRole
 from database.db import Session
 from services.menu_services import (
     create_menu, get_menus, get_menu_by_id, update_menu, delete_menu,
     create_feedback, get_feedbacks, update_feedback, delete_feedback,
-    get_menu_feedback_stats
+    get_menu_feedback_stats, create_menus_bulk, get_today_menus_cached
+)
+from services.feedback_analytics import feedback_analytics
+from services.feedback_ingest import ingestor
+from services.attendance_services import set_attendance, get_headcount, freeze_attendance
+from services.menu_template_services import (
+    create_menu_template, get_menu_templates, get_menu_template, delete_menu_template, clone_menus
 )
 from schemas.menu import (
     MenuCreate, MenuUpdate, MenuResponse, MenuWithFeedbackResponse,
-    FeedbackCreate, FeedbackUpdate, FeedbackResponse
+    FeedbackCreate, FeedbackUpdate, FeedbackResponse, BulkMenuResult,
+    MenuTemplateCreate, MenuTemplateResponse, MenuCloneRequest, MenuCloneResult,
+    AttendanceUpdate, HeadcountResponse
 )
 from utils.auth import get_current_user, require_role
+from utils.table_versions import make_etag, not_modified
 from typing import List, Optional
-from datetime import datetime
+from datetime import date as date_type, datetime
 
 router = APIRouter(prefix="/menu", tags=["menu"])
 
@@ -38,13 +47,20 @@ def add_menu(
 
 @router.get("/", response_model=List[MenuResponse])
 def list_menus(
+    request: Request,
+    response: Response,
     date: Optional[datetime] = Query(None, description="Filter by date"),
     meal_type: Optional[str] = Query(None, description="Filter by meal type (breakfast, lunch, dinner, snacks)"),
+    start_date: Optional[date_type] = Query(None, description="First day to include (YYYY-MM-DD)"),
+    end_date: Optional[date_type] = Query(None, description="First day to exclude (YYYY-MM-DD)"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get all menus with optional filtering"""
-    return get_menus(db, date, meal_type)
+    """Get all menus with optional filtering by day or by [start_date, end_date)"""
+    cached = not_modified(request, response, make_etag("menu", vary=str(request.url.query)))
+    if cached:
+        return cached
+    return get_menus(db, date, meal_type, start=start_date, end=end_date)
 
 
 @router.get("/{menu_id}", response_model=MenuWithFeedbackResponse)
@@ -94,6 +110,38 @@ def add_feedback(
     return create_feedback(feedback, db)
 
 
+@router.post("/feedback/queue", response_model=dict, status_code=status.HTTP_202_ACCEPTED)
+def queue_feedback(
+    feedback: FeedbackCreate,
+    response: Response,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Accept feedback for write-behind storage (All authenticated users)
+
+    Meant for the post-meal rush: the feedback is validated against cached
+    student/menu ids and written in a batch shortly after. A full queue falls
+    back to a direct write. Feedback the student already gave for the menu is
+    acknowledged but not stored again (the unique index skips it).
+    """
+    if current_user.role == UserRole.student and current_user.student_id != feedback.student_id:
+        raise HTTPException(status_code=403, detail="Students can only submit feedback for themselves")
+
+    if ingestor.submit(feedback):
+        return {"status": "queued", "student_id": feedback.student_id, "menu_id": feedback.menu_id}
+    created = create_feedback(feedback, db)
+    response.status_code = status.HTTP_201_CREATED
+    return {"status": "created", "student_id": feedback.student_id, "menu_id": feedback.menu_id, "feedback_id": created.id}
+
+
+@router.get("/feedback/queue/stats", response_model=dict)
+def feedback_queue_stats(
+    current_user: User = Depends(require_role([UserRole.admin, UserRole.chef]))
+):
+    """Counters of the write-behind feedback queue (Admin/Chef only)"""
+    return ingestor.stats()
+
+
 @router.get("/feedback/", response_model=List[FeedbackResponse])
 def list_feedbacks(
     student_id: Optional[int] = Query(None, description="Filter by student ID"),
@@ -164,35 +212,146 @@ def get_menu_stats(
     return get_menu_feedback_stats(menu_id, db)
 
 
+@router.get("/analytics/feedback", response_model=dict)
+def get_feedback_analytics(
+    start_date: Optional[date_type] = Query(None, description="First day to include (default: 30 days ago)"),
+    end_date: Optional[date_type] = Query(None, description="First day to exclude (default: tomorrow)"),
+    window: int = Query(7, description="Days in the rolling mean"),
+    min_count: int = Query(3, description="Minimum ratings for a dish to be ranked"),
+    limit: int = Query(10, description="Number of lowest-rated dishes to return"),
+    current_user: User = Depends(require_role([UserRole.admin, UserRole.chef])),
+    db: Session = Depends(get_db)
+):
+    """Per-dish ratings, meal-type comparison and daily trend over a date range (Admin/Chef only)"""
+    try:
+        return feedback_analytics(db, start_date, end_date, window, min_count, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+# Attendance endpoints
+
+@router.put("/{menu_id}/attendance", response_model=HeadcountResponse)
+def update_attendance(
+    menu_id: int,
+    intent: AttendanceUpdate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Opt in to or out of a meal until its cutoff (Students for themselves, Admin/Chef for anyone)"""
+    if current_user.role in [UserRole.admin, UserRole.chef] and intent.student_id is not None:
+        student_id = intent.student_id
+    else:
+        student_id = current_user.student_id
+        if student_id is None or (intent.student_id is not None and intent.student_id != student_id):
+            raise HTTPException(status_code=403, detail="Students can only set their own attendance")
+    return set_attendance(menu_id, student_id, intent.attending, db)
+
+
+@router.get("/{menu_id}/headcount", response_model=HeadcountResponse)
+def menu_headcount(
+    menu_id: int,
+    current_user: User = Depends(require_role([UserRole.admin, UserRole.chef])),
+    db: Session = Depends(get_db)
+):
+    """Live headcount for a meal; frozen at the cutoff (Admin/Chef only)"""
+    return get_headcount(menu_id, db)
+
+
+@router.post("/{menu_id}/attendance/freeze", response_model=HeadcountResponse)
+def freeze_menu_attendance(
+    menu_id: int,
+    current_user: User = Depends(require_role([UserRole.admin, UserRole.chef])),
+    db: Session = Depends(get_db)
+):
+    """Freeze attendance intents before the cutoff (Admin/Chef only)"""
+    return freeze_attendance(menu_id, db)
+
+
 # Bulk operations
 
-@router.post("/bulk", response_model=List[MenuResponse], status_code=status.HTTP_201_CREATED)
+@router.post("/bulk", response_model=BulkMenuResult, status_code=status.HTTP_201_CREATED)
 def create_bulk_menus(
     menus: List[MenuCreate],
+    upsert: bool = Query(False, description="Replace the items of menus that already exist"),
+    current_user: User = Depends(require_role([UserRole.admin, UserRole.chef])),
+    db: Session = Depends(get_db)
+):
+    """Create multiple menu items at once in a single transaction (Admin/Chef only)
+
+    Menus whose (date, meal_type) already exists are reported under `skipped`,
+    or updated in place when `upsert=true`.
+    """
+    return create_menus_bulk(menus, db, upsert)
+
+
+# Templates and cloning
+
+@router.post("/templates/", response_model=MenuTemplateResponse, status_code=status.HTTP_201_CREATED)
+def add_menu_template(
+    template: MenuTemplateCreate,
+    current_user: User = Depends(require_role([UserRole.admin, UserRole.chef])),
+    db: Session = Depends(get_db)
+):
+    """Create a weekly menu template (Admin/Chef only)"""
+    return create_menu_template(template, db)
+
+
+@router.get("/templates/", response_model=List[MenuTemplateResponse])
+def list_menu_templates(
+    current_user: User = Depends(require_role([UserRole.admin, UserRole.chef])),
+    db: Session = Depends(get_db)
+):
+    """List weekly menu templates (Admin/Chef only)"""
+    return get_menu_templates(db)
+
+
+@router.get("/templates/{template_id}", response_model=MenuTemplateResponse)
+def get_template(
+    template_id: int,
+    current_user: User = Depends(require_role([UserRole.admin, UserRole.chef])),
+    db: Session = Depends(get_db)
+):
+    """Get a weekly menu template (Admin/Chef only)"""
+    return get_menu_template(template_id, db)
+
+
+@router.delete("/templates/{template_id}", response_model=dict)
+def remove_menu_template(
+    template_id: int,
+    current_user: User = Depends(require_role([UserRole.admin, UserRole.chef])),
+    db: Session = Depends(get_db)
+):
+    """Delete a weekly menu template (Admin/Chef only)"""
+    return delete_menu_template(template_id, db)
+
+
+@router.post("/clone", response_model=MenuCloneResult, status_code=status.HTTP_201_CREATED)
+def clone_menu_range(
+    request: MenuCloneRequest,
     current_user: User = Depends(require_role([UserRole.admin, UserRole.chef])),
     db: Session = Depends(get_db)
 ):
-    """Create multiple menu items at once (Admin/Chef only)"""
-    created_menus = []
-    for menu_data in menus:
-        try:
-            menu = create_menu(menu_data, db)
-            created_menus.append(menu)
-        except Exception as e:
-            # Continue with other menus if one fails
-            continue
+    """Fill a date range from a template or from an existing range of menus (Admin/Chef only)
 
-    return [MenuResponse.from_orm(menu) for menu in created_menus]
+    Days that already have a menu for a meal keep it; they are counted in `skipped`.
+    """
+    return clone_menus(request, db)
 
 
 @router.get("/today/", response_model=List[MenuResponse])
 def get_today_menus(
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get today's menu items"""
     today = datetime.now().date()
-    return get_menus(db, date=today)
+    cached = not_modified(request, response, make_etag("menu", vary=today.isoformat()))
+    if cached:
+        return cached
+    return get_today_menus_cached(db)
 
 
 @router.get("/date/{date_str}", response_model=List[MenuResponse])
@@ -1,22 +1,29 @@
-from fastapi import APIRouter, HTTPException, Depends, status, Query
-from fastapi.responses import StreamingResponse, FileResponse
+from fastapi import APIRouter, HTTPException, Depends, status, Query, BackgroundTasks, UploadFile, File, Header, Request
+from fastapi.responses import StreamingResponse, FileResponse, ORJSONResponse
 from database.db import Session
 from typing import List, Optional
 from schemas.payments import (
     PaymentCreate, PaymentUpdate, PaymentOut, PaymentStatus,
     PaymentCreateByName, PaymentMarkAsPaid, PaymentMethod,
-    CreateOrderRequest, VerifyPaymentRequest
+    CreateOrderRequest, VerifyPaymentRequest, DuesGenerateRequest, DuesGenerateResult, DefaultersReport,
+    BulkReviewRequest, BulkReviewResult, ReviewAction, PaymentBulkStatusUpdate, PaymentBulkStatusResult
 )
 from services.payment_services import (
     create_payment, update_payment, get_payments_by_student,
     get_payments_by_room, get_payments_by_student_name,
     get_all_payments_with_student_info, get_payment_stats,
-    mark_payment_as_paid, generate_payment_receipt, export_payments_to_csv
+    mark_payment_as_paid, generate_payment_receipt, iter_payments_csv,
+    list_payment_rows, generate_monthly_dues, get_defaulters, bulk_review_payments, submit_payment_for_verification, prerender_receipts, get_cached_receipt,
+    bulk_set_payment_status
 )
+from services.reconciliation_services import reconcile_statement
+from services.rollup_services import payment_timeseries
+from services.payment_events import stream_payment_events
 from models.models import Payment, Student, User, UserRole, Room
-from utils.auth import get_current_user
+from utils.auth import get_current_user, get_stream_user
 from utils.payment_utils import generate_upi_qr
 from utils.upi_config import get_upi_config
+from utils.idempotency import run_idempotent
 import io
 import uuid
 from datetime import datetime
@@ -32,31 +39,48 @@ def get_db():
 
 # UPI Payment endpoints
 @router.post('/create-order')
-async def create_order(req: CreateOrderRequest, db: Session = Depends(get_db)):
+async def create_order(
+    req: CreateOrderRequest,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    db: Session = Depends(get_db)
+):
     """Create a mock payment order with UPI QR code and deep link."""
-    fake_order_id = f"order_{uuid.uuid4().hex[:10]}"
-    payment = create_payment(
-        req.student_id,
-        req.amount,
-        PaymentStatus.pending,
-        req.month,
-        req.year,
-        PaymentMethod.online,
-        db
-    )
-
-    # Update payment with the order ID as transaction ID for verification
-    payment.transaction_id = fake_order_id
-    db.commit()
-
-    # Get UPI configuration from database
-    upi_config = get_upi_config()
-    upi_url, qr_bytes = generate_upi_qr(upi_config["upi_id"], upi_config["merchant_name"], req.amount, fake_order_id)
+    def place_order():
+        fake_order_id = f"order_{uuid.uuid4().hex[:10]}"
+
+        # Build the QR first: a failed attempt must not leave a pending order
+        # behind, or a retry with the same Idempotency-Key would create a second one
+        upi_config = get_upi_config()
+        upi_url, qr_bytes = generate_upi_qr(upi_config["upi_id"], upi_config["merchant_name"], req.amount, fake_order_id)
+
+        payment = create_payment(
+            req.student_id,
+            req.amount,
+            PaymentStatus.pending,
+            req.month,
+            req.year,
+            PaymentMethod.online,
+            db
+        )
 
-    # Return the QR code image as base64 string for frontend display
-    import base64
-    qr_base64 = base64.b64encode(qr_bytes).decode('utf-8')
-    return {"order_id": fake_order_id, "upi_url": upi_url, "payment_id": payment.id, "qr_base64": qr_base64}
+        # Update payment with the order ID as transaction ID for verification
+        # (create_payment returns a PaymentOut, so the row is updated directly)
+        try:
+            db.query(Payment).filter_by(id=payment.id).update({"transaction_id": fake_order_id})
+            db.commit()
+        except Exception:
+            db.rollback()
+            db.delete(db.get(Payment, payment.id))  # ORM delete, so balances and rollups follow
+            db.commit()
+            raise
+
+        # Return the QR code image as base64 string for frontend display
+        import base64
+        qr_base64 = base64.b64encode(qr_bytes).decode('utf-8')
+        return {"order_id": fake_order_id, "upi_url": upi_url, "payment_id": payment.id, "qr_base64": qr_base64}
+
+    # Retries with the same Idempotency-Key replay the first order instead of creating a new one
+    return run_idempotent(idempotency_key, "create-order", req, place_order, db)
 
 @router.get('/student-payment-info')
 async def get_student_payment_info(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
@@ -93,19 +117,32 @@ async def get_student_payment_info(current_user: User = Depends(get_current_user
 @router.post('/verify-payment')
 async def verify_payment(req: VerifyPaymentRequest, db: Session = Depends(get_db)):
     """Mock payment verification - create payment record for admin verification."""
-    payment = db.query(Payment).filter_by(transaction_id=req.razorpay_order_id).first()
-    if not payment:
-        raise HTTPException(status_code=404, detail="Order not found")
-
-    # Update payment with verification details but keep status as pending for admin approval
-    payment.status = PaymentStatus.pending  # Keep as pending for admin verification
-    payment.payment_method = PaymentMethod.online
-    payment.date = datetime.utcnow()
-    db.commit()
-    db.refresh(payment)
+    try:
+        # Keeps the payment Pending for admin approval and notifies live dashboards
+        payment = submit_payment_for_verification(req.razorpay_order_id, db)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
 
     return {"status": "pending_verification", "payment_id": payment.id, "message": "Payment submitted for admin verification"}
 
+@router.get('/events')
+async def payment_event_stream(
+    request: Request,
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID"),
+    current_user: User = Depends(get_stream_user)
+):
+    """Server-Sent Events: created, submitted, verified, rejected, updated and deleted payments."""
+    if current_user.role != UserRole.admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+    # EventSource resends the last id as a header on reconnect; a query param covers fresh page loads
+    last_event_id = last_event_id or request.query_params.get("last_event_id")
+    return StreamingResponse(
+        stream_payment_events(request, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.post('/admin/verify/{payment_id}')
 async def admin_verify_payment(
     payment_id: int,
@@ -127,6 +164,48 @@ async def admin_verify_payment(
     updated = mark_payment_as_paid(payment.id, payment.payment_method, db)
     return {"status": "verified", "payment_id": updated.id, "message": "Payment verified successfully"}
 
+@router.post('/admin/bulk-review', response_model=BulkReviewResult)
+async def admin_bulk_review_payments(
+    req: BulkReviewRequest,
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Admin endpoint to verify or reject many pending payments at once."""
+    if current_user.role != UserRole.admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+    try:
+        result = bulk_review_payments(
+            req.action, db,
+            payment_ids=req.payment_ids,
+            month=req.month,
+            year=req.year,
+            payment_method=req.payment_method
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if req.prerender_receipts and req.action == ReviewAction.verify:
+        verified = [r.payment_id for r in result.results if r.outcome == "verified"]
+        if verified:
+            background_tasks.add_task(prerender_receipts, verified)
+    return result
+
+@router.put('/bulk-status', response_model=PaymentBulkStatusResult)
+def bulk_status(
+    req: PaymentBulkStatusUpdate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Admin endpoint to set the status of many payments in one statement."""
+    if current_user.role != UserRole.admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    try:
+        return bulk_set_payment_status(req, db)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.post('/admin/reject/{payment_id}')
 async def admin_reject_payment(
     payment_id: int,
@@ -152,19 +231,26 @@ async def admin_reject_payment(
 
 # Add a payment
 @router.post("/", response_model=PaymentOut, status_code=status.HTTP_201_CREATED)
-def add_payment(payment: PaymentCreate, db: Session = Depends(get_db)):
-    try:
-        return create_payment(
-            payment.student_id,
-            payment.amount,
-            payment.status,
-            payment.month,
-            payment.year,
-            payment.payment_method,
-            db
-        )
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
+def add_payment(
+    payment: PaymentCreate,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    db: Session = Depends(get_db)
+):
+    def record_payment():
+        try:
+            return create_payment(
+                payment.student_id,
+                payment.amount,
+                payment.status,
+                payment.month,
+                payment.year,
+                payment.payment_method,
+                db
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    return run_idempotent(idempotency_key, "payments", payment, record_payment, db, status_code=status.HTTP_201_CREATED)
 
 # New route to add payment by student name
 @router.post("/by-name/{student_name}", response_model=PaymentOut, status_code=status.HTTP_201_CREATED)
@@ -188,6 +274,56 @@ def add_payment_by_name(student_name: str, payment_data: PaymentCreateByName, db
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+# Generate pending rent rows for a month (admin only)
+@router.post("/dues/generate", response_model=DuesGenerateResult)
+def generate_dues(
+    req: DuesGenerateRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    if current_user.role != UserRole.admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+    try:
+        return generate_monthly_dues(req.month, req.year, db)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Students who have not paid for a month (admin only)
+@router.get("/defaulters", response_model=DefaultersReport)
+def list_defaulters(
+    month: int = Query(..., ge=1, le=12),
+    year: int = Query(...),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    if current_user.role != UserRole.admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+    try:
+        return get_defaulters(month, year, db)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Reconcile a bank/UPI statement CSV against pending payments (admin only)
+@router.post("/reconcile")
+def reconcile_payments(
+    statement: UploadFile = File(..., description="Bank/UPI statement in CSV format"),
+    window_days: int = Query(3, description="Days either side of the payment date for amount matching"),
+    dry_run: bool = Query(False, description="Report matches without marking payments as paid"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    if current_user.role != UserRole.admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+    # Decode lazily so the upload is streamed through the csv reader
+    lines = io.TextIOWrapper(statement.file, encoding="utf-8-sig", newline="")
+    try:
+        return reconcile_statement(lines, db, window_days=window_days, dry_run=dry_run)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 # Mark payment as paid (admin only)
 @router.post("/{payment_id}/mark-paid", response_model=PaymentOut)
 def mark_payment_as_paid_route(
@@ -226,11 +362,13 @@ def download_receipt(payment_id: int, db: Session = Depends(get_db)):
         # Format filename: receipt_STU-0001_Oct-2024.pdf
         filename = f"receipt_STU-{student.id:04d}_{month_abbr}-{payment.year}.pdf"
 
-        pdf_buffer = generate_payment_receipt(payment_id, db)
+        pdf_bytes = get_cached_receipt(payment_id)
+        if pdf_bytes is None:
+            pdf_bytes = generate_payment_receipt(payment_id, db).getvalue()
 
         # Create response with PDF content
         response = StreamingResponse(
-            io.BytesIO(pdf_buffer.getvalue()),
+            io.BytesIO(pdf_bytes),
             media_type="application/pdf"
         )
         response.headers["Content-Disposition"] = f"attachment; filename={filename}"
@@ -247,11 +385,10 @@ def export_payments_csv(
     db: Session = Depends(get_db)
 ):
     try:
-        csv_content = export_payments_to_csv(db, month, year, status)
-
-        # Create response with CSV content
+        # Rows are loaded up front; the CSV text is produced and compressed chunk by chunk
+        payments = get_all_payments_with_student_info(db, month, year, status)
         response = StreamingResponse(
-            io.StringIO(csv_content),
+            iter_payments_csv(payments),
             media_type="text/csv"
         )
         response.headers["Content-Disposition"] = "attachment; filename=payments_export.csv"
@@ -267,6 +404,39 @@ def get_payment_summary(db: Session = Depends(get_db)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting payment stats: {str(e)}")
 
+# Monthly collection trends from the pre-aggregated rollup
+@router.get("/stats/timeseries")
+def get_payment_timeseries(
+    from_year: Optional[int] = Query(None),
+    from_month: Optional[int] = Query(None, ge=1, le=12),
+    to_year: Optional[int] = Query(None),
+    to_month: Optional[int] = Query(None, ge=1, le=12),
+    group_by: Optional[str] = Query(None, description="status, payment_method or room_id"),
+    status: Optional[PaymentStatus] = Query(None),
+    payment_method: Optional[PaymentMethod] = Query(None),
+    room_id: Optional[int] = Query(None),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Defaults to the twelve months ending with the current one (Admin only)."""
+    if current_user.role != UserRole.admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    now = datetime.utcnow()
+    to_year = to_year or now.year
+    to_month = to_month or (now.month if to_year == now.year else 12)
+    if from_year is None:
+        start = to_year * 12 + to_month - 12
+        from_year, default_month = start // 12, start % 12 + 1
+        from_month = from_month or default_month
+    from_month = from_month or 1
+    try:
+        return payment_timeseries(
+            db, from_year, from_month, to_year, to_month,
+            group_by=group_by, status=status, payment_method=payment_method, room_id=room_id
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 # Update payment details
 @router.put("/{payment_id}", response_model=PaymentOut)
 def update_payment_details(payment_id: int, update: PaymentUpdate, db: Session = Depends(get_db)):
@@ -308,11 +478,14 @@ def payments_of_room(room_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail=str(e))
 
 # Get all payments with optional filters
-@router.get("/", response_model=List[dict])
+# List endpoints return PaymentListRow dataclasses encoded by orjson directly,
+# skipping ORM objects, PaymentOut conversion and response validation.
+@router.get("/", response_model=List[dict], response_class=ORJSONResponse)
 def get_all_payments(
     month: Optional[int] = Query(None, description="Filter by month (1-12)"),
     year: Optional[int] = Query(None, description="Filter by year"),
     status: Optional[PaymentStatus] = Query(None, description="Filter by payment status"),
+    student_id: Optional[int] = Query(None, description="Filter by student (admins only)"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -321,33 +494,23 @@ def get_all_payments(
         # If student, return only their own payments
         if current_user.role == UserRole.student and current_user.student_id:
             try:
-                payments = get_payments_by_student(current_user.student_id, db)
-                # Convert PaymentOut objects to dicts for response validation
-                return [payment.dict() if hasattr(payment, "dict") else payment for payment in payments]
+                return ORJSONResponse(list_payment_rows(db, student_id=current_user.student_id))
             except Exception as e:
                 raise HTTPException(status_code=500, detail=f"Error getting payments: {str(e)}")
         else:
             raise HTTPException(status_code=403, detail="Forbidden")
     try:
-        payments = get_all_payments_with_student_info(db, month, year, status)
-        # Convert PaymentOut objects to dicts for response validation
-        return [payment.dict() if hasattr(payment, "dict") else payment for payment in payments]
+        return ORJSONResponse(list_payment_rows(db, month, year, status, student_id=student_id))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting payments: {str(e)}")
 
 # Get payments with student names (legacy endpoint)
-@router.get("/with-student-names/", response_model=List[dict])
+@router.get("/with-student-names/", response_model=List[dict], response_class=ORJSONResponse)
 def get_payments_with_student_names(db: Session = Depends(get_db)):
-    payments = db.query(Payment, Student.name).join(Student, Payment.student_id == Student.id).all()
-    result = []
-    for payment, student_name in payments:
-        payment_dict = PaymentOut.from_orm(payment).dict()
-        payment_dict["student_name"] = student_name
-        result.append(payment_dict)
-    return result
+    return ORJSONResponse(get_all_payments_with_student_info(db))
 
 # Get all payments with student information (for admin dashboard)
-@router.get("/all-with-students", response_model=List[dict])
+@router.get("/all-with-students", response_model=List[dict], response_class=ORJSONResponse)
 def get_all_payments_with_students(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -357,9 +520,7 @@ def get_all_payments_with_students(
         raise HTTPException(status_code=403, detail="Admin access required")
 
     try:
-        payments = get_all_payments_with_student_info(db)
-        # Convert PaymentOut objects to dicts for response validation
-        return [payment.dict() if hasattr(payment, "dict") else payment for payment in payments]
+        return ORJSONResponse(get_all_payments_with_student_info(db))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting payments: {str(e)}")
 
@@ -1,10 +1,14 @@
-from fastapi import APIRouter, HTTPException, Depends
-from services.room_services import create_room, delete_room
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
+from services.room_services import create_room, delete_room, allocate_rooms, bulk_update_rooms, list_rooms_with_totals
+from services.room_services import update_room as update_room_service
 from database.db import Session
-from schemas.room import RoomCreate, DeleteRoom, RoomWithStudents, RoomOut, UpdateRoom
-from schemas.payments import PaymentStatus
+from schemas.room import (
+    RoomCreate, DeleteRoom, RoomWithStudents, RoomOut, UpdateRoom,
+    AllocationRequest, AllocationResult, RoomBulkUpdate, RoomBulkUpdateResult
+)
 from models.models import Room, User, UserRole
 from utils.auth import get_current_user, require_role
+from utils.table_versions import make_etag, not_modified
 from typing import List
 router = APIRouter(prefix="/rooms", tags=["rooms"])
 
@@ -25,22 +29,39 @@ def add_room(room: RoomCreate, current_user: User = Depends(require_role([UserRo
 def remove_room(room: DeleteRoom, current_user: User = Depends(require_role([UserRole.admin])), db: Session = Depends(get_db)):
     return delete_room(room.room_no, db)
 
+# Allocate rooms to a batch of unassigned students
+@router.post("/allocate", response_model=AllocationResult)
+def allocate(request: AllocationRequest, current_user: User = Depends(require_role([UserRole.admin])), db: Session = Depends(get_db)):
+    try:
+        return allocate_rooms(request, db)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Update every room matching a filter in one statement
+@router.put("/bulk", response_model=RoomBulkUpdateResult)
+def bulk_update(request: RoomBulkUpdate, current_user: User = Depends(require_role([UserRole.admin])), db: Session = Depends(get_db)):
+    try:
+        return bulk_update_rooms(request, db)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 # Get all rooms (with students)
 @router.get("/", response_model=List[RoomWithStudents])
-def get_rooms(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_rooms(request: Request, response: Response, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     # Only admins can see all rooms
     if current_user.role != UserRole.admin:
         raise HTTPException(status_code=403, detail="Forbidden")
-    rooms = db.query(Room).all()
-    for room in rooms:
-        total_paid = sum(payment.amount for payment in room.payments if payment.status == PaymentStatus.paid)
-        room.total_payments = total_paid
-        room.payment_status = PaymentStatus.paid if total_paid >= room.price else PaymentStatus.pending
-    return rooms
+    cached = not_modified(request, response, make_etag("rooms", "students", "payments"))
+    if cached:
+        return cached
+    return list_rooms_with_totals(db)
 
 # Get room by number
 @router.get("/{room_no}", response_model=RoomWithStudents)
-def get_room_by_no(room_no: str, db: Session = Depends(get_db)):
+def get_room_by_no(room_no: str, request: Request, response: Response, db: Session = Depends(get_db)):
+    cached = not_modified(request, response, make_etag("rooms", "students", vary=room_no))
+    if cached:
+        return cached
     room = db.query(Room).filter_by(room_no=room_no).first()
     if not room:
         raise HTTPException(status_code=404, detail="Room not found")
@@ -49,15 +70,7 @@ def get_room_by_no(room_no: str, db: Session = Depends(get_db)):
 # Update room
 @router.put("/{room_no}", response_model=RoomOut)
 def update_room(room_no: str, update: UpdateRoom, db: Session = Depends(get_db)):
-    room = db.query(Room).filter_by(room_no=room_no).first()
-    if not room:
-        raise HTTPException(status_code=404, detail="Room not found")
-    if update.new_room_no:
-        room.room_no = update.new_room_no
-    if update.price is not None:
-        room.price = update.price
-    if update.capacity is not None:
-        room.capacity = update.capacity
-    db.commit()
-    db.refresh(room)
-    return room
+    try:
+        return update_room_service(room_no, update, db)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
@@ -1,10 +1,12 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, status, Request, Response
 from models.models import Student, Room, User, UserRole
 from database.db import Session
-from services.student_services import create_student, delete_student
+from services.student_services import create_student, delete_student, find_students, student_response
 from services.student_services import update_student as update_student_service
-from schemas.student import StudentCreate, StudentResponse, StudentUpdate
+from schemas.student import StudentCreate, StudentResponse, StudentUpdate, StudentBalanceOut
+from services.balance_services import get_student_balance
 from utils.auth import get_current_user, require_role
+from utils.table_versions import make_etag, not_modified
 from typing import List
 
 router = APIRouter(prefix="/students", tags=["students"])
@@ -17,7 +19,12 @@ def get_db():
         db.close()
 
 @router.get("/", response_model=List[StudentResponse])
-def get_students(name: str = None, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_students(request: Request, response: Response, name: str = None, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    # Responses differ per caller, so the tag covers the user as well as the query
+    etag = make_etag("students", "rooms", "users", vary=f"{current_user.id}|{request.url.query}")
+    cached = not_modified(request, response, etag)
+    if cached:
+        return cached
     # Only admins can see all students
     if current_user.role != UserRole.admin:
         # If student, return only their own details
@@ -25,35 +32,31 @@ def get_students(name: str = None, current_user: User = Depends(get_current_user
             student = db.query(Student).filter_by(id=current_user.student_id).first()
             if not student:
                 raise HTTPException(status_code=404, detail="Student not found")
-            room_no = student.room.room_no if student.room else "Unassigned"
-            user = db.query(User).filter_by(student_id=student.id).first()
-            active = user.is_active if user else False
-            phone_no = user.phone_no if user else None
-            return [StudentResponse(id=student.id, name=student.name, room_no=room_no, active=active, phone_no=phone_no)]
+            return [student_response(student, db)]
         else:
             raise HTTPException(status_code=403, detail="Forbidden")
-    students = db.query(Student)
-    if name:
-        students = students.filter(Student.name.ilike(f"%{name}%"))
-    result = []
-    for student in students.all():
-        room_no = student.room.room_no if student.room else "Unassigned"
-        user = db.query(User).filter_by(student_id=student.id).first()
-        active = user.is_active if user else False
-        phone_no = user.phone_no if user else None
-        result.append(StudentResponse(id=student.id, name=student.name, room_no=room_no, active=active, phone_no=phone_no))
-    return result  # Return the result list directly
+    return find_students(db, name)
 
 @router.get("/{student_id}", response_model=StudentResponse)
 def get_student(student_id: int, db: Session = Depends(get_db)):
     student = db.query(Student).filter_by(id=student_id).first()
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
-    room_no = student.room.room_no if student.room else "Unassigned"
-    user = db.query(User).filter_by(student_id=student.id).first()
-    active = user.is_active if user else False
-    phone_no = user.phone_no if user else None
-    return StudentResponse(id=student.id, name=student.name, room_no=room_no, active=active, phone_no=phone_no)
+    return student_response(student, db)
+
+@router.get("/{student_id}/balance", response_model=StudentBalanceOut)
+def get_balance(student_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    # Students may only see their own balance
+    if current_user.role != UserRole.admin and not (
+        current_user.role == UserRole.student and current_user.student_id == student_id
+    ):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    balance = get_student_balance(student_id, db)
+    if balance:
+        return balance
+    if not db.query(Student.id).filter_by(id=student_id).first():
+        raise HTTPException(status_code=404, detail="Student not found")
+    return StudentBalanceOut(student_id=student_id)  # No payments recorded yet
 
 @router.post("/", response_model=StudentResponse, status_code=status.HTTP_201_CREATED)
 def add_student(student: StudentCreate, current_user: User = Depends(require_role([UserRole.admin])), db: Session = Depends(get_db)):
@@ -63,11 +66,7 @@ def add_student(student: StudentCreate, current_user: User = Depends(require_rol
         raise HTTPException(status_code=400, detail=str(ve))
     except Exception as e:
         raise HTTPException(status_code=500, detail="Internal Server Error")
-    room_no = student.room.room_no if student.room else "Unassigned"
-    user = db.query(User).filter_by(student_id=student.id).first()
-    active = user.is_active if user else False
-    phone_no = user.phone_no if user else None
-    return StudentResponse(id=student.id, name=student.name, room_no=room_no, active=active, phone_no=phone_no)
+    return student_response(student, db)
 
 @router.delete("/{student_id}", response_model=dict)
 def remove_student(student_id: int, current_user: User = Depends(require_role([UserRole.admin])), db: Session = Depends(get_db)):
@@ -114,8 +113,4 @@ def get_student_by_name(student_name: str, db: Session = Depends(get_db)):
     student = db.query(Student).filter_by(name=student_name).first()
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
-    room_no = student.room.room_no if student.room else "Unassigned"
-    user = db.query(User).filter_by(student_id=student.id).first()
-    active = user.is_active if user else False
-    phone_no = user.phone_no if user else None
-    return StudentResponse(id=student.id, name=student.name, room_no=room_no, active=active, phone_no=phone_no)
+    return student_response(student, db)
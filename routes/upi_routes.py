@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, status, Request, Response
 from sqlalchemy.orm import Session
 from typing import List
 from schemas.upi_settings import UPISettingsCreate, UPISettingsUpdate, UPISettingsOut
@@ -8,6 +8,7 @@ from services.upi_services import (
 )
 from models.models import User, UserRole
 from utils.auth import get_current_user
+from utils.table_versions import make_etag, not_modified
 from database.db import Session as DBSession
 
 router = APIRouter(prefix="/upi", tags=["upi"])
@@ -22,8 +23,11 @@ def get_db():
 
 
 @router.get("/active", response_model=UPISettingsOut)
-def get_active_upi_settings(db: Session = Depends(get_db)):
+def get_active_upi_settings(request: Request, response: Response, db: Session = Depends(get_db)):
     """Get the currently active UPI settings."""
+    cached = not_modified(request, response, make_etag("upi_settings"))
+    if cached:
+        return cached
     upi_settings = get_upi_settings(db)
     if not upi_settings:
         raise HTTPException(status_code=404, detail="No active UPI settings found")
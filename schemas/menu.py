@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from typing import Optional, List
-from datetime import datetime
+from datetime import date, datetime
 from enum import Enum
 
 
@@ -70,3 +70,75 @@ class MenuWithFeedbackResponse(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class BulkMenuSkipped(BaseModel):
+    date: datetime
+    meal_type: MealType
+    reason: str  # "exists" or "duplicate_in_request"
+    existing_menu_id: Optional[int] = None
+
+
+class BulkMenuResult(BaseModel):
+    created: List[MenuResponse] = []
+    updated: List[MenuResponse] = []  # existing menus overwritten when upsert=true
+    skipped: List[BulkMenuSkipped] = []
+
+
+class MenuTemplateSlot(BaseModel):
+    day_of_week: int  # 0 = Monday ... 6 = Sunday
+    meal_type: MealType
+    items: str
+
+    class Config:
+        from_attributes = True
+
+
+class MenuTemplateCreate(BaseModel):
+    name: str
+    description: Optional[str] = None
+    items: List[MenuTemplateSlot]
+
+
+class MenuTemplateResponse(BaseModel):
+    id: int
+    name: str
+    description: Optional[str] = None
+    created_at: datetime
+    items: List[MenuTemplateSlot] = []
+
+    class Config:
+        from_attributes = True
+
+
+class MenuCloneRequest(BaseModel):
+    # Source: either a template, or an existing range of menus (inclusive dates)
+    template_id: Optional[int] = None
+    source_start: Optional[date] = None
+    source_end: Optional[date] = None
+    # Target range (inclusive); a shorter source range is repeated to fill it
+    target_start: date
+    target_end: date
+
+
+class MenuCloneResult(BaseModel):
+    created: List[MenuResponse] = []
+    skipped: int  # target slots that already had a menu
+
+
+class AttendanceUpdate(BaseModel):
+    attending: bool
+    student_id: Optional[int] = None  # Admin/Chef may set it for a student; students set their own
+
+
+class HeadcountResponse(BaseModel):
+    menu_id: int
+    date: datetime
+    meal_type: MealType
+    opted_in: int
+    opted_out: int
+    undecided: int
+    expected: int  # students eat unless they opt out
+    cutoff_at: datetime  # UTC
+    frozen: bool
+    frozen_at: Optional[datetime] = None  # UTC
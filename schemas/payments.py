@@ -1,6 +1,7 @@
 from pydantic import BaseModel
 from datetime import datetime
 from enum import Enum
+from typing import List, Optional
 
 class PaymentStatus(str, Enum):
     pending = "Pending"
@@ -67,6 +68,66 @@ class PaymentWithStudentInfo(BaseModel):
     class Config:
         from_attributes = True
 
+class DuesGenerateRequest(BaseModel):
+    month: int
+    year: int
+
+class DuesGenerateResult(BaseModel):
+    month: int
+    year: int
+    created: int
+    already_present: int
+
+class Defaulter(BaseModel):
+    student_id: int
+    student_name: str
+    room_no: str
+    expected_amount: float
+    last_paid_month: Optional[int] = None
+    last_paid_year: Optional[int] = None
+    months_overdue: int
+
+class DefaultersReport(BaseModel):
+    month: int
+    year: int
+    count: int
+    total_expected: float
+    defaulters: List[Defaulter] = []
+
+class ReviewAction(str, Enum):
+    verify = "verify"
+    reject = "reject"
+
+class BulkReviewRequest(BaseModel):
+    action: ReviewAction
+    payment_ids: Optional[List[int]] = None  # Explicit ids, or select by month/year below
+    month: Optional[int] = None
+    year: Optional[int] = None
+    payment_method: Optional[PaymentMethod] = None  # Defaults to Online when selecting by month/year
+    prerender_receipts: bool = False
+
+class BulkReviewOutcome(BaseModel):
+    payment_id: int
+    outcome: str  # verified, rejected, not_found or skipped
+    detail: Optional[str] = None
+
+class BulkReviewResult(BaseModel):
+    action: ReviewAction
+    processed: int
+    results: List[BulkReviewOutcome] = []
+
+class PaymentBulkStatusUpdate(BaseModel):
+    status: PaymentStatus
+    student_id: Optional[int] = None
+    student_name: Optional[str] = None  # Exact name, like /payments/student/{name}
+    payment_ids: Optional[List[int]] = None
+    from_status: Optional[PaymentStatus] = None  # Only change payments currently in this status
+
+class PaymentBulkStatusResult(BaseModel):
+    status: PaymentStatus
+    updated: int
+    payment_ids: List[int] = []
+
 class PaymentMarkAsPaid(BaseModel):
     payment_method: PaymentMethod = PaymentMethod.online
 
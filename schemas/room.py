@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import List, TYPE_CHECKING
+from pydantic import BaseModel, Field
+from typing import List, Optional, TYPE_CHECKING
 
 # Avoid circular import by only importing during type checking
 if TYPE_CHECKING:
@@ -46,6 +46,58 @@ class UpdateRoom(BaseModel):
     capacity: int | None = None
 
 
+# ---------- Bulk Update Schemas ----------
+# A floor is one letter ("G") or a number ("2"); anything else could smuggle LIKE wildcards
+FLOOR_PATTERN = r"^([A-Za-z]|\d+)$"
+
+class RoomBulkFilter(BaseModel):
+    room_nos: Optional[List[str]] = None
+    floor: Optional[str] = Field(None, pattern=FLOOR_PATTERN)  # Floor prefix, same convention as allocation
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+
+class RoomBulkPatch(BaseModel):
+    price: Optional[float] = None
+    capacity: Optional[int] = None
+    price_change_percent: Optional[float] = None  # e.g. 10 raises prices by 10%, -5 lowers by 5%
+
+class RoomBulkUpdate(BaseModel):
+    filter: RoomBulkFilter = RoomBulkFilter()  # Empty filter matches every room
+    patch: RoomBulkPatch
+
+class RoomBulkUpdateResult(BaseModel):
+    updated: int
+    rooms: List[RoomOut] = []
+
+# ---------- Batch Allocation Schemas ----------
+class AllocationStudent(BaseModel):
+    student_id: int
+    floor: Optional[str] = Field(None, pattern=FLOOR_PATTERN)  # Overrides the request-level floor preference
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+
+class AllocationRequest(BaseModel):
+    students: List[AllocationStudent] = []  # Empty list allocates every unassigned student
+    floor: Optional[str] = Field(None, pattern=FLOOR_PATTERN)  # Floor prefix, e.g. "G" for G1-G5 or "2" for 201-205
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    groups: List[List[int]] = []  # Student ids that must share a room
+    dry_run: bool = False
+
+class AllocationAssignment(BaseModel):
+    student_id: int
+    student_name: str
+    room_no: str
+
+class AllocationSkipped(BaseModel):
+    student_id: int
+    reason: str
+
+class AllocationResult(BaseModel):
+    assigned: List[AllocationAssignment] = []
+    unassigned: List[AllocationSkipped] = []
+    dry_run: bool = False
+
 
 # Fix forward references
 RoomWithStudents.model_rebuild()
@@ -15,6 +15,19 @@ class StudentResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class StudentBalanceOut(BaseModel):
+    student_id: int
+    total_due: float = 0
+    total_paid: float = 0
+    pending: float = 0
+    paid_count: int = 0
+    pending_count: int = 0
+    last_paid_year: Optional[int] = None
+    last_paid_month: Optional[int] = None
+
+    class Config:
+        from_attributes = True
+
 class StudentUpdate(BaseModel):
     name: Optional[str] = None
     room_no: Optional[str] = None
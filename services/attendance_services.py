@@ -0,0 +1,219 @@
+# services/attendance_services.py
+"""Meal attendance intents and per-menu headcount counters.
+
+Students opt in or out of a meal; every change moves the menu's
+`menu_headcounts` counters by one in the same transaction, so the chef's
+headcount is a primary-key read. Students who never answered count as
+attending. At the cutoff (a fixed lead before the meal slot) the counters are
+frozen together with a snapshot of the student count, and later changes are
+refused. Freezing happens on the first read or write after the cutoff, or
+early through `freeze_attendance`. Deleting a student removes their intents
+and takes them off the counters of menus that are not frozen yet.
+
+Meal slots are local wall-clock times, but cutoffs are converted to naive UTC
+so they compare against the same clock as frozen_at and updated_at.
+"""
+from datetime import datetime, time, timedelta, timezone
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import case, delete, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from database.db import Session
+from models.models import MealAttendance, Menu, MenuHeadcount, Student
+from schemas.menu import HeadcountResponse
+from utils.table_versions import table_version
+
+# When each meal is served; intents freeze CUTOFF_LEAD before that
+SLOT_TIMES = {
+    "breakfast": time(8, 0),
+    "lunch": time(13, 0),
+    "snacks": time(17, 0),
+    "dinner": time(20, 0),
+}
+CUTOFF_LEAD = timedelta(hours=2)
+
+_headcounts = MenuHeadcount.__table__
+
+# (students table version, count); student rows change far less often than intents
+_student_count: Optional[Tuple[int, int]] = None
+
+
+def _total_students(db: Session) -> int:
+    global _student_count
+    version = table_version("students")
+    cached = _student_count
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    count = db.query(func.count(Student.id)).scalar() or 0
+    _student_count = (version, count)
+    return count
+
+
+def _insert_headcount(db: Session, **values) -> bool:
+    """Create a menu's counter row unless another transaction just did; True if inserted."""
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    return bool(db.connection().execute(
+        dialect.insert(_headcounts).values(**values).on_conflict_do_nothing(index_elements=["menu_id"])
+    ).rowcount)
+
+
+def cutoff_for(menu_date: datetime, meal_type) -> datetime:
+    """UTC time (naive, like utcnow()) after which intents for a menu are frozen."""
+    day = datetime.combine(menu_date.date(), time.min)
+    slot = SLOT_TIMES[meal_type.name]
+    local_cutoff = day + timedelta(hours=slot.hour, minutes=slot.minute) - CUTOFF_LEAD
+    return local_cutoff.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _get_menu(menu_id: int, db: Session):
+    menu = db.query(Menu.id, Menu.date, Menu.meal_type).filter_by(id=menu_id).first()
+    if not menu:
+        raise HTTPException(status_code=404, detail=f"Menu with ID {menu_id} not found")
+    return menu
+
+
+def _freeze(menu_id: int, db: Session) -> None:
+    """Freeze the counters of a menu (idempotent); commits."""
+    now = datetime.utcnow()
+    total = _total_students(db)
+    freeze = (
+        update(_headcounts)
+        .where(_headcounts.c.menu_id == menu_id, _headcounts.c.frozen_at.is_(None))
+        .values(frozen_at=now, total_students=total)
+    )
+    try:
+        connection = db.connection()
+        frozen = connection.execute(freeze).rowcount
+        if not frozen and db.query(MenuHeadcount.menu_id).filter_by(menu_id=menu_id).first() is None:
+            if not _insert_headcount(
+                db, menu_id=menu_id, opted_in=0, opted_out=0, frozen_at=now, total_students=total,
+            ):
+                connection.execute(freeze)  # a first intent created the row meanwhile
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+
+def _apply_intent_change(db: Session, menu_id: int, old: Optional[bool], new: bool) -> None:
+    """Move the counters for one intent change; raises 409 if the menu got frozen meanwhile."""
+    delta_in = int(new is True) - int(old is True)
+    delta_out = int(new is False) - int(old is False)
+    connection = db.connection()
+    move = (
+        update(_headcounts)
+        .where(_headcounts.c.menu_id == menu_id, _headcounts.c.frozen_at.is_(None))
+        .values(opted_in=_headcounts.c.opted_in + delta_in, opted_out=_headcounts.c.opted_out + delta_out)
+    )
+    if connection.execute(move).rowcount:
+        return
+    if db.query(MenuHeadcount.menu_id).filter_by(menu_id=menu_id).first() is None:
+        # First intent for this menu: seed the counters from the (already flushed) intents
+        opted_in, opted_out = connection.execute(
+            select(
+                func.count(case((MealAttendance.attending.is_(True), 1))),
+                func.count(case((MealAttendance.attending.is_(False), 1))),
+            ).where(MealAttendance.menu_id == menu_id)
+        ).one()
+        if _insert_headcount(db, menu_id=menu_id, opted_in=opted_in, opted_out=opted_out):
+            return
+        # A concurrent first intent seeded the row without seeing ours; count ours on top
+        if connection.execute(move).rowcount:
+            return
+    raise HTTPException(status_code=409, detail="Attendance for this meal is frozen")
+
+
+def set_attendance(menu_id: int, student_id: int, attending: bool, db: Session) -> HeadcountResponse:
+    menu = _get_menu(menu_id, db)
+    if not db.query(Student.id).filter_by(id=student_id).first():
+        raise HTTPException(status_code=404, detail=f"Student with ID {student_id} not found")
+    if datetime.utcnow() >= cutoff_for(menu.date, menu.meal_type):
+        _freeze(menu_id, db)
+        raise HTTPException(status_code=409, detail="Attendance for this meal is frozen")
+
+    try:
+        existing = db.query(MealAttendance.id, MealAttendance.attending).filter_by(
+            menu_id=menu_id, student_id=student_id
+        ).first()
+        if existing is None:
+            db.add(MealAttendance(menu_id=menu_id, student_id=student_id, attending=attending))
+            db.flush()
+            _apply_intent_change(db, menu_id, None, attending)
+        elif existing.attending != attending:
+            # Conditional on the old value so two racing toggles cannot both count
+            changed = db.execute(
+                update(MealAttendance)
+                .where(MealAttendance.id == existing.id, MealAttendance.attending == existing.attending)
+                .values(attending=attending, updated_at=datetime.utcnow())
+            ).rowcount
+            if not changed:
+                raise HTTPException(status_code=409, detail="Attendance changed concurrently, please retry")
+            _apply_intent_change(db, menu_id, existing.attending, attending)
+        db.commit()
+    except HTTPException:
+        db.rollback()
+        raise
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    return get_headcount(menu_id, db)
+
+
+def drop_menu_attendance(db: Session, menu_id: int) -> None:
+    connection = db.connection()
+    connection.execute(delete(MealAttendance.__table__).where(MealAttendance.menu_id == menu_id))
+    connection.execute(delete(_headcounts).where(_headcounts.c.menu_id == menu_id))
+
+
+def drop_student_attendance(db: Session, student_id: int) -> None:
+    """Remove a student's intents, taking them off counters that are not frozen yet."""
+    connection = db.connection()
+    intents = connection.execute(
+        select(MealAttendance.menu_id, MealAttendance.attending).where(MealAttendance.student_id == student_id)
+    ).all()
+    for attending in (True, False):
+        menu_ids = [menu_id for menu_id, choice in intents if choice == attending]
+        if not menu_ids:
+            continue
+        counter = _headcounts.c.opted_in if attending else _headcounts.c.opted_out
+        connection.execute(
+            update(_headcounts)
+            .where(_headcounts.c.menu_id.in_(menu_ids), _headcounts.c.frozen_at.is_(None))
+            .values({counter: counter - 1})
+        )
+    connection.execute(delete(MealAttendance.__table__).where(MealAttendance.student_id == student_id))
+
+
+def freeze_attendance(menu_id: int, db: Session) -> HeadcountResponse:
+    _get_menu(menu_id, db)
+    _freeze(menu_id, db)
+    return get_headcount(menu_id, db)
+
+
+def get_headcount(menu_id: int, db: Session) -> HeadcountResponse:
+    """Live (or frozen) headcount of a menu from its counter row."""
+    menu = _get_menu(menu_id, db)
+    cutoff = cutoff_for(menu.date, menu.meal_type)
+    headcount = db.query(MenuHeadcount).filter_by(menu_id=menu_id).first()
+    if (headcount is None or headcount.frozen_at is None) and datetime.utcnow() >= cutoff:
+        _freeze(menu_id, db)
+        headcount = db.query(MenuHeadcount).filter_by(menu_id=menu_id).first()
+
+    opted_in = headcount.opted_in if headcount else 0
+    opted_out = headcount.opted_out if headcount else 0
+    frozen_at = headcount.frozen_at if headcount else None
+    total = headcount.total_students if frozen_at is not None else _total_students(db)
+    return HeadcountResponse(
+        menu_id=menu_id,
+        date=menu.date,
+        meal_type=menu.meal_type.name,
+        opted_in=opted_in,
+        opted_out=opted_out,
+        undecided=max(total - opted_in - opted_out, 0),
+        expected=max(total - opted_out, 0),
+        cutoff_at=cutoff,
+        frozen=frozen_at is not None,
+        frozen_at=frozen_at,
+    )
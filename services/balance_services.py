@@ -0,0 +1,229 @@
+# services/balance_services.py
+"""Per-student running balances (due, paid, pending, last paid period).
+
+Kept current by `services.payment_changes` inside the transaction that writes
+the payment. `check_balance_drift` recomputes everything from `payments` with
+one GROUP BY and reports (optionally repairs) rows that disagree.
+"""
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import Integer, and_, bindparam, case, delete, func, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from database.db import Session
+from models.models import Payment, StudentBalance
+from schemas.payments import PaymentStatus
+
+BALANCE_FIELDS = ("total_due", "total_paid", "pending", "paid_count", "pending_count")
+# Student ids per IN (...) list, kept below SQLite's bound-parameter limit
+CHUNK_SIZE = 500
+
+_balances = StudentBalance.__table__
+
+
+def _contribution(row) -> Tuple[float, float, float, int, int]:
+    """What one payment adds to its student's (due, paid, pending, paid_count, pending_count)."""
+    amount = row.amount or 0
+    if row.status == PaymentStatus.paid:
+        return amount, amount, 0, 1, 0
+    if row.status == PaymentStatus.pending:
+        return amount, 0, amount, 0, 1
+    return 0, 0, 0, 0, 0
+
+
+def _period(row) -> int:
+    return row.year * 12 + row.month - 1
+
+
+def _insert(connection):
+    """INSERT that can say what to do when the student already has a row."""
+    dialect = postgresql if connection.dialect.name == "postgresql" else sqlite
+    return dialect.insert(_balances)
+
+
+def _chunks(ids: List[int]):
+    for start in range(0, len(ids), CHUNK_SIZE):
+        yield ids[start:start + CHUNK_SIZE]
+
+
+def apply_balance_changes(connection, changes) -> None:
+    """Apply (before, after) PaymentRow pairs to the affected students' balances."""
+    deltas: Dict[int, List[float]] = defaultdict(lambda: [0] * len(BALANCE_FIELDS))
+    newest_paid: Dict[int, int] = {}
+    recheck = set()
+    for before, after in changes:
+        if before is not None and before.student_id is not None:
+            for i, value in enumerate(_contribution(before)):
+                deltas[before.student_id][i] -= value
+            if before.status == PaymentStatus.paid:
+                # Losing a paid row may move the last paid period backwards
+                if (after is None or after.status != PaymentStatus.paid or after.student_id != before.student_id
+                        or _period(after) != _period(before)):
+                    recheck.add(before.student_id)
+        if after is not None and after.student_id is not None:
+            for i, value in enumerate(_contribution(after)):
+                deltas[after.student_id][i] += value
+            if after.status == PaymentStatus.paid:
+                newest_paid[after.student_id] = max(newest_paid.get(after.student_id, -1), _period(after))
+
+    student_ids = sorted(sid for sid, delta in deltas.items() if any(delta) or sid in newest_paid)
+    if student_ids:
+        # Zero rows for students seen for the first time; a concurrent first
+        # payment of the same student may create the row too, so skip conflicts
+        connection.execute(_insert(connection).on_conflict_do_nothing(index_elements=["student_id"]), [
+            {"student_id": sid, **{field: 0 for field in BALANCE_FIELDS}} for sid in student_ids
+        ])
+
+        paid_period = bindparam("paid_period", type_=Integer)
+        is_newer = and_(
+            paid_period.isnot(None),
+            or_(
+                _balances.c.last_paid_year.is_(None),
+                _balances.c.last_paid_year * 12 + _balances.c.last_paid_month - 1 < paid_period,
+            ),
+        )
+        statement = (
+            update(_balances)
+            .where(_balances.c.student_id == bindparam("sid"))
+            .values(
+                **{field: _balances.c[field] + bindparam(f"d_{field}") for field in BALANCE_FIELDS},
+                last_paid_year=case((is_newer, bindparam("paid_year", type_=Integer)), else_=_balances.c.last_paid_year),
+                last_paid_month=case((is_newer, bindparam("paid_month", type_=Integer)), else_=_balances.c.last_paid_month),
+            )
+        )
+        params = []
+        for sid in student_ids:
+            period = newest_paid.get(sid)
+            params.append({
+                "sid": sid,
+                **{f"d_{field}": value for field, value in zip(BALANCE_FIELDS, deltas[sid])},
+                "paid_period": period,
+                "paid_year": period // 12 if period is not None else None,
+                "paid_month": period % 12 + 1 if period is not None else None,
+            })
+        connection.execute(statement, params)
+
+    if recheck:
+        _refresh_last_paid(connection, sorted(recheck))
+
+
+def _refresh_last_paid(connection, student_ids: List[int]) -> None:
+    """Recompute the last paid period of a few students from their Paid rows."""
+    latest = {}
+    period = Payment.year * 12 + Payment.month - 1
+    for chunk in _chunks(student_ids):
+        latest.update(connection.execute(
+            select(Payment.student_id, func.max(period))
+            .where(Payment.student_id.in_(chunk), Payment.status == PaymentStatus.paid)
+            .group_by(Payment.student_id)
+        ).all())
+    connection.execute(
+        update(_balances).where(_balances.c.student_id == bindparam("sid")).values(
+            last_paid_year=bindparam("paid_year"), last_paid_month=bindparam("paid_month"),
+        ),
+        [
+            {
+                "sid": sid,
+                "paid_year": latest[sid] // 12 if latest.get(sid) is not None else None,
+                "paid_month": latest[sid] % 12 + 1 if latest.get(sid) is not None else None,
+            }
+            for sid in student_ids
+        ],
+    )
+
+
+def drop_student_balances(connection, student_ids: List[int]) -> None:
+    for chunk in _chunks(student_ids):
+        connection.execute(delete(_balances).where(_balances.c.student_id.in_(chunk)))
+
+
+def expected_balances(db: Session) -> Dict[int, dict]:
+    """Balances recomputed from the payments table in one GROUP BY."""
+    paid = Payment.status == PaymentStatus.paid
+    pending = Payment.status == PaymentStatus.pending
+    rows = (
+        db.query(
+            Payment.student_id,
+            func.coalesce(func.sum(case((paid | pending, Payment.amount), else_=0)), 0),
+            func.coalesce(func.sum(case((paid, Payment.amount), else_=0)), 0),
+            func.coalesce(func.sum(case((pending, Payment.amount), else_=0)), 0),
+            func.count(case((paid, 1))),
+            func.count(case((pending, 1))),
+            func.max(case((paid, Payment.year * 12 + Payment.month - 1))),
+        )
+        .filter(Payment.student_id.isnot(None))
+        .group_by(Payment.student_id)
+        .all()
+    )
+    balances = {}
+    for student_id, *totals, last_paid in rows:
+        balances[student_id] = {
+            **dict(zip(BALANCE_FIELDS, totals)),
+            "last_paid_year": last_paid // 12 if last_paid is not None else None,
+            "last_paid_month": last_paid % 12 + 1 if last_paid is not None else None,
+        }
+    return balances
+
+
+def rebuild_student_balances(db: Session) -> int:
+    """Replace every balance row with values recomputed from payments."""
+    expected = expected_balances(db)
+    try:
+        connection = db.connection()
+        connection.execute(delete(_balances))
+        if expected:
+            # Overwrite rows a concurrent payment write created after the DELETE
+            statement = _insert(connection)
+            connection.execute(
+                statement.on_conflict_do_update(
+                    index_elements=["student_id"],
+                    set_={field: statement.excluded[field]
+                          for field in (*BALANCE_FIELDS, "last_paid_year", "last_paid_month")},
+                ),
+                [{"student_id": sid, **values} for sid, values in expected.items()],
+            )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return len(expected)
+
+
+def check_balance_drift(db: Session, fix: bool = False) -> List[dict]:
+    """Compare stored balances with payments; returns one entry per drifting field."""
+    expected = expected_balances(db)
+    stored = {row.student_id: row for row in db.query(StudentBalance).all()}
+    empty = {**{field: 0 for field in BALANCE_FIELDS}, "last_paid_year": None, "last_paid_month": None}
+
+    drift = []
+    for student_id in sorted(set(expected) | set(stored)):
+        want = expected.get(student_id, empty)
+        row = stored.get(student_id)
+        for field, value in want.items():
+            have = getattr(row, field) if row is not None else empty[field]
+            if isinstance(value, float) or isinstance(have, float):
+                same = abs((have or 0) - (value or 0)) < 0.005
+            else:
+                same = have == value
+            if not same:
+                drift.append({"student_id": student_id, "field": field, "stored": have, "expected": value})
+
+    if fix and drift:
+        rebuild_student_balances(db)
+    return drift
+
+
+def ensure_student_balances() -> None:
+    """Backfill balances on startup when the table is empty but payments already exist."""
+    session = Session()
+    try:
+        has_balances = session.query(StudentBalance.student_id).first() is not None
+        if not has_balances and session.query(Payment.id).first() is not None:
+            rebuild_student_balances(session)
+    finally:
+        session.close()
+
+
+def get_student_balance(student_id: int, db: Session) -> Optional[StudentBalance]:
+    return db.query(StudentBalance).filter_by(student_id=student_id).first()
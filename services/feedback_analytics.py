@@ -0,0 +1,168 @@
+# services/feedback_analytics.py
+"""Dish-level feedback analytics over a date range, computed with pandas.
+
+Ratings are first reduced in SQL to one row per menu (count, sum, sum of
+squares), so a year of feedback becomes ~1.5k rows however many students
+rate. The frame is then exploded into one row per dish (`Menu.items` is free
+text: comma/semicolon/newline separated, or a JSON list) and every statistic
+is a vectorized group-by over counts and sums, which keeps means exact without
+touching individual feedback rows again.
+
+Results are cached per (range, parameters) and dropped as soon as a feedback
+or menu write is committed (see `utils.table_versions`).
+"""
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, time, timedelta
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func
+
+from database.db import Session
+from models.models import Feedback, Menu
+from utils.table_versions import table_version
+
+CACHE_SIZE = 64
+MAX_RANGE_DAYS = 366 * 2
+
+# (start, end, window, min_count, limit) -> ((feedback version, menu version), result)
+_cache: "OrderedDict[tuple, Tuple[Tuple[int, int], dict]]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def _menu_frame(db: Session, start: date, end: date) -> pd.DataFrame:
+    """One row per rated menu served in [start, end) with rating count, sum and sum of squares."""
+    rows = (
+        db.query(
+            Menu.date,
+            Menu.meal_type,
+            Menu.items,
+            func.count(Feedback.id),
+            func.sum(Feedback.rating),
+            func.sum(Feedback.rating * Feedback.rating),
+        )
+        .join(Feedback, Feedback.menu_id == Menu.id)
+        .filter(Menu.date >= datetime.combine(start, time.min), Menu.date < datetime.combine(end, time.min))
+        .group_by(Menu.id, Menu.date, Menu.meal_type, Menu.items)
+        .all()
+    )
+    frame = pd.DataFrame.from_records(
+        rows, columns=["date", "meal_type", "items", "count", "total", "squares"]
+    )
+    frame["day"] = pd.to_datetime(frame["date"]).dt.normalize()
+    frame["meal_type"] = frame["meal_type"].map(lambda meal: meal.value)
+    return frame
+
+
+def _dishes(frame: pd.DataFrame) -> pd.DataFrame:
+    """Explode menus into one row per normalised dish name."""
+    dishes = frame.assign(
+        dish=frame["items"].str.replace(r'[\[\]"]', "", regex=True).str.split(r"[,;\n]")
+    ).explode("dish")
+    dishes["dish"] = dishes["dish"].str.strip().str.lower()
+    return dishes[dishes["dish"].notna() & (dishes["dish"] != "")]
+
+
+def _summary(grouped) -> pd.DataFrame:
+    totals = grouped[["count", "total", "squares"]].sum()
+    totals["mean_rating"] = totals["total"] / totals["count"]
+    variance = (totals["squares"] / totals["count"] - totals["mean_rating"] ** 2).clip(lower=0)
+    totals["std_rating"] = np.sqrt(variance)
+    return totals
+
+
+def _round(series: pd.Series):
+    return [None if pd.isna(value) else round(float(value), 2) for value in series]
+
+
+def _compute(frame: pd.DataFrame, start: date, end: date, window: int, min_count: int, limit: int) -> dict:
+    result = {
+        "start_date": start.isoformat(),
+        "end_date": end.isoformat(),
+        "total_feedbacks": int(frame["count"].sum()),
+        "menus_rated": len(frame),
+        "average_rating": round(float(frame["total"].sum() / frame["count"].sum()), 2) if len(frame) else 0,
+        "dishes": [],
+        "lowest_rated_dishes": [],
+        "meal_types": [],
+        "daily_trend": [],
+    }
+    if frame.empty:
+        return result
+
+    # Per-dish means, weighted by the number of ratings each serving received
+    by_dish = _dishes(frame).groupby("dish")
+    dishes = _summary(by_dish)
+    dishes["servings"] = by_dish.size()
+    dishes = dishes[dishes["count"] >= min_count].sort_values(["mean_rating", "count"], ascending=[False, False])
+    dish_records = [
+        {"dish": dish, "mean_rating": mean, "ratings": int(count), "servings": int(servings)}
+        for dish, mean, count, servings in zip(
+            dishes.index, _round(dishes["mean_rating"]), dishes["count"], dishes["servings"]
+        )
+    ]
+    result["dishes"] = dish_records
+    result["lowest_rated_dishes"] = dish_records[::-1][:limit]
+
+    meals = _summary(frame.groupby("meal_type"))
+    result["meal_types"] = [
+        {"meal_type": meal, "mean_rating": mean, "std_rating": std, "ratings": int(count)}
+        for meal, mean, std, count in zip(
+            meals.index, _round(meals["mean_rating"]), _round(meals["std_rating"]), meals["count"]
+        )
+    ]
+
+    # Daily series over the whole range (days without ratings stay empty), with
+    # a trailing window mean computed from rolling sums rather than means of means
+    days = pd.date_range(start, end - timedelta(days=1), freq="D")
+    daily = frame.groupby("day")[["count", "total"]].sum().reindex(days, fill_value=0)
+    rolling = daily.rolling(window, min_periods=1).sum()
+    daily_mean = (daily["total"] / daily["count"]).where(daily["count"] > 0)
+    rolling_mean = (rolling["total"] / rolling["count"]).where(rolling["count"] > 0)
+    result["daily_trend"] = [
+        {"date": day.date().isoformat(), "ratings": int(count), "mean_rating": mean, "rolling_mean": trend}
+        for day, count, mean, trend in zip(days, daily["count"], _round(daily_mean), _round(rolling_mean))
+    ]
+    return result
+
+
+def feedback_analytics(
+    db: Session,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    window: int = 7,
+    min_count: int = 3,
+    limit: int = 10,
+) -> dict:
+    """Dish, meal-type and trend statistics for menus served in [start, end).
+
+    Defaults to the 30 days up to and including today.
+    """
+    if end is None:
+        end = datetime.now().date() + timedelta(days=1)
+    if start is None:
+        start = end - timedelta(days=30)
+    if end <= start:
+        raise ValueError("end_date must be after start_date")
+    if (end - start).days > MAX_RANGE_DAYS:
+        raise ValueError(f"Date range cannot exceed {MAX_RANGE_DAYS} days")
+    if window < 1 or min_count < 1 or limit < 1:
+        raise ValueError("window, min_count and limit must be positive")
+
+    key = (start, end, window, min_count, limit)
+    versions = (table_version("feedback"), table_version("menu"))
+    with _lock:
+        cached = _cache.get(key)
+        if cached is not None and cached[0] == versions:
+            _cache.move_to_end(key)
+            return cached[1]
+
+    result = _compute(_menu_frame(db, start, end), start, end, window, min_count, limit)
+    with _lock:
+        _cache[key] = (versions, result)
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
@@ -0,0 +1,227 @@
+# services/feedback_ingest.py
+"""Write-behind ingestion for post-meal feedback bursts.
+
+`submit` validates a feedback against in-memory sets of student and menu ids
+(reloaded by one request whenever those tables change, via
+`utils.table_versions`) and puts it on a bounded queue; no SQL runs on the
+request path otherwise. A pair already waiting in the queue is refused with
+400. A pair that already has feedback in the table is accepted and then
+skipped by the flusher (counted as `duplicates_skipped`). A background thread
+drains the queue in batches, each written as one multi-row INSERT plus the
+rating-stats update in a single transaction.
+
+Delivery is at-least-once: a batch leaves memory only after its transaction
+commits, and a failed batch is retried (row by row if it keeps failing, so
+one bad row cannot hold up the rest). Retries cannot create
+duplicates because the insert skips rows that hit the unique
+(student_id, menu_id) index, which `database.db.init_db` creates on
+startup if it is missing. The queue lives in process memory, so it is
+drained on shutdown but not across a crash, and like the other in-process
+caches it assumes the single-worker deployment (`python app.py`).
+"""
+import logging
+import queue
+import threading
+import time
+from typing import Dict, List, Optional, Set
+
+from fastapi import HTTPException
+from sqlalchemy.dialects import postgresql, sqlite
+
+from database.db import Session
+from models.models import Feedback, Menu, Student
+from schemas.menu import FeedbackCreate
+from services.menu_stats_services import apply_rating_changes
+from utils.table_versions import table_version
+
+QUEUE_LIMIT = 5000
+BATCH_SIZE = 500
+FLUSH_INTERVAL = 0.5  # seconds to wait for a batch to fill up
+RETRY_DELAY = 2.0
+# After this many failed attempts a batch is split up so one bad row (e.g. a
+# menu deleted while its feedback was queued) cannot block everything behind it
+SPLIT_AFTER_ATTEMPTS = 3
+
+_feedback = Feedback.__table__
+
+logger = logging.getLogger(__name__)
+
+
+def _insert_ignoring_duplicates(db: Session):
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    return (
+        dialect.insert(_feedback)
+        .on_conflict_do_nothing()
+        .returning(_feedback.c.menu_id, _feedback.c.rating)
+    )
+
+
+class FeedbackIngestor:
+    def __init__(self, queue_limit: int = QUEUE_LIMIT, batch_size: int = BATCH_SIZE):
+        self.batch_size = batch_size
+        self._queue: "queue.Queue[dict]" = queue.Queue(maxsize=queue_limit)
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()  # one request reloads the id sets, the others wait
+        self._queued_keys: Set[tuple] = set()  # (student_id, menu_id) accepted but not yet committed
+        self._student_ids: Set[int] = set()
+        self._menu_ids: Set[int] = set()
+        self._id_versions: Optional[tuple] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._stats: Dict[str, float] = {
+            "accepted": 0,
+            "written": 0,
+            "duplicates_skipped": 0,
+            "batches": 0,
+            "flush_failures": 0,
+            "rejected": 0,
+            "queue_full": 0,
+            "last_batch_ms": 0,
+        }
+
+    # --------------------------
+    # Request path
+    # --------------------------
+    def _refresh_ids(self) -> None:
+        versions = (table_version("students"), table_version("menu"))
+        if versions == self._id_versions:
+            return
+        with self._refresh_lock:
+            versions = (table_version("students"), table_version("menu"))
+            if versions == self._id_versions:
+                return  # another request reloaded them while we waited
+            db = Session()
+            try:
+                student_ids = {sid for (sid,) in db.query(Student.id)}
+                menu_ids = {mid for (mid,) in db.query(Menu.id)}
+            finally:
+                db.close()
+            with self._lock:
+                self._student_ids, self._menu_ids, self._id_versions = student_ids, menu_ids, versions
+
+    def submit(self, feedback_data: FeedbackCreate) -> bool:
+        """Validate and enqueue; False when the queue is full and the caller should write directly."""
+        if not (1 <= feedback_data.rating <= 5):
+            raise HTTPException(status_code=400, detail="Rating must be between 1 and 5")
+        self._refresh_ids()
+        if feedback_data.student_id not in self._student_ids:
+            raise HTTPException(status_code=404, detail=f"Student with ID {feedback_data.student_id} not found")
+        if feedback_data.menu_id not in self._menu_ids:
+            raise HTTPException(status_code=404, detail=f"Menu with ID {feedback_data.menu_id} not found")
+
+        key = (feedback_data.student_id, feedback_data.menu_id)
+        with self._lock:
+            if key in self._queued_keys:
+                raise HTTPException(status_code=400, detail="Feedback already exists for this student and menu")
+            try:
+                self._queue.put_nowait({
+                    "student_id": feedback_data.student_id,
+                    "menu_id": feedback_data.menu_id,
+                    "date": feedback_data.date,
+                    "meal_type": feedback_data.meal_type,
+                    "rating": feedback_data.rating,
+                    "comment": feedback_data.comment,
+                })
+            except queue.Full:
+                self._stats["queue_full"] += 1
+                return False
+            self._queued_keys.add(key)
+            self._stats["accepted"] += 1
+        self.start()
+        return True
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["queued"] = self._queue.qsize()
+        stats["running"] = self._thread is not None and self._thread.is_alive()
+        return stats
+
+    # --------------------------
+    # Background flusher
+    # --------------------------
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="feedback-flusher", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 30.0) -> None:
+        """Flush everything still queued, then stop the flusher."""
+        self._stopping.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def _next_batch(self) -> List[dict]:
+        try:
+            batch = [self._queue.get(timeout=FLUSH_INTERVAL)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + FLUSH_INTERVAL
+        while len(batch) < self.batch_size:
+            remaining = 0 if self._stopping.is_set() else deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        batch: List[dict] = []
+        failures = 0
+        while True:
+            if not batch:
+                batch = self._next_batch()
+                if not batch:
+                    if self._stopping.is_set():
+                        return
+                    continue
+            try:
+                self._write(batch)
+            except Exception as e:
+                failures += 1
+                with self._lock:
+                    self._stats["flush_failures"] += 1
+                logger.warning("Feedback flush of %d row(s) failed (attempt %d): %s", len(batch), failures, e)
+                if failures < SPLIT_AFTER_ATTEMPTS:
+                    self._stopping.wait(RETRY_DELAY)
+                    continue  # retry the same batch
+                self._write_rows(batch)
+            with self._lock:
+                for row in batch:
+                    self._queued_keys.discard((row["student_id"], row["menu_id"]))
+            batch, failures = [], 0
+
+    def _write_rows(self, batch: List[dict]) -> None:
+        """Last resort for a failing batch: one transaction per row, dropping rows that still fail."""
+        for row in batch:
+            try:
+                self._write([row])
+            except Exception as e:
+                with self._lock:
+                    self._stats["rejected"] += 1
+                logger.error("Dropping feedback of student %s for menu %s: %s", row["student_id"], row["menu_id"], e)
+
+    def _write(self, batch: List[dict]) -> None:
+        started = time.perf_counter()
+        db = Session()
+        try:
+            inserted = db.execute(_insert_ignoring_duplicates(db), batch).all()
+            apply_rating_changes(db, [(menu_id, None, rating) for menu_id, rating in inserted])
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        with self._lock:
+            self._stats["batches"] += 1
+            self._stats["written"] += len(inserted)
+            self._stats["duplicates_skipped"] += len(batch) - len(inserted)
+            self._stats["last_batch_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+
+ingestor = FeedbackIngestor()
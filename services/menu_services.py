@@ -1,9 +1,29 @@
 from models.models import Menu, Feedback, Student
 from database.db import Session
-from typing import List, Optional
+from typing import List, Optional, Tuple
+from sqlalchemy import and_, insert, or_, update
 from fastapi import HTTPException
-from schemas.menu import MenuCreate, MenuUpdate, MenuResponse, FeedbackCreate, FeedbackUpdate, FeedbackResponse, MenuWithFeedbackResponse
-from datetime import datetime
+from schemas.menu import (
+    MenuCreate, MenuUpdate, MenuResponse, FeedbackCreate, FeedbackUpdate, FeedbackResponse, MenuWithFeedbackResponse,
+    BulkMenuResult, BulkMenuSkipped,
+)
+from services.menu_stats_services import apply_rating_change, drop_menu_rating_stats, get_menu_rating_stats
+from services.attendance_services import drop_menu_attendance
+from utils.table_versions import table_version
+from datetime import date as date_type, datetime, time, timedelta
+
+# Feedback columns plus the student's name, in FeedbackResponse field order
+FEEDBACK_COLUMNS = (
+    Feedback.id, Feedback.student_id, Feedback.menu_id, Feedback.date, Feedback.meal_type,
+    Feedback.rating, Feedback.comment, Student.name.label("student_name"),
+)
+
+
+def _feedback_responses(db: Session, *criteria, order_by=None) -> List[FeedbackResponse]:
+    """Feedbacks with student names from one joined query, projected straight to the schema."""
+    query = db.query(*FEEDBACK_COLUMNS).outerjoin(Student, Feedback.student_id == Student.id).filter(*criteria)
+    rows = query.order_by(*(order_by if order_by is not None else (Feedback.id,))).all()
+    return [FeedbackResponse(**row._asdict()) for row in rows]
 
 
 def create_menu(menu_data: MenuCreate, db: Session) -> Menu:
@@ -36,12 +56,90 @@ def create_menu(menu_data: MenuCreate, db: Session) -> Menu:
         raise HTTPException(status_code=400, detail=str(e))
 
 
-def get_menus(db: Session, date: Optional[datetime] = None, meal_type: Optional[str] = None) -> List[MenuResponse]:
+def create_menus_bulk(menus: List[MenuCreate], db: Session, upsert: bool = False) -> BulkMenuResult:
+    """Create many menus in one transaction.
+
+    Existing (day, meal_type) slots are found with a single query over the
+    requested days' [midnight, next midnight) ranges and either skipped or,
+    with `upsert`, have their items replaced. New menus go in as one batched
+    INSERT.
+    """
+    result = BulkMenuResult()
+    if not menus:
+        return result
+
+    days = {_day_start(menu.date) for menu in menus}
+    existing = {}
+    for menu_id, menu_date, meal_type in db.query(Menu.id, Menu.date, Menu.meal_type).filter(
+        or_(*(and_(Menu.date >= day, Menu.date < day + timedelta(days=1)) for day in days))
+    ).order_by(Menu.id):
+        existing.setdefault((_day_start(menu_date), meal_type.name), menu_id)
+
+    new_rows, updates, seen = [], [], set()
+    for menu in menus:
+        key = (_day_start(menu.date), menu.meal_type.name)
+        if key in seen:
+            result.skipped.append(BulkMenuSkipped(
+                date=menu.date, meal_type=menu.meal_type, reason="duplicate_in_request",
+                existing_menu_id=existing.get(key),
+            ))
+            continue
+        seen.add(key)
+        if key not in existing:
+            new_rows.append({"date": menu.date, "meal_type": menu.meal_type, "items": menu.items})
+        elif upsert:
+            updates.append({"id": existing[key], "items": menu.items})
+            result.updated.append(MenuResponse(id=existing[key], date=menu.date, meal_type=menu.meal_type, items=menu.items))
+        else:
+            result.skipped.append(BulkMenuSkipped(
+                date=menu.date, meal_type=menu.meal_type, reason="exists", existing_menu_id=existing[key],
+            ))
+
+    try:
+        if new_rows:
+            created = db.execute(insert(Menu).returning(Menu.id, Menu.date, Menu.meal_type, Menu.items), new_rows).all()
+            result.created = sorted(
+                (MenuResponse(id=menu_id, date=menu_date, meal_type=meal_type.name, items=items)
+                 for menu_id, menu_date, meal_type, items in created),
+                key=lambda menu: menu.id,
+            )
+        if updates:
+            db.execute(update(Menu), updates)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    return result
+
+
+def _day_start(value) -> datetime:
+    """Midnight of the day `value` (a date or datetime) falls on."""
+    day = value.date() if isinstance(value, datetime) else value
+    return datetime.combine(day, time.min)
+
+
+def get_menus(
+    db: Session,
+    date: Optional[datetime] = None,
+    meal_type: Optional[str] = None,
+    start: Optional[date_type] = None,
+    end: Optional[date_type] = None,
+) -> List[MenuResponse]:
+    """Menus on one day (`date`) or in the half-open day range [start, end).
+
+    Menu.date is a timestamp, so days are matched as [midnight, next midnight)
+    ranges, which the index on Menu.date can serve directly.
+    """
     try:
         query = db.query(Menu)
 
         if date:
-            query = query.filter_by(date=date)
+            day_start = _day_start(date)
+            query = query.filter(Menu.date >= day_start, Menu.date < day_start + timedelta(days=1))
+        if start:
+            query = query.filter(Menu.date >= _day_start(start))
+        if end:
+            query = query.filter(Menu.date < _day_start(end))
         if meal_type:
             query = query.filter_by(meal_type=meal_type)
 
@@ -52,6 +150,25 @@ def get_menus(db: Session, date: Optional[datetime] = None, meal_type: Optional[
         raise HTTPException(status_code=400, detail=str(e))
 
 
+# (local day, menu table version, menus); replaced whole so readers never see a partial entry
+_today_cache: Optional[Tuple[date_type, int, List[MenuResponse]]] = None
+
+
+def get_today_menus_cached(db: Session) -> List[MenuResponse]:
+    """Today's menus, cached until the next menu write or local midnight."""
+    global _today_cache
+    today = datetime.now().date()
+    # Read the version before querying: a write landing in between leaves the
+    # entry tagged with the older version, so the next call simply reloads
+    version = table_version("menu")
+    cached = _today_cache
+    if cached is not None and cached[0] == today and cached[1] == version:
+        return cached[2]
+    menus = get_menus(db, date=today)
+    _today_cache = (today, version, menus)
+    return menus
+
+
 def get_menu_by_id(menu_id: int, db: Session) -> MenuWithFeedbackResponse:
     try:
         menu = db.query(Menu).filter_by(id=menu_id).first()
@@ -59,11 +176,7 @@ def get_menu_by_id(menu_id: int, db: Session) -> MenuWithFeedbackResponse:
             raise HTTPException(status_code=404, detail=f"Menu with ID {menu_id} not found")
 
         # Get feedbacks with student names
-        feedbacks = []
-        for feedback in menu.feedbacks:
-            feedback_data = FeedbackResponse.from_orm(feedback)
-            feedback_data.student_name = feedback.student.name
-            feedbacks.append(feedback_data)
+        feedbacks = _feedback_responses(db, Feedback.menu_id == menu_id)
 
         return MenuWithFeedbackResponse(
             id=menu.id,
@@ -106,6 +219,8 @@ def delete_menu(menu_id: int, db: Session):
             raise HTTPException(status_code=404, detail=f"Menu with ID {menu_id} not found")
 
         db.delete(menu)
+        drop_menu_rating_stats(db, menu_id)
+        drop_menu_attendance(db, menu_id)
         db.commit()
         return {"message": "Menu deleted successfully", "deleted_menu_id": menu_id}
 
@@ -152,6 +267,8 @@ def create_feedback(feedback_data: FeedbackCreate, db: Session) -> Feedback:
         )
 
         db.add(feedback)
+        db.flush()
+        apply_rating_change(db, feedback.menu_id, None, feedback.rating)
         db.commit()
         db.refresh(feedback)
         return feedback
@@ -163,23 +280,13 @@ def create_feedback(feedback_data: FeedbackCreate, db: Session) -> Feedback:
 
 def get_feedbacks(db: Session, student_id: Optional[int] = None, menu_id: Optional[int] = None) -> List[FeedbackResponse]:
     try:
-        query = db.query(Feedback)
-
+        criteria = []
         if student_id:
-            query = query.filter_by(student_id=student_id)
+            criteria.append(Feedback.student_id == student_id)
         if menu_id:
-            query = query.filter_by(menu_id=menu_id)
-
-        feedbacks = query.order_by(Feedback.date.desc()).all()
+            criteria.append(Feedback.menu_id == menu_id)
 
-        # Add student names to responses
-        result = []
-        for feedback in feedbacks:
-            feedback_data = FeedbackResponse.from_orm(feedback)
-            feedback_data.student_name = feedback.student.name
-            result.append(feedback_data)
-
-        return result
+        return _feedback_responses(db, *criteria, order_by=(Feedback.date.desc(), Feedback.id.desc()))
 
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -191,6 +298,7 @@ def update_feedback(feedback_id: int, feedback_update: FeedbackUpdate, db: Sessi
         if not feedback:
             raise HTTPException(status_code=404, detail=f"Feedback with ID {feedback_id} not found")
 
+        old_rating = feedback.rating
         if feedback_update.rating is not None:
             if not (1 <= feedback_update.rating <= 5):
                 raise HTTPException(status_code=400, detail="Rating must be between 1 and 5")
@@ -199,12 +307,10 @@ def update_feedback(feedback_id: int, feedback_update: FeedbackUpdate, db: Sessi
         if feedback_update.comment is not None:
             feedback.comment = feedback_update.comment
 
+        db.flush()
+        apply_rating_change(db, feedback.menu_id, old_rating, feedback.rating)
         db.commit()
-        db.refresh(feedback)
-
-        feedback_data = FeedbackResponse.from_orm(feedback)
-        feedback_data.student_name = feedback.student.name
-        return feedback_data
+        return _feedback_responses(db, Feedback.id == feedback_id)[0]
 
     except Exception as e:
         db.rollback()
@@ -218,6 +324,8 @@ def delete_feedback(feedback_id: int, db: Session):
             raise HTTPException(status_code=404, detail=f"Feedback with ID {feedback_id} not found")
 
         db.delete(feedback)
+        db.flush()
+        apply_rating_change(db, feedback.menu_id, feedback.rating, None)
         db.commit()
         return {"message": "Feedback deleted successfully", "deleted_feedback_id": feedback_id}
 
@@ -228,33 +336,10 @@ def delete_feedback(feedback_id: int, db: Session):
 
 def get_menu_feedback_stats(menu_id: int, db: Session):
     try:
-        menu = db.query(Menu).filter_by(id=menu_id).first()
-        if not menu:
+        stats = get_menu_rating_stats(menu_id, db)
+        if stats is None:
             raise HTTPException(status_code=404, detail=f"Menu with ID {menu_id} not found")
-
-        feedbacks = db.query(Feedback).filter_by(menu_id=menu_id).all()
-
-        if not feedbacks:
-            return {
-                "menu_id": menu_id,
-                "total_feedbacks": 0,
-                "average_rating": 0,
-                "rating_distribution": {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
-            }
-
-        total_feedbacks = len(feedbacks)
-        average_rating = sum(f.rating for f in feedbacks) / total_feedbacks
-
-        rating_distribution = {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
-        for feedback in feedbacks:
-            rating_distribution[feedback.rating] += 1
-
-        return {
-            "menu_id": menu_id,
-            "total_feedbacks": total_feedbacks,
-            "average_rating": round(average_rating, 2),
-            "rating_distribution": rating_distribution
-        }
+        return stats
 
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
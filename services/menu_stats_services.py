@@ -0,0 +1,182 @@
+# services/menu_stats_services.py
+"""Per-menu rating aggregates (count, sum, 1-5 histogram).
+
+`menu_services` calls `apply_rating_change` in the same transaction as every
+feedback create/update/delete (the write-behind flusher in `feedback_ingest`
+uses the batch form, `apply_rating_changes`), so /menu/{id}/stats is a
+primary-key read. A menu without a stats row yet gets one computed with a
+GROUP BY on first write; `rebuild_menu_rating_stats` recomputes every row the
+same way.
+"""
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, case, delete, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from database.db import Session
+from models.models import Feedback, Menu, MenuRatingStats
+
+RATINGS = (1, 2, 3, 4, 5)
+COUNTER_FIELDS = ("feedback_count", "rating_sum", *(f"rating_{rating}" for rating in RATINGS))
+
+_stats = MenuRatingStats.__table__
+
+
+def _insert(connection):
+    """INSERT that can say what to do when the menu already has a stats row."""
+    dialect = postgresql if connection.dialect.name == "postgresql" else sqlite
+    return dialect.insert(_stats)
+
+
+def _grouped_stats(connection, *criteria) -> Dict[int, dict]:
+    """Stats rows recomputed from the feedback table, keyed by menu id."""
+    rows = connection.execute(
+        select(
+            Feedback.menu_id,
+            func.count(Feedback.id),
+            func.coalesce(func.sum(Feedback.rating), 0),
+            *(func.count(case((Feedback.rating == rating, 1))) for rating in RATINGS),
+        )
+        .where(*criteria)
+        .group_by(Feedback.menu_id)
+    ).all()
+    return {
+        menu_id: {
+            "menu_id": menu_id,
+            "feedback_count": count,
+            "rating_sum": total,
+            **{f"rating_{rating}": value for rating, value in zip(RATINGS, histogram)},
+        }
+        for menu_id, count, total, *histogram in rows
+    }
+
+
+def apply_rating_change(db: Session, menu_id: int, old_rating: Optional[int], new_rating: Optional[int]) -> None:
+    """Move one feedback from `old_rating` to `new_rating`; None means created or deleted.
+
+    Must run after the feedback write has been flushed and before the commit.
+    """
+    if old_rating == new_rating:
+        return
+    values = {}
+    count_delta = (new_rating is not None) - (old_rating is not None)
+    if count_delta:
+        values["feedback_count"] = _stats.c.feedback_count + count_delta
+    values["rating_sum"] = _stats.c.rating_sum + (new_rating or 0) - (old_rating or 0)
+    if old_rating is not None:
+        column = f"rating_{old_rating}"
+        values[column] = _stats.c[column] - 1
+    if new_rating is not None:
+        column = f"rating_{new_rating}"
+        values[column] = _stats.c[column] + 1
+
+    connection = db.connection()
+    move = update(_stats).where(_stats.c.menu_id == menu_id).values(**values)
+    if connection.execute(move).rowcount:
+        return
+    # First write for this menu: seed the row from the (already flushed) feedbacks
+    row = _grouped_stats(connection, Feedback.menu_id == menu_id).get(menu_id)
+    if row is not None:
+        seeded = connection.execute(_insert(connection).values(**row).on_conflict_do_nothing()).rowcount
+        if not seeded:
+            # A concurrent first write seeded it without seeing ours; count ours on top
+            connection.execute(move)
+
+
+def apply_rating_changes(db: Session, changes: Iterable[Tuple[int, Optional[int], Optional[int]]]) -> None:
+    """Batch form of `apply_rating_change` for (menu_id, old_rating, new_rating) triples."""
+    deltas: Dict[int, List[int]] = defaultdict(lambda: [0] * (2 + len(RATINGS)))
+    for menu_id, old_rating, new_rating in changes:
+        delta = deltas[menu_id]
+        for rating, sign in ((old_rating, -1), (new_rating, 1)):
+            if rating is not None:
+                delta[0] += sign
+                delta[1] += sign * rating
+                delta[1 + rating] += sign
+    if not deltas:
+        return
+
+    connection = db.connection()
+    menu_ids = sorted(deltas)
+    existing = set(connection.execute(
+        select(_stats.c.menu_id).where(_stats.c.menu_id.in_(menu_ids))
+    ).scalars())
+    missing = [menu_id for menu_id in menu_ids if menu_id not in existing]
+    seeded = set()
+    if missing:
+        rows = _grouped_stats(connection, Feedback.menu_id.in_(missing))
+        if rows:
+            # Rows a concurrent first write created meanwhile are skipped and
+            # get the deltas below instead
+            seeded.update(connection.execute(
+                _insert(connection).on_conflict_do_nothing().returning(_stats.c.menu_id),
+                list(rows.values()),
+            ).scalars())
+    changed = [menu_id for menu_id in menu_ids if menu_id not in seeded and any(deltas[menu_id])]
+    if changed:
+        connection.execute(
+            update(_stats)
+            .where(_stats.c.menu_id == bindparam("mid"))
+            .values(**{field: _stats.c[field] + bindparam(f"d_{field}") for field in COUNTER_FIELDS}),
+            [
+                {"mid": menu_id, **{f"d_{field}": value for field, value in zip(COUNTER_FIELDS, deltas[menu_id])}}
+                for menu_id in changed
+            ],
+        )
+
+
+def drop_menu_rating_stats(db: Session, menu_id: int) -> None:
+    db.connection().execute(delete(_stats).where(_stats.c.menu_id == menu_id))
+
+
+def rebuild_menu_rating_stats(db: Session) -> int:
+    """Replace every stats row with values recomputed from feedback."""
+    try:
+        connection = db.connection()
+        rows = _grouped_stats(connection)
+        connection.execute(delete(_stats))
+        if rows:
+            # Overwrite rows a concurrent feedback write created after the DELETE
+            statement = _insert(connection)
+            connection.execute(
+                statement.on_conflict_do_update(
+                    index_elements=["menu_id"],
+                    set_={field: statement.excluded[field] for field in COUNTER_FIELDS},
+                ),
+                list(rows.values()),
+            )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return len(rows)
+
+
+def ensure_menu_rating_stats() -> None:
+    """Backfill stats on startup when the table is empty but feedback already exists."""
+    session = Session()
+    try:
+        has_stats = session.query(MenuRatingStats.menu_id).first() is not None
+        if not has_stats and session.query(Feedback.id).first() is not None:
+            rebuild_menu_rating_stats(session)
+    finally:
+        session.close()
+
+
+def get_menu_rating_stats(menu_id: int, db: Session) -> Optional[dict]:
+    """Stats for one menu, or None if the menu does not exist."""
+    stats = db.query(MenuRatingStats).filter_by(menu_id=menu_id).first()
+    if stats is None:
+        if db.query(Menu.id).filter_by(id=menu_id).first() is None:
+            return None
+        count, total, histogram = 0, 0, {rating: 0 for rating in RATINGS}
+    else:
+        count, total = stats.feedback_count, stats.rating_sum
+        histogram = {rating: getattr(stats, f"rating_{rating}") for rating in RATINGS}
+    return {
+        "menu_id": menu_id,
+        "total_feedbacks": count,
+        "average_rating": round(total / count, 2) if count else 0,
+        "rating_distribution": histogram,
+    }
@@ -0,0 +1,171 @@
+# services/menu_template_services.py
+"""Weekly menu templates and server-side cloning of menus onto a date range.
+
+A clone is a single INSERT ... SELECT: the target days are supplied as an
+inline UNION ALL table (target day, weekday, source day) that is joined to
+either the template slots or the source menus. Menus are stored at midnight
+of their day, like the ones created from the mess page. Target slots that
+already hold a menu for the same meal are left alone.
+"""
+from datetime import date, datetime, time, timedelta
+from typing import List
+
+from fastapi import HTTPException
+from sqlalchemy import DateTime, Integer, and_, exists, func, insert, literal, select, union_all
+from sqlalchemy.orm import aliased
+
+from database.db import Session
+from models.models import Menu, MenuTemplate, MenuTemplateItem
+from schemas.menu import MenuCloneRequest, MenuCloneResult, MenuResponse, MenuTemplateCreate, MenuTemplateResponse
+
+# A semester with room to spare; also below SQLite's 500-term compound SELECT limit
+MAX_CLONE_DAYS = 200
+
+
+def create_menu_template(template_data: MenuTemplateCreate, db: Session) -> MenuTemplateResponse:
+    slots = set()
+    for slot in template_data.items:
+        if not 0 <= slot.day_of_week <= 6:
+            raise HTTPException(status_code=400, detail="day_of_week must be between 0 (Monday) and 6 (Sunday)")
+        key = (slot.day_of_week, slot.meal_type)
+        if key in slots:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Template has more than one {slot.meal_type.value} on day {slot.day_of_week}",
+            )
+        slots.add(key)
+
+    if db.query(MenuTemplate.id).filter_by(name=template_data.name).first():
+        raise HTTPException(status_code=400, detail=f"Menu template '{template_data.name}' already exists")
+
+    try:
+        template = MenuTemplate(
+            name=template_data.name,
+            description=template_data.description,
+            items=[
+                MenuTemplateItem(day_of_week=slot.day_of_week, meal_type=slot.meal_type, items=slot.items)
+                for slot in template_data.items
+            ],
+        )
+        db.add(template)
+        db.commit()
+        db.refresh(template)
+        return MenuTemplateResponse.from_orm(template)
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def get_menu_templates(db: Session) -> List[MenuTemplateResponse]:
+    templates = db.query(MenuTemplate).order_by(MenuTemplate.name).all()
+    return [MenuTemplateResponse.from_orm(template) for template in templates]
+
+
+def get_menu_template(template_id: int, db: Session) -> MenuTemplateResponse:
+    template = db.query(MenuTemplate).filter_by(id=template_id).first()
+    if not template:
+        raise HTTPException(status_code=404, detail=f"Menu template with ID {template_id} not found")
+    return MenuTemplateResponse.from_orm(template)
+
+
+def delete_menu_template(template_id: int, db: Session):
+    template = db.query(MenuTemplate).filter_by(id=template_id).first()
+    if not template:
+        raise HTTPException(status_code=404, detail=f"Menu template with ID {template_id} not found")
+    try:
+        db.delete(template)
+        db.commit()
+        return {"message": "Menu template deleted successfully", "deleted_template_id": template_id}
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _midnight(day: date) -> datetime:
+    return datetime.combine(day, time.min)
+
+
+def clone_menus(request: MenuCloneRequest, db: Session) -> MenuCloneResult:
+    """Copy a template or an existing date range onto the target range in one statement."""
+    from_template = request.template_id is not None
+    from_range = request.source_start is not None or request.source_end is not None
+    if from_template == from_range:
+        raise HTTPException(status_code=400, detail="Give either template_id or source_start/source_end")
+    if request.target_end < request.target_start:
+        raise HTTPException(status_code=400, detail="target_end must not be before target_start")
+    target_days = (request.target_end - request.target_start).days + 1
+    if target_days > MAX_CLONE_DAYS:
+        raise HTTPException(status_code=400, detail=f"Cannot clone more than {MAX_CLONE_DAYS} days at once")
+
+    if from_template:
+        if not db.query(MenuTemplate.id).filter_by(id=request.template_id).first():
+            raise HTTPException(status_code=404, detail=f"Menu template with ID {request.template_id} not found")
+        source_days = 0
+    else:
+        if request.source_start is None or request.source_end is None or request.source_end < request.source_start:
+            raise HTTPException(status_code=400, detail="source_start and source_end must form a valid range")
+        source_days = (request.source_end - request.source_start).days + 1
+
+    # One row per target day: its half-open bounds, its weekday and (for range
+    # clones) the bounds of the source day it is copied from
+    days = []
+    for offset in range(target_days):
+        target = request.target_start + timedelta(days=offset)
+        source = request.source_start + timedelta(days=offset % source_days) if source_days else target
+        days.append(select(
+            literal(_midnight(target), DateTime).label("day"),
+            literal(_midnight(target + timedelta(days=1)), DateTime).label("day_end"),
+            literal(target.weekday(), Integer).label("weekday"),
+            literal(_midnight(source), DateTime).label("source_from"),
+            literal(_midnight(source + timedelta(days=1)), DateTime).label("source_to"),
+        ))
+    calendar = union_all(*days).subquery("calendar")
+
+    if from_template:
+        source = (
+            select(calendar.c.day, calendar.c.day_end, MenuTemplateItem.meal_type, MenuTemplateItem.items)
+            .select_from(calendar)
+            .join(MenuTemplateItem, and_(
+                MenuTemplateItem.template_id == request.template_id,
+                MenuTemplateItem.day_of_week == calendar.c.weekday,
+            ))
+        )
+    else:
+        # Legacy data may hold two menus for one slot; copy only the first
+        earlier = aliased(Menu)
+        source = (
+            select(calendar.c.day, calendar.c.day_end, Menu.meal_type, Menu.items)
+            .select_from(calendar)
+            .join(Menu, and_(Menu.date >= calendar.c.source_from, Menu.date < calendar.c.source_to))
+            .where(~exists().where(and_(
+                earlier.date >= calendar.c.source_from,
+                earlier.date < calendar.c.source_to,
+                earlier.meal_type == Menu.meal_type,
+                earlier.id < Menu.id,
+            )))
+        )
+    slots = source.subquery()
+
+    taken = exists().where(and_(
+        Menu.date >= slots.c.day,
+        Menu.date < slots.c.day_end,
+        Menu.meal_type == slots.c.meal_type,
+    ))
+    try:
+        candidates = db.execute(select(func.count()).select_from(slots)).scalar() or 0
+        rows = db.execute(
+            insert(Menu)
+            .from_select(["date", "meal_type", "items"], select(slots.c.day, slots.c.meal_type, slots.c["items"]).where(~taken))
+            .returning(Menu.id, Menu.date, Menu.meal_type, Menu.items)
+        ).all()
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+
+    created = sorted(
+        (MenuResponse(id=menu_id, date=menu_date, meal_type=meal_type.name, items=items)
+         for menu_id, menu_date, meal_type, items in rows),
+        key=lambda menu: (menu.date, menu.id),
+    )
+    return MenuCloneResult(created=created, skipped=candidates - len(created))
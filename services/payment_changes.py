@@ -0,0 +1,135 @@
+# services/payment_changes.py
+"""Single fan-out point for payment writes to the tables derived from payments.
+
+ORM writes (create, update, delete, cascades from rooms/students) are picked up
+by a flush hook; set-based statements that bypass the unit of work call
+`record_payment_changes` with the rows they changed. Either way the derived
+tables are updated in the same transaction as the payment itself, and change
+events are published to the SSE bus once that transaction commits.
+"""
+from collections import namedtuple
+from typing import List, Optional, Tuple
+
+from sqlalchemy import event, inspect
+
+from database.db import Session
+from models.models import Payment, Student
+from schemas.payments import PaymentStatus
+from services.balance_services import apply_balance_changes, drop_student_balances
+from services.payment_events import bus
+from services.rollup_services import apply_rollup_changes
+
+PaymentRow = namedtuple("PaymentRow", [
+    "id", "student_id", "year", "month", "status", "payment_method", "room_id", "amount",
+    "date", "transaction_id",
+])
+PaymentChange = Tuple[Optional[PaymentRow], Optional[PaymentRow]]
+
+# Columns to RETURNING from set-based statements, in PaymentRow order
+ROW_COLUMNS = tuple(getattr(Payment, field) for field in PaymentRow._fields)
+
+_EVENTS_KEY = "payment_events"
+_KINDS_KEY = "payment_event_kinds"
+
+
+def record_payment_changes(db: Session, changes: List[PaymentChange]) -> None:
+    """Apply (before, after) pairs; None on one side means inserted or deleted."""
+    if not changes:
+        return
+    connection = db.connection()
+    apply_rollup_changes(connection, changes)
+    apply_balance_changes(connection, changes)
+
+    kinds = db.info.get(_KINDS_KEY, {})
+    pending = db.info.setdefault(_EVENTS_KEY, {})
+    for before, after in changes:
+        row = after or before
+        pending[row.id] = _event(kinds.get(row.id) or _kind(before, after), row, deleted=after is None)
+
+
+def announce_payment_event(db: Session, payment_id: int, kind: str) -> None:
+    """Name the event for a payment changed in this transaction (e.g. "submitted")."""
+    db.info.setdefault(_KINDS_KEY, {})[payment_id] = kind
+
+
+def _kind(before: Optional[PaymentRow], after: Optional[PaymentRow]) -> str:
+    if before is None:
+        return "created"
+    if after is None:
+        return "deleted"
+    if before.status == PaymentStatus.pending and after.status == PaymentStatus.paid:
+        return "verified"
+    if before.status == PaymentStatus.pending and after.status == PaymentStatus.failed:
+        return "rejected"
+    return "updated"
+
+
+def _event(kind: str, row: PaymentRow, deleted: bool) -> dict:
+    if deleted:
+        return {"type": kind, "payment": {"id": row.id, "student_id": row.student_id}}
+    return {
+        "type": kind,
+        "payment": {
+            "id": row.id,
+            "student_id": row.student_id,
+            "room_id": row.room_id,
+            "amount": row.amount,
+            "status": row.status.value if row.status is not None else None,
+            "month": row.month,
+            "year": row.year,
+            "payment_method": row.payment_method.value if row.payment_method is not None else None,
+            "date": row.date.isoformat() if row.date is not None else None,
+            "transaction_id": row.transaction_id,
+        },
+    }
+
+
+def _row(payment: Payment, committed: bool) -> PaymentRow:
+    """Values of a payment before (committed=True) or after the current flush."""
+    state = inspect(payment)
+    values = []
+    for field in PaymentRow._fields:
+        history = state.attrs[field].history
+        if committed and history.deleted:
+            values.append(history.deleted[0])
+        else:
+            values.append(getattr(payment, field))
+    return PaymentRow(*values)
+
+
+@event.listens_for(Session, "after_flush")
+def _record_flushed_payments(session, flush_context):
+    changes: List[PaymentChange] = []
+    deleted_students = []
+    for obj in session.new:
+        if isinstance(obj, Payment):
+            changes.append((None, _row(obj, committed=False)))
+    for obj in session.deleted:
+        if isinstance(obj, Payment):
+            changes.append((_row(obj, committed=True), None))
+        elif isinstance(obj, Student):
+            deleted_students.append(obj.id)
+    for obj in session.dirty:
+        if isinstance(obj, Payment) and session.is_modified(obj):
+            before, after = _row(obj, committed=True), _row(obj, committed=False)
+            if before != after:
+                changes.append((before, after))
+
+    if changes or deleted_students:
+        record_payment_changes(session, changes)
+        if deleted_students:
+            drop_student_balances(session.connection(), deleted_students)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_committed_events(session):
+    session.info.pop(_KINDS_KEY, None)
+    events = session.info.pop(_EVENTS_KEY, None)
+    if events:
+        bus.publish(list(events.values()))
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_events(session):
+    session.info.pop(_KINDS_KEY, None)
+    session.info.pop(_EVENTS_KEY, None)
@@ -0,0 +1,131 @@
+# services/payment_events.py
+"""In-process pub/sub of payment change events for the SSE stream.
+
+Events are published after the writing transaction commits (see
+`services.payment_changes`) and kept in a bounded ring buffer so a client that
+reconnects with `Last-Event-ID` can resume without reloading. Like the ETag
+counters this only works for the single-worker deployment (`python app.py`);
+ids carry a per-process epoch so ids from a previous process force a reload.
+"""
+import asyncio
+import json
+import threading
+import uuid
+from collections import deque
+from typing import Deque, List, Optional, Set, Tuple
+
+EVENT_BUFFER_SIZE = 1000
+SUBSCRIBER_QUEUE_LIMIT = 500
+KEEPALIVE_SECONDS = 15
+
+_EPOCH = uuid.uuid4().hex[:8]
+
+
+class _Subscriber:
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.overflowed = False
+
+    def deliver(self, event) -> None:
+        # Runs on the subscriber's loop. A slow client is cut off rather than
+        # buffering without bound; it reconnects and resumes from the ring buffer.
+        if self.overflowed:
+            return
+        if self.queue.qsize() >= SUBSCRIBER_QUEUE_LIMIT:
+            self.overflowed = True
+            self.queue.put_nowait(None)
+            return
+        self.queue.put_nowait(event)
+
+
+class PaymentEventBus:
+    def __init__(self, buffer_size: int = EVENT_BUFFER_SIZE):
+        self._buffer: Deque[Tuple[int, str]] = deque(maxlen=buffer_size)
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._subscribers: Set[_Subscriber] = set()
+
+    def publish(self, events: List[dict]) -> None:
+        """Number, buffer and fan out events; safe to call from any thread."""
+        if not events:
+            return
+        with self._lock:
+            framed = []
+            for event in events:
+                self._seq += 1
+                framed.append((self._seq, json.dumps(event, separators=(",", ":"))))
+            self._buffer.extend(framed)
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            for item in framed:
+                try:
+                    subscriber.loop.call_soon_threadsafe(subscriber.deliver, item)
+                except RuntimeError:  # loop already closed
+                    self.unsubscribe(subscriber)
+                    break
+
+    def subscribe(self) -> _Subscriber:
+        subscriber = _Subscriber(asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: _Subscriber) -> None:
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def since(self, last_event_id: Optional[str]) -> Tuple[List[Tuple[int, str]], bool]:
+        """Buffered events after `last_event_id`; False when they cannot cover the gap."""
+        with self._lock:
+            buffered = list(self._buffer)
+            current = self._seq
+        if not last_event_id:
+            return [], True
+        epoch, _, seq = last_event_id.partition(":")
+        if epoch != _EPOCH or not seq.isdigit() or int(seq) > current:
+            return [], False
+        last = int(seq)
+        oldest = buffered[0][0] if buffered else current + 1
+        if last < oldest - 1:
+            return [], False
+        return [item for item in buffered if item[0] > last], True
+
+
+bus = PaymentEventBus()
+
+
+def format_event(item: Tuple[int, str]) -> str:
+    seq, data = item
+    return f"id: {_EPOCH}:{seq}\ndata: {data}\n\n"
+
+
+async def stream_payment_events(request, last_event_id: Optional[str]):
+    """SSE body: replay what the client missed, then forward live events."""
+    subscriber = bus.subscribe()
+    try:
+        missed, complete = bus.since(last_event_id)
+        if not complete:
+            # Tell the client its view is stale; it reloads once and continues
+            yield "event: reset\ndata: {}\n\n"
+        last_sent = 0
+        for item in missed:
+            last_sent = item[0]
+            yield format_event(item)
+        yield "retry: 3000\n\n"
+
+        while True:
+            if await request.is_disconnected():
+                break
+            try:
+                item = await asyncio.wait_for(subscriber.queue.get(), timeout=KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if item is None:
+                break
+            if item[0] <= last_sent:
+                continue  # already replayed from the buffer
+            yield format_event(item)
+    finally:
+        bus.unsubscribe(subscriber)
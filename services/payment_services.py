@@ -1,8 +1,17 @@
 # services/payment_services.py
-from sqlalchemy import func
+from sqlalchemy import func, insert, select, update, literal, cast, String, exists, and_, not_
 from models.models import Payment, Student, Room
 from database.db import Session
-from schemas.payments import PaymentStatus, PaymentCreate, PaymentOut, PaymentMethod
+from services.payment_changes import PaymentRow, ROW_COLUMNS, record_payment_changes, announce_payment_event
+from schemas.payments import (
+    PaymentStatus, PaymentCreate, PaymentOut, PaymentMethod, DuesGenerateResult,
+    ReviewAction, BulkReviewOutcome, BulkReviewResult, Defaulter, DefaultersReport,
+    PaymentBulkStatusUpdate, PaymentBulkStatusResult
+)
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+import threading
 import uuid
 from datetime import datetime
 import csv
@@ -62,6 +71,121 @@ def create_payment(student_id: int, amount: float, pay_status: PaymentStatus, mo
     db.refresh(payment)
     return PaymentOut.from_orm(payment)
 
+def dues_transaction_prefix(month: int, year: int) -> str:
+    """Transaction IDs of generated dues are deterministic per student and period."""
+    return f"DUE_{year}{month:02d}_"
+
+def generate_monthly_dues(month: int, year: int, db: Session) -> DuesGenerateResult:
+    """Create pending rent rows for every assigned student without a payment for the period.
+
+    Runs as a single INSERT ... SELECT, so it is idempotent and finishes in one
+    transaction regardless of the number of students.
+    """
+    if month < 1 or month > 12:
+        raise ValueError("Month must be between 1 and 12")
+    if year < 2020 or year > 2030:
+        raise ValueError("Year must be between 2020 and 2030")
+
+    has_payment = exists().where(and_(
+        Payment.student_id == Student.id,
+        Payment.month == month,
+        Payment.year == year,
+    ))
+    assigned = db.query(func.count(Student.id)).join(Room, Student.room_id == Room.id).scalar() or 0
+
+    missing = (
+        select(
+            Student.id,
+            Student.room_id,
+            literal(datetime.utcnow(), Payment.date.type),
+            Room.price,
+            literal(PaymentStatus.pending, Payment.status.type),
+            literal(month, Payment.month.type),
+            literal(year, Payment.year.type),
+            literal(dues_transaction_prefix(month, year), String) + cast(Student.id, String),
+            literal(PaymentMethod.cash, Payment.payment_method.type),
+            literal(False, Payment.receipt_generated.type),
+        )
+        .join(Room, Student.room_id == Room.id)
+        .where(~has_payment)
+    )
+    statement = insert(Payment).from_select(
+        ["student_id", "room_id", "date", "amount", "status", "month", "year",
+         "transaction_id", "payment_method", "receipt_generated"],
+        missing,
+    ).returning(*ROW_COLUMNS)
+    try:
+        rows = db.execute(statement).all()
+        created = len(rows)
+        record_payment_changes(db, [(None, PaymentRow(*row)) for row in rows])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return DuesGenerateResult(month=month, year=year, created=created, already_present=assigned - created)
+
+def get_defaulters(month: int, year: int, db: Session) -> DefaultersReport:
+    """Assigned students without a Paid row for the period, in one anti-join query.
+
+    Months overdue counts back to the last paid period, or to the first
+    recorded payment row when the student has never paid.
+    """
+    if month < 1 or month > 12:
+        raise ValueError("Month must be between 1 and 12")
+
+    target = year * 12 + month - 1
+    period = Payment.year * 12 + Payment.month - 1
+    paid_for_period = exists().where(and_(
+        Payment.student_id == Student.id,
+        Payment.status == PaymentStatus.paid,
+        Payment.year == year,
+        Payment.month == month,
+    ))
+    last_paid = (
+        select(func.max(period))
+        .where(Payment.student_id == Student.id, Payment.status == PaymentStatus.paid, period < target)
+        .correlate(Student)
+        .scalar_subquery()
+    )
+    first_recorded = (
+        select(func.min(period))
+        .where(Payment.student_id == Student.id, period <= target)
+        .correlate(Student)
+        .scalar_subquery()
+    )
+    rows = (
+        db.query(Student.id, Student.name, Room.room_no, Room.price, last_paid, first_recorded)
+        .join(Room, Student.room_id == Room.id)
+        .filter(~paid_for_period)
+        .order_by(Room.room_no, Student.name)
+        .all()
+    )
+
+    defaulters = []
+    for student_id, name, room_no, price, last, first in rows:
+        if last is not None:
+            overdue = target - last
+        elif first is not None:
+            overdue = target - first + 1
+        else:
+            overdue = 1
+        defaulters.append(Defaulter(
+            student_id=student_id,
+            student_name=name,
+            room_no=room_no,
+            expected_amount=price,
+            last_paid_month=last % 12 + 1 if last is not None else None,
+            last_paid_year=last // 12 if last is not None else None,
+            months_overdue=overdue,
+        ))
+    return DefaultersReport(
+        month=month,
+        year=year,
+        count=len(defaulters),
+        total_expected=sum(d.expected_amount for d in defaulters),
+        defaulters=defaulters,
+    )
+
 def update_payment(payment_id: int, db: Session, amount: float | None = None, 
                   status: PaymentStatus | None = None, month: int | None = None, 
                   year: int | None = None, payment_method: PaymentMethod | None = None):
@@ -90,6 +214,7 @@ def update_payment(payment_id: int, db: Session, amount: float | None = None,
     
     db.commit()
     db.refresh(payment)
+    discard_cached_receipt(payment_id)
     return payment
 
 def get_payments_by_student(student_id: int, db: Session):
@@ -116,33 +241,65 @@ def delete_payment(payment_id: int, db: Session):
         raise ValueError(f"Payment with ID {payment_id} does not exist")
     db.delete(payment)
     db.commit()
+    discard_cached_receipt(payment_id)
     return {"message": "Payment deleted successfully", "deleted_payment": {"id": payment_id}}
 
-def get_all_payments_with_student_info(db: Session, month: int = None, year: int = None, status: PaymentStatus = None):
-    """Get all payments with student and room information, optionally filtered."""
-    query = db.query(Payment, Student.name, Room.room_no).join(
-        Student, Payment.student_id == Student.id
-    ).join(
-        Room, Payment.room_id == Room.id
-    )
-    
+@dataclass(slots=True)
+class PaymentListRow:
+    """One row of a payment list, in PaymentOut field order plus display names.
+
+    Built straight from projected columns, so large lists skip ORM identity
+    tracking and pydantic; routes encode these with orjson.
+    """
+    id: int
+    student_id: int
+    room_id: int
+    amount: float
+    status: PaymentStatus
+    date: datetime
+    month: int
+    year: int
+    transaction_id: str
+    payment_method: PaymentMethod
+    receipt_generated: bool
+    student_name: Optional[str] = None
+    room_no: Optional[str] = None
+
+PAYMENT_LIST_COLUMNS = (
+    Payment.id, Payment.student_id, Payment.room_id, Payment.amount, Payment.status, Payment.date,
+    Payment.month, Payment.year, Payment.transaction_id, Payment.payment_method, Payment.receipt_generated,
+)
+
+def list_payment_rows(db: Session, month: int = None, year: int = None, status: PaymentStatus = None,
+                      student_id: int = None, with_names: bool = True) -> list[PaymentListRow]:
+    """Payments as PaymentListRow tuples, optionally with student and room names.
+
+    A student's own list keeps payments whose room is gone (room_no is null),
+    as get_payments_by_student did.
+    """
+    if with_names:
+        query = db.query(*PAYMENT_LIST_COLUMNS, Student.name, Room.room_no).join(
+            Student, Payment.student_id == Student.id
+        ).join(
+            Room, Payment.room_id == Room.id, isouter=student_id is not None
+        )
+    else:
+        query = db.query(*PAYMENT_LIST_COLUMNS)
+
     if month:
         query = query.filter(Payment.month == month)
     if year:
         query = query.filter(Payment.year == year)
     if status:
         query = query.filter(Payment.status == status)
-    
-    results = query.all()
-    payments_with_info = []
-    
-    for payment, student_name, room_no in results:
-        payment_dict = PaymentOut.from_orm(payment).dict()
-        payment_dict["student_name"] = student_name
-        payment_dict["room_no"] = room_no
-        payments_with_info.append(payment_dict)
-    
-    return payments_with_info
+    if student_id is not None:
+        query = query.filter(Payment.student_id == student_id)
+
+    return [PaymentListRow(*row) for row in query.all()]
+
+def get_all_payments_with_student_info(db: Session, month: int = None, year: int = None, status: PaymentStatus = None):
+    """Get all payments with student and room information, optionally filtered."""
+    return list_payment_rows(db, month, year, status)
 
 def get_payment_stats(db: Session):
     """Get payment statistics for admin dashboard."""
@@ -166,6 +323,20 @@ def get_payment_stats(db: Session):
         "total_pending": total_pending
     }
 
+def submit_payment_for_verification(order_id: str, db: Session) -> Payment:
+    """Record a student's UPI payment against its order; it stays Pending until an admin verifies it."""
+    payment = db.query(Payment).filter_by(transaction_id=order_id).first()
+    if not payment:
+        raise ValueError("Order not found")
+
+    payment.status = PaymentStatus.pending
+    payment.payment_method = PaymentMethod.online
+    payment.date = datetime.utcnow()
+    announce_payment_event(db, payment.id, "submitted")
+    db.commit()
+    db.refresh(payment)
+    return payment
+
 def mark_payment_as_paid(payment_id: int, payment_method: PaymentMethod, db: Session):
     """Mark a payment as paid and generate receipt."""
     payment = db.query(Payment).filter_by(id=payment_id).first()
@@ -182,8 +353,173 @@ def mark_payment_as_paid(payment_id: int, payment_method: PaymentMethod, db: Ses
     
     db.commit()
     db.refresh(payment)
+    discard_cached_receipt(payment_id)
     return PaymentOut.from_orm(payment)
 
+def transition_pending_payments(action: ReviewAction, conditions: list, db: Session) -> list[int]:
+    """Move matching Pending payments to Paid (verify) or Failed (reject).
+
+    Issues one UPDATE guarded by status = Pending and returns the ids it
+    changed. The caller owns the transaction and must commit.
+    """
+    if action == ReviewAction.verify:
+        values = {"status": PaymentStatus.paid, "receipt_generated": True, "date": datetime.utcnow()}
+    else:
+        values = {"status": PaymentStatus.failed}
+    statement = (
+        update(Payment)
+        .where(Payment.status == PaymentStatus.pending, *conditions)
+        .values(**values)
+        .returning(*ROW_COLUMNS)
+    )
+    rows = [PaymentRow(*row) for row in db.execute(statement, execution_options={"synchronize_session": False})]
+
+    # Keep rollups, balances and change events in step within the caller's transaction
+    record_payment_changes(db, [(row._replace(status=PaymentStatus.pending), row) for row in rows])
+    return [row.id for row in rows]
+
+def bulk_review_payments(action: ReviewAction, db: Session, payment_ids: list[int] | None = None,
+                         month: int | None = None, year: int | None = None,
+                         payment_method: PaymentMethod | None = None) -> BulkReviewResult:
+    """Verify or reject many pending payments with one guarded UPDATE.
+
+    Only rows still in Pending status are transitioned, so concurrent reviews
+    of the same payment cannot both succeed. Generated dues (DUE_ transaction
+    ids) are bills, not submitted payments, and are never reviewed here.
+    Selecting by month/year reviews Online (submitted) payments unless
+    payment_method says otherwise.
+    """
+    if not payment_ids and (month is None or year is None):
+        raise ValueError("Provide payment_ids or both month and year")
+
+    conditions = [not_(Payment.transaction_id.like("DUE\\_%", escape="\\"))]
+    if payment_ids:
+        conditions.append(Payment.id.in_(payment_ids))
+    else:
+        payment_method = payment_method or PaymentMethod.online
+    if month is not None:
+        conditions.append(Payment.month == month)
+    if year is not None:
+        conditions.append(Payment.year == year)
+    if payment_method is not None:
+        conditions.append(Payment.payment_method == payment_method)
+
+    outcome = "verified" if action == ReviewAction.verify else "rejected"
+    try:
+        changed = transition_pending_payments(action, conditions, db)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    results = [BulkReviewOutcome(payment_id=pid, outcome=outcome) for pid in sorted(changed)]
+    if payment_ids:
+        leftover = set(payment_ids) - set(changed)
+        rows = db.query(Payment.id, Payment.status, Payment.transaction_id).filter(Payment.id.in_(leftover)).all() \
+            if leftover else []
+        statuses = {row.id: row.status for row in rows}
+        dues = {row.id for row in rows if (row.transaction_id or "").startswith("DUE_")}
+        for pid in sorted(leftover):
+            if pid not in statuses:
+                results.append(BulkReviewOutcome(payment_id=pid, outcome="not_found"))
+            elif pid in dues:
+                results.append(BulkReviewOutcome(
+                    payment_id=pid, outcome="skipped", detail="Generated due; record its payment with mark-paid"
+                ))
+            elif payment_method is not None and statuses[pid] == PaymentStatus.pending:
+                results.append(BulkReviewOutcome(
+                    payment_id=pid, outcome="skipped", detail=f"Payment method is not {payment_method.value}"
+                ))
+            else:
+                results.append(BulkReviewOutcome(
+                    payment_id=pid, outcome="skipped", detail=f"Payment is {statuses[pid].value}, not Pending"
+                ))
+    for pid in changed:
+        discard_cached_receipt(pid)
+    return BulkReviewResult(action=action, processed=len(changed), results=results)
+
+def bulk_set_payment_status(request: PaymentBulkStatusUpdate, db: Session) -> PaymentBulkStatusResult:
+    """Set the status of a student's payments (or of explicit ids) with one UPDATE.
+
+    Payments already in the target status are left alone. Derived tables and
+    change events are updated in the same transaction.
+    """
+    conditions = [Payment.status != request.status]
+    if request.student_id is None and not request.student_name and not request.payment_ids:
+        raise ValueError("Provide student_id, student_name or payment_ids")
+    if request.student_id is not None:
+        conditions.append(Payment.student_id == request.student_id)
+    if request.student_name:
+        student = db.query(Student.id).filter_by(name=request.student_name).first()
+        if student is None:
+            raise ValueError(f"Student {request.student_name} does not exist")
+        conditions.append(Payment.student_id == student.id)
+    if request.payment_ids:
+        conditions.append(Payment.id.in_(request.payment_ids))
+    if request.from_status is not None:
+        conditions.append(Payment.status == request.from_status)
+
+    try:
+        before = {
+            row.id: PaymentRow(*row)
+            for row in db.execute(select(*ROW_COLUMNS).where(*conditions).with_for_update())
+        }
+        changed = []
+        if before:
+            statement = (
+                update(Payment)
+                .where(Payment.id.in_(before), *conditions)
+                .values(status=request.status)
+                .returning(*ROW_COLUMNS)
+            )
+            changed = [PaymentRow(*row) for row in db.execute(statement, execution_options={"synchronize_session": False})]
+            record_payment_changes(db, [(before[row.id], row) for row in changed])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    for row in changed:
+        discard_cached_receipt(row.id)
+    return PaymentBulkStatusResult(
+        status=request.status, updated=len(changed), payment_ids=sorted(row.id for row in changed)
+    )
+
+# --------------------------
+# Pre-rendered receipt cache
+# --------------------------
+RECEIPT_CACHE_SIZE = 500
+_receipt_cache: "OrderedDict[int, bytes]" = OrderedDict()
+_receipt_lock = threading.Lock()
+
+def get_cached_receipt(payment_id: int) -> bytes | None:
+    with _receipt_lock:
+        pdf = _receipt_cache.get(payment_id)
+        if pdf is not None:
+            _receipt_cache.move_to_end(payment_id)
+        return pdf
+
+def discard_cached_receipt(payment_id: int) -> None:
+    with _receipt_lock:
+        _receipt_cache.pop(payment_id, None)
+
+def prerender_receipts(payment_ids: list[int]) -> None:
+    """Render receipts ahead of download; meant to run as a background task."""
+    db = Session()
+    try:
+        for payment_id in payment_ids:
+            try:
+                pdf = generate_payment_receipt(payment_id, db).getvalue()
+            except ValueError:
+                continue
+            with _receipt_lock:
+                _receipt_cache[payment_id] = pdf
+                _receipt_cache.move_to_end(payment_id)
+                while len(_receipt_cache) > RECEIPT_CACHE_SIZE:
+                    _receipt_cache.popitem(last=False)
+    finally:
+        db.close()
+
 def generate_payment_receipt(payment_id: int, db: Session):
     """Generate a professional PDF receipt for a payment."""
     payment = db.query(Payment).filter_by(id=payment_id).first()
@@ -432,34 +768,37 @@ def amount_to_words(amount):
     
     return result + " Only"
 
-def export_payments_to_csv(db: Session, month: int = None, year: int = None, status: PaymentStatus = None):
-    """Export payments data to CSV format."""
-    payments = get_all_payments_with_student_info(db, month, year, status)
-    
-    # Create CSV in memory
+CSV_HEADER = [
+    'Student ID', 'Student Name', 'Room Number', 'Month', 'Year',
+    'Amount', 'Transaction ID', 'Date', 'Status', 'Payment Method'
+]
+CSV_CHUNK_ROWS = 1000
+
+def iter_payments_csv(payments: list[PaymentListRow]):
+    """Yield the payments CSV in chunks so it can be streamed (and compressed) as it is written."""
     output = StringIO()
     writer = csv.writer(output)
-    
-    # Write header
-    writer.writerow([
-        'Student ID', 'Student Name', 'Room Number', 'Month', 'Year', 
-        'Amount', 'Transaction ID', 'Date', 'Status', 'Payment Method'
-    ])
-    
-    # Write data
-    for payment in payments:
+    writer.writerow(CSV_HEADER)
+    for index, payment in enumerate(payments, start=1):
         writer.writerow([
-            payment['student_id'],
-            payment['student_name'],
-            payment['room_no'],
-            payment['month'],
-            payment['year'],
-            payment['amount'],
-            payment['transaction_id'],
-            payment['date'].strftime('%Y-%m-%d %H:%M:%S'),
-            payment['status'],
-            payment['payment_method']
+            payment.student_id,
+            payment.student_name,
+            payment.room_no,
+            payment.month,
+            payment.year,
+            payment.amount,
+            payment.transaction_id,
+            payment.date.strftime('%Y-%m-%d %H:%M:%S'),
+            payment.status,
+            payment.payment_method
         ])
-    
-    output.seek(0)
-    return output.getvalue()
+        if index % CSV_CHUNK_ROWS == 0:
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate()
+    yield output.getvalue()
+
+def export_payments_to_csv(db: Session, month: int = None, year: int = None, status: PaymentStatus = None):
+    """Export payments data to CSV format."""
+    payments = get_all_payments_with_student_info(db, month, year, status)
+    return "".join(iter_payments_csv(payments))
@@ -0,0 +1,189 @@
+# services/reconciliation_services.py
+import csv
+import re
+from datetime import datetime, date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from database.db import Session
+from models.models import Payment
+from schemas.payments import PaymentMethod, PaymentStatus, ReviewAction
+from services.payment_services import transition_pending_payments, discard_cached_receipt
+
+# Column names accepted for each statement field (compared lower-cased)
+REFERENCE_COLUMNS = ("transaction_id", "reference", "ref", "ref no", "utr", "narration", "remarks", "description")
+AMOUNT_COLUMNS = ("amount", "credit", "credit amount", "deposit")
+DATE_COLUMNS = ("date", "txn date", "transaction date", "value date")
+
+DATE_FORMATS = ("%Y-%m-%d", "%d-%m-%Y", "%d/%m/%Y", "%Y/%m/%d", "%d-%b-%Y", "%d %b %Y")
+ORDER_ID_PATTERN = re.compile(r"order_[0-9a-f]{10}")
+
+# Ids per UPDATE statement, kept well below SQLite's bound-parameter limit
+TRANSITION_CHUNK_SIZE = 1000
+
+
+def _pick_column(header: List[str], names: Tuple[str, ...]) -> Optional[int]:
+    normalized = [h.strip().lower() for h in header]
+    for name in names:
+        if name in normalized:
+            return normalized.index(name)
+    return None
+
+
+def _parse_amount(raw: str) -> Optional[int]:
+    """Amount in paise, so hash keys are exact."""
+    cleaned = raw.replace(",", "").replace("₹", "").replace("Rs.", "").strip()
+    try:
+        return round(float(cleaned) * 100)
+    except ValueError:
+        return None
+
+
+def _parse_date(raw: str) -> Optional[date]:
+    raw = raw.strip()
+    try:
+        return datetime.fromisoformat(raw).date()
+    except ValueError:
+        pass
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(raw, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+class PendingPaymentIndex:
+    """Hash indexes over pending payments: by transaction id and by (amount, day).
+
+    Only online orders go into the (amount, day) index. Generated dues and cash
+    rows share amounts and dates across students, so a bank credit cannot tell
+    them apart. Rows without a date can still match by transaction id.
+    """
+
+    def __init__(self, rows: Iterable[Tuple[int, str, float, datetime, PaymentMethod]]):
+        self.by_transaction: Dict[str, int] = {}
+        self.by_amount_day: Dict[Tuple[int, int], List[int]] = {}
+        self.matched: set = set()
+        for payment_id, transaction_id, amount, paid_on, method in rows:
+            self.by_transaction[transaction_id] = payment_id
+            if paid_on is None:
+                continue
+            if method == PaymentMethod.online and not (transaction_id or "").startswith("DUE_"):
+                key = (round(amount * 100), paid_on.date().toordinal())
+                self.by_amount_day.setdefault(key, []).append(payment_id)
+
+    def match_reference(self, reference: str) -> Optional[int]:
+        candidates = [reference.strip()] + ORDER_ID_PATTERN.findall(reference)
+        for candidate in candidates:
+            payment_id = self.by_transaction.get(candidate)
+            if payment_id is not None and payment_id not in self.matched:
+                self.matched.add(payment_id)
+                return payment_id
+        return None
+
+    def match_amount(self, amount: int, on: date, window_days: int) -> Tuple[Optional[int], int]:
+        """(payment id, 1) for a unique match; (None, n) when the closest candidates are n > 1 or none."""
+        # Probe the same day first, then widen symmetrically so the closest date wins
+        day = on.toordinal()
+        for offset in range(window_days + 1):
+            candidates = [
+                payment_id
+                for probe in ((day,) if offset == 0 else (day - offset, day + offset))
+                for payment_id in self.by_amount_day.get((amount, probe), ())
+                if payment_id not in self.matched
+            ]
+            if len(candidates) == 1:
+                self.matched.add(candidates[0])
+                return candidates[0], 1
+            if candidates:
+                return None, len(candidates)  # Ambiguous: never guess between payments
+        return None, 0
+
+
+def reconcile_statement(lines: Iterable[str], db: Session, window_days: int = 3, dry_run: bool = False) -> dict:
+    """Match a bank/UPI statement CSV against pending payments in a single pass.
+
+    Rows are matched on the order id first and fall back to an exact amount
+    within `window_days` of the date of an online order, only when exactly one
+    order is closest; ambiguous rows are reported unmatched. Matched payments are marked paid
+    through the same guarded transition as admin verification, in one
+    transaction; everything else is returned in the unmatched report.
+    """
+    if window_days < 0:
+        raise ValueError("window_days cannot be negative")
+
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if not header:
+        raise ValueError("Statement is empty")
+    ref_col = _pick_column(header, REFERENCE_COLUMNS)
+    amount_col = _pick_column(header, AMOUNT_COLUMNS)
+    date_col = _pick_column(header, DATE_COLUMNS)
+    if amount_col is None or (ref_col is None and date_col is None):
+        raise ValueError("Statement needs an amount column and a reference or date column")
+
+    pending = (
+        db.query(Payment.id, Payment.transaction_id, Payment.amount, Payment.date, Payment.payment_method)
+        .filter(Payment.status == PaymentStatus.pending)
+        .all()
+    )
+    index = PendingPaymentIndex(pending)
+
+    matched: List[dict] = []
+    unmatched: List[dict] = []
+    total_lines = 0
+    width = max(c for c in (ref_col, amount_col, date_col) if c is not None) + 1
+    for line_no, row in enumerate(reader, start=2):
+        if not row:
+            continue
+        total_lines += 1
+        if len(row) < width:
+            unmatched.append({"line": line_no, "reason": "Malformed row", "row": row})
+            continue
+        reference = row[ref_col] if ref_col is not None else ""
+        amount = _parse_amount(row[amount_col])
+        on = _parse_date(row[date_col]) if date_col is not None else None
+        if amount is None or amount <= 0:
+            unmatched.append({"line": line_no, "reference": reference, "reason": "Not a credit amount"})
+            continue
+
+        payment_id, matched_by, candidates = None, None, 0
+        if reference:
+            payment_id, matched_by = index.match_reference(reference), "transaction_id"
+        if payment_id is None and on is not None:
+            (payment_id, candidates), matched_by = index.match_amount(amount, on, window_days), "amount_date"
+        if payment_id is None:
+            unmatched.append({
+                "line": line_no,
+                "reference": reference,
+                "amount": amount / 100,
+                "date": on.isoformat() if on else None,
+                "reason": f"Ambiguous: {candidates} pending online payments match amount and date"
+                if candidates > 1 else "No matching pending payment",
+            })
+            continue
+        matched.append({"line": line_no, "payment_id": payment_id, "matched_by": matched_by})
+
+    marked: List[int] = []
+    if not dry_run and matched:
+        ids = [m["payment_id"] for m in matched]
+        try:
+            for start in range(0, len(ids), TRANSITION_CHUNK_SIZE):
+                chunk = ids[start:start + TRANSITION_CHUNK_SIZE]
+                marked.extend(transition_pending_payments(ReviewAction.verify, [Payment.id.in_(chunk)], db))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        for payment_id in marked:
+            discard_cached_receipt(payment_id)
+
+    return {
+        "lines": total_lines,
+        "matched": len(matched),
+        "marked_paid": len(marked),
+        "unmatched_count": len(unmatched),
+        "dry_run": dry_run,
+        "matches": matched,
+        "unmatched": unmatched,
+    }
@@ -0,0 +1,196 @@
+# services/rollup_services.py
+"""Monthly payment rollups keyed by (year, month, status, payment_method, room_id).
+
+Kept current by `services.payment_changes`, which feeds every payment write
+into `apply_rollup_changes` inside the writing transaction. Rows are upserted
+on their `bucket` (the key as text), so two transactions creating the same
+bucket add up instead of one failing on the unique index.
+"""
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, func, inspect, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from database.db import Session, engine
+from models.models import Payment, PaymentMonthlyRollup
+from schemas.payments import PaymentMethod, PaymentStatus
+
+RollupKey = Tuple[int, int, Optional[PaymentStatus], PaymentMethod, Optional[int]]
+
+_KEY_FIELDS = ("year", "month", "status", "payment_method", "room_id")
+_rollups = PaymentMonthlyRollup.__table__
+
+
+def _member(enum_cls, value):
+    """Enum member for a value, name or member; attributes set from strings stay strings until reloaded."""
+    if value is None or isinstance(value, enum_cls):
+        return value
+    try:
+        return enum_cls(value)
+    except ValueError:
+        return enum_cls[value]
+
+
+def rollup_key(year, month, status, payment_method, room_id) -> RollupKey:
+    return (year, month, _member(PaymentStatus, status), _member(PaymentMethod, payment_method), room_id)
+
+
+def bucket_of(key: RollupKey) -> str:
+    year, month, status, payment_method, room_id = key
+    parts = (status.name if status else "", payment_method.name, "" if room_id is None else room_id)
+    return f"{year}-{month}|" + "|".join(str(part) for part in parts)
+
+
+def _rollup_rows(deltas: Dict[RollupKey, List[float]]) -> List[dict]:
+    return [
+        {**dict(zip(_KEY_FIELDS, key)), "bucket": bucket_of(key), "payment_count": count, "total_amount": amount}
+        for key, (count, amount) in deltas.items()
+        if count or amount
+    ]
+
+
+def apply_rollup_deltas(connection, deltas: Dict[RollupKey, List[float]]) -> None:
+    """Add [count, amount] deltas to the rollup rows, creating missing rows."""
+    rows = _rollup_rows(deltas)
+    if not rows:
+        return
+    dialect = postgresql if connection.dialect.name == "postgresql" else sqlite
+    statement = dialect.insert(_rollups)
+    connection.execute(
+        statement.on_conflict_do_update(
+            index_elements=["bucket"],
+            set_={
+                "payment_count": _rollups.c.payment_count + statement.excluded.payment_count,
+                "total_amount": _rollups.c.total_amount + statement.excluded.total_amount,
+            },
+        ),
+        rows,
+    )
+
+
+def add_rows(deltas: Dict[RollupKey, List[float]], rows: Iterable[tuple], sign: int = 1) -> None:
+    """Fold (year, month, status, payment_method, room_id, amount) rows into `deltas`."""
+    for year, month, status, payment_method, room_id, amount in rows:
+        entry = deltas[rollup_key(year, month, status, payment_method, room_id)]
+        entry[0] += sign
+        entry[1] += sign * (amount or 0)
+
+
+def new_deltas() -> Dict[RollupKey, List[float]]:
+    return defaultdict(lambda: [0, 0.0])
+
+
+def apply_rollup_changes(connection, changes) -> None:
+    """Move payments between rollup buckets for (before, after) PaymentRow pairs."""
+    deltas = new_deltas()
+    for before, after in changes:
+        if before is not None:
+            add_rows(deltas, [(before.year, before.month, before.status, before.payment_method,
+                               before.room_id, before.amount)], sign=-1)
+        if after is not None:
+            add_rows(deltas, [(after.year, after.month, after.status, after.payment_method,
+                               after.room_id, after.amount)])
+    apply_rollup_deltas(connection, deltas)
+
+
+def rebuild_payment_rollups(db: Session) -> int:
+    """Recompute every rollup row from the payments table; returns the row count."""
+    grouped = (
+        select(
+            Payment.year, Payment.month, Payment.status, Payment.payment_method, Payment.room_id,
+            func.count(Payment.id), func.coalesce(func.sum(Payment.amount), 0),
+        )
+        .group_by(Payment.year, Payment.month, Payment.status, Payment.payment_method, Payment.room_id)
+    )
+    try:
+        connection = db.connection()
+        connection.execute(delete(_rollups))
+        deltas = {rollup_key(*row[:5]): [row[5], row[6]] for row in connection.execute(grouped)}
+        rows = _rollup_rows(deltas)
+        if rows:
+            connection.execute(_rollups.insert(), rows)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return len(rows)
+
+
+def ensure_payment_rollups() -> None:
+    """Backfill the rollup on startup when it is empty but payments already exist."""
+    # The table only holds derived data, so one created before the bucket
+    # column existed is recreated (create_all never alters existing tables)
+    if "bucket" not in {column["name"] for column in inspect(engine).get_columns(_rollups.name)}:
+        _rollups.drop(engine)
+        _rollups.create(engine)
+    session = Session()
+    try:
+        has_rollups = session.query(PaymentMonthlyRollup.id).first() is not None
+        if not has_rollups and session.query(Payment.id).first() is not None:
+            rebuild_payment_rollups(session)
+    finally:
+        session.close()
+
+
+TIMESERIES_DIMENSIONS = {
+    "status": PaymentMonthlyRollup.status,
+    "payment_method": PaymentMonthlyRollup.payment_method,
+    "room_id": PaymentMonthlyRollup.room_id,
+}
+
+
+def payment_timeseries(db: Session, from_year: int, from_month: int, to_year: int, to_month: int,
+                       group_by: Optional[str] = None, status: Optional[PaymentStatus] = None,
+                       payment_method: Optional[PaymentMethod] = None, room_id: Optional[int] = None) -> dict:
+    """Monthly counts and amounts between two periods (inclusive), read from the rollup.
+
+    Every month in the range is present in the result, zero-filled when
+    nothing was recorded, so the cost depends on the number of months only.
+    """
+    for month in (from_month, to_month):
+        if month < 1 or month > 12:
+            raise ValueError("Month must be between 1 and 12")
+    start, end = from_year * 12 + from_month - 1, to_year * 12 + to_month - 1
+    if start > end:
+        raise ValueError("The start period must not be after the end period")
+    if group_by is not None and group_by not in TIMESERIES_DIMENSIONS:
+        raise ValueError(f"group_by must be one of: {', '.join(TIMESERIES_DIMENSIONS)}")
+
+    period = PaymentMonthlyRollup.year * 12 + PaymentMonthlyRollup.month - 1
+    columns = [PaymentMonthlyRollup.year, PaymentMonthlyRollup.month]
+    if group_by:
+        columns.append(TIMESERIES_DIMENSIONS[group_by])
+    query = (
+        db.query(*columns, func.sum(PaymentMonthlyRollup.payment_count), func.sum(PaymentMonthlyRollup.total_amount))
+        .filter(PaymentMonthlyRollup.year.between(from_year, to_year), period.between(start, end))
+    )
+    if status is not None:
+        query = query.filter(PaymentMonthlyRollup.status == status)
+    if payment_method is not None:
+        query = query.filter(PaymentMonthlyRollup.payment_method == payment_method)
+    if room_id is not None:
+        query = query.filter(PaymentMonthlyRollup.room_id == room_id)
+
+    series = [
+        {"year": p // 12, "month": p % 12 + 1, "count": 0, "amount": 0.0, **({"breakdown": {}} if group_by else {})}
+        for p in range(start, end + 1)
+    ]
+    for row in query.group_by(*columns).all():
+        count, amount = row[-2], row[-1]
+        if not count:
+            continue
+        point = series[row[0] * 12 + row[1] - 1 - start]
+        point["count"] += count
+        point["amount"] += amount
+        if group_by:
+            value = row[2]
+            label = value.value if isinstance(value, (PaymentStatus, PaymentMethod)) else str(value)
+            point["breakdown"][label] = {"count": count, "amount": amount}
+
+    return {
+        "from": f"{from_year}-{from_month:02d}",
+        "to": f"{to_year}-{to_month:02d}",
+        "group_by": group_by,
+        "series": series,
+    }
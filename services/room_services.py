@@ -1,5 +1,15 @@
-from models.models import Room
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import bindparam, func, or_, update
+from models.models import Room, Student
 from database.db import Session
+from schemas.room import (
+    AllocationRequest, AllocationResult, AllocationAssignment, AllocationSkipped,
+    RoomBulkUpdate, RoomBulkUpdateResult, RoomOut, UpdateRoom
+)
+from schemas.payments import PaymentStatus
+
+_students = Student.__table__
 
 def create_room(room_no: str, price: float, db: Session, capacity: int = 4) -> Room:
     existing = db.query(Room).filter_by(room_no=room_no).first()
@@ -18,3 +28,256 @@ def delete_room(room_no: str, db: Session):
     db.delete(room)
     db.commit()
     return {"message": "Room deleted successfully", "deleted_room": {"room_no": room_no}}
+
+def update_room(room_no: str, update: UpdateRoom, db: Session) -> Room:
+    room = db.query(Room).filter_by(room_no=room_no).first()
+    if not room:
+        raise ValueError("Room not found")
+    if update.new_room_no:
+        room.room_no = update.new_room_no
+    if update.price is not None:
+        room.price = update.price
+    if update.capacity is not None:
+        room.capacity = update.capacity
+    db.commit()
+    db.refresh(room)
+    return room
+
+def list_rooms_with_totals(db: Session) -> List[Room]:
+    """Every room with total_payments/payment_status recomputed from its paid payments."""
+    rooms = db.query(Room).all()
+    for room in rooms:
+        total_paid = sum(payment.amount for payment in room.payments if payment.status == PaymentStatus.paid)
+        room.total_payments = total_paid
+        room.payment_status = PaymentStatus.paid if total_paid >= room.price else PaymentStatus.pending
+    return rooms
+
+def room_floor(room_no: str) -> str:
+    """Floor prefix of a room number ("G3" -> "G", "204" -> "2")."""
+    if room_no.isdigit() and len(room_no) > 2:
+        return room_no[:-2]
+    return room_no[:1].upper()
+
+def floor_clause(floor: str):
+    """SQL counterpart of room_floor(): numeric floors are three-digit room numbers."""
+    floor = floor.upper()
+    if floor.isdigit():
+        return Room.room_no.like(f"{floor}__")
+    return Room.room_no.like(f"{floor}%")
+
+def bulk_update_rooms(request: RoomBulkUpdate, db: Session) -> RoomBulkUpdateResult:
+    """Apply one patch to every room matching the filter with a single UPDATE."""
+    room_filter, patch = request.filter, request.patch
+    if patch.price is not None and patch.price_change_percent is not None:
+        raise ValueError("Provide either price or price_change_percent, not both")
+
+    values = {}
+    if patch.price is not None:
+        if patch.price < 0:
+            raise ValueError("Price cannot be negative")
+        values["price"] = patch.price
+    if patch.price_change_percent is not None:
+        if patch.price_change_percent <= -100:
+            raise ValueError("price_change_percent must be greater than -100")
+        values["price"] = Room.price * (1 + patch.price_change_percent / 100)
+    if patch.capacity is not None:
+        if patch.capacity < 1:
+            raise ValueError("Capacity must be at least 1")
+        values["capacity"] = patch.capacity
+    if not values:
+        raise ValueError("Patch must set price, capacity or price_change_percent")
+
+    conditions = []
+    if room_filter.room_nos is not None:
+        conditions.append(Room.room_no.in_(room_filter.room_nos))
+    if room_filter.floor:
+        conditions.append(floor_clause(room_filter.floor))
+    if room_filter.min_price is not None:
+        conditions.append(Room.price >= room_filter.min_price)
+    if room_filter.max_price is not None:
+        conditions.append(Room.price <= room_filter.max_price)
+
+    try:
+        if patch.capacity is not None:
+            # Refuse to shrink a room below the number of students already in it
+            overfull = (
+                db.query(Room.room_no)
+                .join(Student, Student.room_id == Room.id)
+                .filter(*conditions)
+                .group_by(Room.id, Room.room_no)
+                .having(func.count(Student.id) > patch.capacity)
+                .all()
+            )
+            if overfull:
+                rooms = ", ".join(room_no for (room_no,) in overfull)
+                raise ValueError(f"Capacity {patch.capacity} is below current occupancy of room(s) {rooms}")
+
+        statement = update(Room).where(*conditions).values(**values).returning(Room)
+        rooms = db.execute(statement, execution_options={"synchronize_session": False}).scalars().all()
+        result = RoomBulkUpdateResult(updated=len(rooms), rooms=[RoomOut.from_orm(room) for room in rooms])
+        db.commit()
+        return result
+    except Exception:
+        db.rollback()
+        raise
+
+class FreeCapacityIndex:
+    """In-memory index of rooms bucketed by their remaining free beds.
+
+    Lookups walk the buckets from the smallest sufficient free count upwards,
+    so partially filled rooms are topped up before empty ones are opened.
+    """
+
+    def __init__(self, rooms: List[Tuple[int, str, int, float]], occupancy: Dict[int, int]):
+        self.buckets: Dict[int, Dict[int, Tuple[str, str, float]]] = defaultdict(dict)
+        self.max_free = 0
+        for room_id, room_no, capacity, price in rooms:
+            free = capacity - occupancy.get(room_id, 0)
+            if free <= 0:
+                continue
+            self.buckets[free][room_id] = (room_no, room_floor(room_no), price)
+            self.max_free = max(self.max_free, free)
+
+    def take(self, size: int, floor: Optional[str] = None,
+             min_price: Optional[float] = None, max_price: Optional[float] = None) -> Optional[Tuple[int, str]]:
+        """Reserve `size` beds in one room matching the constraints."""
+        for free in range(size, self.max_free + 1):
+            bucket = self.buckets.get(free)
+            if not bucket:
+                continue
+            for room_id, info in bucket.items():
+                room_no, floor_prefix, price = info
+                if floor and floor_prefix != floor.upper():
+                    continue
+                if min_price is not None and price < min_price:
+                    continue
+                if max_price is not None and price > max_price:
+                    continue
+                del bucket[room_id]
+                if free - size > 0:
+                    self.buckets[free - size][room_id] = info
+                return room_id, room_no
+        return None
+
+def allocate_rooms(request: AllocationRequest, db: Session) -> AllocationResult:
+    """Assign rooms to a batch of unassigned students in a single transaction."""
+    if request.min_price is not None and request.max_price is not None and request.min_price > request.max_price:
+        raise ValueError("min_price cannot be greater than max_price")
+
+    prefs = {s.student_id: s for s in request.students}
+    group_ids = {sid for group in request.groups for sid in group}
+
+    query = db.query(Student.id, Student.name, Student.room_id)
+    if prefs:
+        query = query.filter(Student.id.in_(set(prefs) | group_ids))
+    elif group_ids:
+        query = query.filter(or_(Student.room_id.is_(None), Student.id.in_(group_ids)))
+    else:
+        query = query.filter(Student.room_id.is_(None))
+    students = {sid: (name, room_id) for sid, name, room_id in query.order_by(Student.id).all()}
+
+    candidates = list(dict.fromkeys([*prefs, *sorted(group_ids)])) if prefs else sorted(set(students) | group_ids)
+    skipped: List[AllocationSkipped] = []
+    eligible = []
+    for sid in candidates:
+        if sid not in students:
+            skipped.append(AllocationSkipped(student_id=sid, reason="Student does not exist"))
+        elif students[sid][1] is not None:
+            skipped.append(AllocationSkipped(student_id=sid, reason="Student is already assigned to a room"))
+        else:
+            eligible.append(sid)
+    eligible_set = set(eligible)
+
+    # Build allocation units: keep-together groups (largest first), then singles
+    grouped = set()
+    units: List[List[int]] = []
+    for group in sorted(request.groups, key=len, reverse=True):
+        members = [sid for sid in dict.fromkeys(group) if sid in eligible_set and sid not in grouped]
+        if members:
+            grouped.update(members)
+            units.append(members)
+    units.extend([sid] for sid in eligible if sid not in grouped)
+
+    rooms = db.query(Room.id, Room.room_no, Room.capacity, Room.price).with_for_update().all()
+    occupancy = dict(
+        db.query(Student.room_id, func.count(Student.id))
+        .filter(Student.room_id.isnot(None))
+        .group_by(Student.room_id)
+        .all()
+    )
+    index = FreeCapacityIndex(rooms, occupancy)
+
+    assigned: List[AllocationAssignment] = []
+    mappings = []
+    for members in units:
+        min_price, max_price = request.min_price, request.max_price
+        floors = set()
+        for sid in members:
+            pref = prefs.get(sid)
+            if pref is None:
+                continue
+            if pref.floor:
+                floors.add(pref.floor.upper())
+            if pref.min_price is not None:
+                min_price = max(pref.min_price, min_price) if min_price is not None else pref.min_price
+            if pref.max_price is not None:
+                max_price = min(pref.max_price, max_price) if max_price is not None else pref.max_price
+        if len(floors) > 1:
+            reason = f"Group members ask for different floors ({', '.join(sorted(floors))})"
+            skipped.extend(AllocationSkipped(student_id=sid, reason=reason) for sid in members)
+            continue
+        floor = floors.pop() if floors else request.floor
+
+        slot = index.take(len(members), floor, min_price, max_price)
+        if slot is None:
+            reason = f"No room with {len(members)} free bed(s) matches the constraints"
+            skipped.extend(AllocationSkipped(student_id=sid, reason=reason) for sid in members)
+            continue
+        room_id, room_no = slot
+        for sid in members:
+            mappings.append({"sid": sid, "rid": room_id})
+            assigned.append(AllocationAssignment(student_id=sid, student_name=students[sid][0], room_no=room_no))
+
+    if request.dry_run:
+        db.rollback()
+    else:
+        try:
+            if mappings:
+                # Only place students that are still unassigned; someone else may have placed them meanwhile
+                db.execute(
+                    update(_students)
+                    .where(_students.c.id == bindparam("sid"), _students.c.room_id.is_(None))
+                    .values(room_id=bindparam("rid")),
+                    mappings,
+                )
+                wanted = {m["sid"]: m["rid"] for m in mappings}
+                placed = {
+                    sid for sid, room_id in db.query(Student.id, Student.room_id).filter(Student.id.in_(wanted))
+                    if room_id == wanted[sid]
+                }
+                # The room rows are locked, but single-student assignments don't take that lock
+                overfull = (
+                    db.query(Room.room_no)
+                    .join(Student, Student.room_id == Room.id)
+                    .filter(Room.id.in_(set(wanted.values())))
+                    .group_by(Room.id, Room.room_no, Room.capacity)
+                    .having(func.count(Student.id) > Room.capacity)
+                    .all()
+                )
+                if overfull:
+                    raise ValueError(
+                        f"Room(s) {', '.join(r.room_no for r in overfull)} filled up during allocation, please retry"
+                    )
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        if mappings and len(placed) < len(mappings):
+            reason = "Student was assigned to a room meanwhile"
+            skipped.extend(
+                AllocationSkipped(student_id=a.student_id, reason=reason)
+                for a in assigned if a.student_id not in placed
+            )
+            assigned = [a for a in assigned if a.student_id in placed]
+
+    return AllocationResult(assigned=assigned, unassigned=skipped, dry_run=request.dry_run)
@@ -5,6 +5,7 @@ from typing import Optional
 from fastapi import HTTPException
 from schemas.student import StudentResponse, StudentUpdate
 from models.models import User
+from services.attendance_services import drop_student_attendance
 
 def create_student(name: str, db: Session, room_no: Optional[str]=None) -> Student:
     try:
@@ -39,6 +40,8 @@ def delete_student(student_id: int, db: Session):
         if user:
             db.delete(user)
 
+        # SQLite doesn't enforce the cascade, and the meal counters need adjusting either way
+        drop_student_attendance(db, student_id)
         db.delete(student)
         db.commit()
         return {"message": "Student and associated user account deleted successfully", "deleted_student": {"id": student_id}}
@@ -82,19 +85,23 @@ def update_student(student_id: int, student_update: StudentUpdate, db: Session)
         db.commit()
         db.refresh(student)
 
-        # Build response
-        room_no = student.room.room_no if student.room else "Unassigned"
-        user = db.query(User).filter_by(student_id=student.id).first()
-        active = user.is_active if user else False
-        phone_no = user.phone_no if user else None
-
-        return StudentResponse(
-            id=student.id,
-            name=student.name,
-            room_no=room_no,
-            active=active,
-            phone_no=phone_no
-        ).dict()  # Ensure it returns a dictionary for proper serialization
+        return student_response(student, db).dict()  # Ensure it returns a dictionary for proper serialization
     except Exception as e:
         db.rollback()
-        raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def student_response(student: Student, db: Session) -> StudentResponse:
+    """StudentResponse with the room number and the linked user's status and phone."""
+    room_no = student.room.room_no if student.room else "Unassigned"
+    user = db.query(User).filter_by(student_id=student.id).first()
+    active = user.is_active if user else False
+    phone_no = user.phone_no if user else None
+    return StudentResponse(id=student.id, name=student.name, room_no=room_no, active=active, phone_no=phone_no)
+
+def find_students(db: Session, name: Optional[str] = None) -> list[StudentResponse]:
+    """All students, or those whose name contains `name` (case-insensitive)."""
+    students = db.query(Student)
+    if name:
+        students = students.filter(Student.name.ilike(f"%{name}%"))
+    return [student_response(student, db) for student in students.all()]
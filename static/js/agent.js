@@ -123,7 +123,7 @@ function renderConfirmationRequest(confirmData, summary) {
     
     const confirmBtn = document.createElement("button");
     confirmBtn.className = "btn danger";
-    confirmBtn.textContent = "Confirm Delete";
+    confirmBtn.textContent = confirmData.bulk_id ? "Confirm" : "Confirm Delete";
     confirmBtn.addEventListener("click", () => handleConfirmation(confirmData, true));
     
     const cancelBtn = document.createElement("button");
@@ -144,6 +144,17 @@ function handleConfirmation(confirmData, confirmed) {
     if (confirmEl) {
         confirmEl.remove();
     }
+
+    // Bulk changes are held server-side; answer with their id
+    if (confirmData.bulk_id) {
+        const reply = `${confirmed ? "confirm" : "cancel"} bulk ${confirmData.bulk_id}`;
+        if (socket && socket.readyState === WebSocket.OPEN) {
+            sendViaWS(reply);
+        } else {
+            sendViaREST(reply);
+        }
+        return;
+    }
     
     if (confirmed) {
         // Show confirmation message
@@ -255,20 +266,29 @@ async function sendViaREST(query) {
 
 function connectWS() {
     if (socket && socket.readyState === WebSocket.OPEN) return;
-    const wsUrl = BASE_URL.replace("http", "ws") + "/api/agent/ws/agent";
+    const token = authManager.token;
+    if (!token) {
+        appendMessage("error", "Log in to use the agent.");
+        return;
+    }
+    const wsUrl = BASE_URL.replace("http", "ws") + `/api/agent/ws/agent?token=${encodeURIComponent(token)}`;
     socket = new WebSocket(wsUrl);
 
     socket.onopen = () => appendMessage("system", "WS connected");
     socket.onmessage = (event) => {
+        let msg;
         try {
-            const msg = JSON.parse(event.data);
-            if (msg.summary) appendMessage("agent", msg.summary, msg.data);
-            if (msg.error) appendMessage("error", msg.error);
+            msg = JSON.parse(event.data);
         } catch (e) {
             appendMessage("agent", event.data);
+            return;
         }
+        handleStreamFrame(msg);
+    };
+    socket.onclose = () => {
+        finishStream();
+        appendMessage("system", "WS disconnected");
     };
-    socket.onclose = () => appendMessage("system", "WS disconnected");
     socket.onerror = () => appendMessage("error", "WS error");
 }
 
@@ -281,6 +301,95 @@ function sendViaWS(query) {
     socket.send(JSON.stringify({ query, session_id: sessionId }));
 }
 
+// ---------- Streamed turns ----------
+// The server sends node_start / token / tool_result / node_end frames while a
+// turn runs, then one final ({summary, data}), cancelled or error frame.
+let stream = null;
+
+function startStream() {
+    const item = document.createElement("div");
+    item.className = "msg agent streaming";
+    const progress = document.createElement("div");
+    progress.className = "stream-progress";
+    const text = document.createElement("div");
+    text.className = "stream-text";
+    const stopBtn = document.createElement("button");
+    stopBtn.className = "btn";
+    stopBtn.textContent = "Stop";
+    stopBtn.addEventListener("click", () => {
+        if (socket && socket.readyState === WebSocket.OPEN) {
+            socket.send(JSON.stringify({ type: "stop" }));
+        }
+        stopBtn.disabled = true;
+    });
+    item.append(progress, text, stopBtn);
+    messagesEl().appendChild(item);
+    stream = { item, progress, text, stopBtn, nodes: {}, tokensNode: null };
+    return stream;
+}
+
+function streamLine(className, content) {
+    const line = document.createElement("div");
+    line.className = className;
+    line.textContent = content;
+    stream.progress.appendChild(line);
+    return line;
+}
+
+function finishStream() {
+    if (!stream) return;
+    stream.item.classList.remove("streaming");
+    stream.stopBtn.remove();
+    stream.text.remove();
+    if (!stream.progress.childElementCount) stream.item.remove();
+    stream = null;
+}
+
+function handleStreamFrame(msg) {
+    const container = messagesEl();
+    switch (msg.type) {
+        case "node_start":
+            if (!stream) startStream();
+            stream.nodes[msg.node] = streamLine("stream-node", `⏳ ${msg.node}…`);
+            break;
+        case "node_end":
+            if (stream && stream.nodes[msg.node]) {
+                stream.nodes[msg.node].textContent = `✓ ${msg.node} (${Math.round(msg.ms)} ms)`;
+            }
+            break;
+        case "token":
+            if (!stream) startStream();
+            // New text block whenever another node starts talking
+            if (stream.tokensNode !== msg.node) {
+                stream.text.textContent = "";
+                stream.tokensNode = msg.node;
+            }
+            stream.text.textContent += msg.text;
+            break;
+        case "tool_result":
+            if (!stream) startStream();
+            streamLine("stream-tool", `🔧 ${msg.tool}: ${(msg.result && msg.result.summary) || "done"}`);
+            break;
+        case "final":
+            finishStream();
+            appendMessage("agent", msg.summary, msg.data);
+            break;
+        case "cancelled":
+            finishStream();
+            appendMessage("system", "Stopped.");
+            break;
+        case "error":
+            finishStream();
+            appendMessage("error", msg.error);
+            break;
+        default:
+            // Frames from servers that do not stream: a bare {summary, data}
+            if (msg.summary) appendMessage("agent", msg.summary, msg.data);
+            if (msg.error) appendMessage("error", msg.error);
+    }
+    container.scrollTop = container.scrollHeight;
+}
+
 // Basic styles injection if not present (optional)
 function ensureStyles() {
     const styleId = "agent-styles";
@@ -297,6 +406,8 @@ function ensureStyles() {
     .msg.agent { background: #f1f8e9; }
     .msg.system { background: #ede7f6; font-style: italic; }
     .msg.error { background: #ffebee; color: #b71c1c; }
+    .msg.streaming .stream-text { white-space: pre-wrap; opacity: 0.8; font-size: 0.9em; margin: 4px 0; }
+    .stream-node, .stream-tool { font-size: 0.85em; color: #555; }
     `;
     document.head.appendChild(style);
 }
@@ -23,3 +23,16 @@ export async function api(path, { method = "GET", body, headers } = {}) {
 }
 
 export const money = (n) => `₹${Number(n || 0).toFixed(2)}`;
+
+// Live payment changes over Server-Sent Events (admin only). EventSource
+// reconnects by itself and resumes from the last event id it received.
+export function subscribePaymentEvents(onEvent, onReset) {
+  const token = authManager.token;
+  if (!token || typeof EventSource === "undefined") return null;
+  const source = new EventSource(`${BASE_URL}/payments/events?token=${encodeURIComponent(token)}`);
+  source.onmessage = (e) => {
+    try { onEvent(JSON.parse(e.data)); } catch (err) { console.error("Bad payment event:", err); }
+  };
+  source.addEventListener("reset", () => onReset && onReset());
+  return source;
+}
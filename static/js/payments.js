@@ -1,10 +1,13 @@
-import { api, money } from "./api.js";
+import { api, money, subscribePaymentEvents } from "./api.js";
 
 const STATUS_OPTIONS = ["Pending", "Paid", "Failed"];
 const PAYMENT_METHODS = ["Cash", "Online"];
 let currentlyEditing = null;
 let currentUserRole = null;
 let currentStudentId = null;
+let renderedItems = [];
+let renderedStudentId = null;
+let renderPending = false;
 
 export function initPayments() {
   const container = document.getElementById("panel-payments");
@@ -50,10 +53,13 @@ export function initPayments() {
         console.log("Sending payment data:", paymentData);
 
         // Now add the payment using the student ID
+        const idempotencyKey = idempotencyKeyFor("payments", paymentData);
         const result = await api(`/payments`, { 
           method: "POST", 
-          body: paymentData
+          body: paymentData,
+          headers: { "Idempotency-Key": idempotencyKey }
         });
+        releaseIdempotencyKey("payments", paymentData);
         
         console.log("Payment created successfully:", result);
         formAddPayment.reset();
@@ -88,6 +94,7 @@ export function initPayments() {
   loadPayments();
   if (currentUserRole === 'admin') {
     loadPaymentStats();
+    subscribePaymentEvents(applyPaymentEvent, () => loadPayments());
   }
   if (currentUserRole === 'student') {
     loadStudentPayments();
@@ -346,9 +353,44 @@ async function loadPaymentsByStudent(studentId) {
   }
 }
 
+// Patch the rendered list from a pushed change instead of refetching it
+function applyPaymentEvent({ type, payment }) {
+  const index = renderedItems.findIndex(p => p.id === payment.id);
+  if (type === "deleted") {
+    if (index === -1) return;
+    renderedItems.splice(index, 1);
+  } else if (index !== -1) {
+    renderedItems[index] = { ...renderedItems[index], ...payment };
+  } else if (matchesCurrentView(payment)) {
+    const known = renderedItems.find(p => p.student_id === payment.student_id);
+    renderedItems.push({ ...payment, student_name: known?.student_name, room_no: known?.room_no });
+  } else {
+    return;
+  }
+
+  if (renderPending) return;
+  renderPending = true;
+  requestAnimationFrame(() => {
+    renderPending = false;
+    if (!currentlyEditing) renderPayments(renderedItems, renderedStudentId);
+  });
+}
+
+function matchesCurrentView(payment) {
+  if (renderedStudentId) return payment.student_id === renderedStudentId;
+  const month = document.getElementById("filter-month")?.value;
+  const year = document.getElementById("filter-year")?.value;
+  const status = document.getElementById("filter-status")?.value;
+  return (!month || payment.month === Number(month))
+    && (!year || payment.year === Number(year))
+    && (!status || payment.status === status);
+}
+
   function renderPayments(items, studentId = null) {
   const paymentsList = document.getElementById("payments-list");
   if (!paymentsList) return;
+  renderedItems = items ? [...items] : [];
+  renderedStudentId = studentId;
 
     paymentsList.innerHTML = "";
   
@@ -592,13 +634,32 @@ function getCurrentStudentId() {
   return null;
 }
 
+// Idempotency keys: a retry of the same request reuses its key so the server
+// replays the first response instead of creating a duplicate payment
+const idempotencyKeys = new Map();
+
+function idempotencyKeyFor(scope, payload) {
+  const id = `${scope}:${JSON.stringify(payload)}`;
+  if (!idempotencyKeys.has(id)) idempotencyKeys.set(id, crypto.randomUUID());
+  return idempotencyKeys.get(id);
+}
+
+function releaseIdempotencyKey(scope, payload) {
+  idempotencyKeys.delete(`${scope}:${JSON.stringify(payload)}`);
+}
+
 // UPI Payment functions
 async function createOrder(student_id, amount, month, year) {
+  const payload = { student_id, amount, month, year };
   const res = await fetch('/payments/create-order', {
     method: 'POST',
-    headers: { 'Content-Type': 'application/json' },
-    body: JSON.stringify({ student_id, amount, month, year })
+    headers: {
+      'Content-Type': 'application/json',
+      'Idempotency-Key': idempotencyKeyFor('create-order', payload)
+    },
+    body: JSON.stringify(payload)
   });
+  if (res.ok) releaseIdempotencyKey('create-order', payload);
   return res.json();
 }
 
@@ -10,6 +10,7 @@ const filterMinPrice = document.getElementById("filter-min-price");
 const filterMaxPrice = document.getElementById("filter-max-price");
 const applyRoomFiltersBtn = document.getElementById("apply-room-filters");
 const clearRoomFiltersBtn = document.getElementById("clear-room-filters");
+const formBulkRoomUpdate = document.getElementById("form-bulk-room-update");
 
 let cachedRooms = [];
 let currentlyEditingRoom = null; // Track the currently edited room
@@ -44,6 +45,21 @@ function filterRooms(list) {
   });
 }
 
+// Client-side mirror of the PUT /rooms/bulk filter (see floor_clause in services/room_services.py)
+function roomMatchesBulkFilter(room, filter) {
+  if (filter.floor) {
+    const floor = filter.floor.toUpperCase();
+    const roomNo = String(room.room_no).toUpperCase();
+    const onFloor = /^\d+$/.test(floor)
+      ? roomNo.length === floor.length + 2 && roomNo.startsWith(floor)
+      : roomNo.startsWith(floor);
+    if (!onFloor) return false;
+  }
+  if (filter.min_price !== undefined && room.price < filter.min_price) return false;
+  if (filter.max_price !== undefined && room.price > filter.max_price) return false;
+  return true;
+}
+
 function hasActiveFilters() {
   const unpaidOnly = !!(filterUnpaidOnly && filterUnpaidOnly.checked);
   const minPrice = filterMinPrice ? parseFloat(filterMinPrice.value) : NaN;
@@ -127,6 +143,44 @@ export function initRooms() {
       updateClearButtonVisibility();
     });
   }
+  if (formBulkRoomUpdate) {
+    formBulkRoomUpdate.addEventListener("submit", async e => {
+      e.preventDefault();
+      // Bulk update uses the same price band as the list filters
+      const filter = {};
+      const floor = document.getElementById("bulk-floor").value.trim();
+      const minPrice = filterMinPrice ? parseFloat(filterMinPrice.value) : NaN;
+      const maxPrice = filterMaxPrice ? parseFloat(filterMaxPrice.value) : NaN;
+      if (floor) filter.floor = floor;
+      if (!Number.isNaN(minPrice)) filter.min_price = minPrice;
+      if (!Number.isNaN(maxPrice)) filter.max_price = maxPrice;
+
+      const patch = {};
+      const price = parseFloat(document.getElementById("bulk-price").value);
+      const percent = parseFloat(document.getElementById("bulk-percent").value);
+      if (!Number.isNaN(price)) patch.price = price;
+      else if (!Number.isNaN(percent)) patch.price_change_percent = percent;
+      else return alert("Enter a new price or a % change.");
+
+      // An empty filter matches every room, so it has to be asked for explicitly
+      if (Object.keys(filter).length === 0 && !document.getElementById("bulk-all-rooms").checked) {
+        return alert("Enter a floor or a price band, or tick \"All rooms\".");
+      }
+      const matching = cachedRooms.filter(r => roomMatchesBulkFilter(r, filter)).length;
+      const change = patch.price !== undefined ? `set the price to ${patch.price}` : `change the price by ${patch.price_change_percent}%`;
+      if (!confirm(`This will ${change} on ${matching} room(s). Continue?`)) return;
+
+      try {
+        const result = await api("/rooms/bulk", { method: "PUT", body: { filter, patch } });
+        formBulkRoomUpdate.reset();
+        alert(`Updated ${result.updated} room(s).`);
+        await loadRooms();
+      } catch (err) {
+        alert(err.message);
+      }
+    });
+  }
+
   formAddRoom.addEventListener("submit", async e => {
     e.preventDefault();
     const room_no = document.getElementById("room_no").value.trim();
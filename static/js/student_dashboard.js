@@ -6,6 +6,7 @@ class StudentDashboard {
     constructor() {
         this.studentData = null;
         this.paymentsData = null;
+        this.balance = null;
     }
 
     async init() {
@@ -43,6 +44,9 @@ class StudentDashboard {
     async loadPaymentData() {
         try {
             this.paymentsData = await api("/payments/");
+            if (this.studentData) {
+                this.balance = await api(`/students/${this.studentData.id}/balance`);
+            }
         } catch (error) {
             console.error("Error loading payment data:", error);
             this.showError("Failed to load payment information");
@@ -79,7 +83,7 @@ class StudentDashboard {
         const loadingEl = document.getElementById("payment-summary-loading");
         const statsEl = document.getElementById("payment-stats");
 
-        if (!this.paymentsData || this.paymentsData.length === 0) {
+        if (!this.balance || (this.balance.paid_count === 0 && this.balance.pending_count === 0)) {
             loadingEl.textContent = "No payment records found.";
             return;
         }
@@ -88,27 +92,11 @@ class StudentDashboard {
         loadingEl.style.display = "none";
         statsEl.style.display = "grid";
 
-        // Calculate summary
-        let totalPaid = 0;
-        let totalPending = 0;
-        let paidCount = 0;
-        let pendingCount = 0;
-
-        this.paymentsData.forEach(payment => {
-            if (payment.status === "Paid") {
-                totalPaid += payment.amount;
-                paidCount++;
-            } else if (payment.status === "Pending") {
-                totalPending += payment.amount;
-                pendingCount++;
-            }
-        });
-
-        // Update display
-        document.getElementById("total-paid").textContent = `₹${totalPaid.toLocaleString()}`;
-        document.getElementById("total-pending").textContent = `₹${totalPending.toLocaleString()}`;
-        document.getElementById("paid-count").textContent = paidCount;
-        document.getElementById("pending-count").textContent = pendingCount;
+        // Totals come from the server-maintained balance
+        document.getElementById("total-paid").textContent = `₹${this.balance.total_paid.toLocaleString()}`;
+        document.getElementById("total-pending").textContent = `₹${this.balance.pending.toLocaleString()}`;
+        document.getElementById("paid-count").textContent = this.balance.paid_count;
+        document.getElementById("pending-count").textContent = this.balance.pending_count;
     }
 
     displayPaymentHistory() {
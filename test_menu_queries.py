@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Query-count regression test for menu detail and feedback listing.
+
+Opening a menu or listing its feedbacks must cost the same number of SQL
+statements whether the menu has 3 feedbacks or 400 (no per-row student loads).
+Runs against a throwaway SQLite database: python test_menu_queries.py
+"""
+import os
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime
+
+_db_file = os.path.join(tempfile.mkdtemp(), "menu_queries.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{_db_file}"
+
+from sqlalchemy import event, insert
+
+from database.db import Session, engine, init_db
+from models.models import Feedback, Menu, MealType, Student
+from schemas.menu import FeedbackUpdate
+from services.menu_services import get_feedbacks, get_menu_by_id, update_feedback
+
+
+@contextmanager
+def count_queries():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def seed_menu(db, feedback_count: int) -> int:
+    now = datetime.now()
+    menu = Menu(date=now, meal_type=MealType.dinner, items="Rice, Dal")
+    db.add(menu)
+    db.flush()
+    first = db.query(Student).count() + 1
+    db.execute(insert(Student), [{"name": f"Student {first + i}"} for i in range(feedback_count)])
+    student_ids = [sid for (sid,) in db.query(Student.id).order_by(Student.id.desc()).limit(feedback_count)]
+    db.execute(insert(Feedback), [
+        {
+            "student_id": sid, "menu_id": menu.id, "date": now, "meal_type": MealType.dinner,
+            "rating": sid % 5 + 1, "comment": None,
+        }
+        for sid in student_ids
+    ])
+    db.commit()
+    return menu.id
+
+
+def queries_for(fn) -> int:
+    db = Session()
+    try:
+        with count_queries() as statements:
+            fn(db)
+        return len(statements)
+    finally:
+        db.close()
+
+
+def test_menu_detail_query_count_is_constant():
+    init_db()
+    db = Session()
+    small, large = seed_menu(db, 3), seed_menu(db, 400)
+    db.close()
+
+    small_queries = queries_for(lambda db: get_menu_by_id(small, db))
+    large_queries = queries_for(lambda db: get_menu_by_id(large, db))
+    assert small_queries == large_queries <= 2, (small_queries, large_queries)
+
+    detail = Session()
+    menu = get_menu_by_id(large, detail)
+    detail.close()
+    assert len(menu.feedbacks) == 400
+    assert all(f.student_name.startswith("Student ") for f in menu.feedbacks)
+
+
+def test_feedback_listing_query_count_is_constant():
+    init_db()
+    db = Session()
+    small, large = seed_menu(db, 3), seed_menu(db, 400)
+    db.close()
+
+    small_queries = queries_for(lambda db: get_feedbacks(db, menu_id=small))
+    large_queries = queries_for(lambda db: get_feedbacks(db, menu_id=large))
+    all_queries = queries_for(lambda db: get_feedbacks(db))
+    assert small_queries == large_queries == all_queries == 1, (small_queries, large_queries, all_queries)
+
+
+def test_update_feedback_does_not_lazy_load_student():
+    init_db()
+    db = Session()
+    menu_id = seed_menu(db, 1)
+    feedback_id = db.query(Feedback.id).filter_by(menu_id=menu_id).scalar()
+    db.close()
+
+    db = Session()
+    try:
+        with count_queries() as statements:
+            updated = update_feedback(feedback_id, FeedbackUpdate(rating=5), db)
+        student_loads = [s for s in statements if "FROM students" in s]
+        assert not student_loads, student_loads  # the name comes from the joined reload
+        assert updated.rating == 5 and updated.student_name
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    test_menu_detail_query_count_is_constant()
+    test_feedback_listing_query_count_is_constant()
+    test_update_feedback_does_not_lazy_load_student()
+    print("Menu query-count tests passed")
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Plan runner tests: dependency skips, cycles, references and original-format order.
+
+A step whose dependency failed, is unknown, or sits on a cycle is skipped
+without running; the rest of the plan still runs. Plans without ids or
+depends_on keep the original strictly sequential behaviour.
+Needs no database: python test_plan_runner.py
+"""
+import asyncio
+
+from agent.plan_runner import normalize_plan, run_plan
+
+
+def run(todo, outcomes=None, delays=None):
+    """Run a plan with a fake executor; returns (results by id, ids in the order they started)."""
+    outcomes, delays, started = outcomes or {}, delays or {}, []
+
+    async def execute(step, parameters):
+        started.append(step.id)
+        await asyncio.sleep(delays.get(step.id, 0))
+        if outcomes.get(step.id) == "raise":
+            raise RuntimeError(f"{step.id} broke")
+        status = outcomes.get(step.id, "completed")
+        return {"status": status, "result": {"data": [{"name": f"from {step.id}"}]}, "parameters": parameters}
+
+    results = asyncio.run(run_plan(normalize_plan(todo), execute))
+    return {r["id"]: r for r in results}, started
+
+
+def test_failed_dependency_skips_dependents_only():
+    results, started = run([
+        {"id": "a", "action": "first"},
+        {"id": "b", "action": "second", "depends_on": ["a"]},
+        {"id": "c", "action": "third", "depends_on": ["b"]},
+        {"id": "d", "action": "independent"},
+    ], outcomes={"a": "raise"})
+    assert results["a"]["status"] == "failed" and results["a"]["error"] == "a broke"
+    assert (results["b"]["status"], results["b"]["error"]) == ("skipped", "Dependency a did not complete")
+    assert results["c"]["status"] == "skipped"
+    assert results["d"]["status"] == "completed"
+    assert sorted(started) == ["a", "d"]
+
+
+def test_cycles_and_unknown_dependencies_are_skipped():
+    results, started = run([
+        {"id": "a", "action": "x", "depends_on": ["b"]},
+        {"id": "b", "action": "y", "depends_on": ["a"]},
+        {"id": "c", "action": "behind the cycle", "depends_on": ["a"]},
+        {"id": "d", "action": "missing", "depends_on": ["nope"]},
+        {"id": "e", "action": "free"},
+    ])
+    assert [results[i]["error"] for i in "abc"] == ["Dependency cycle"] * 3
+    assert results["d"]["error"] == "Unknown dependency nope"
+    assert results["e"]["status"] == "completed"
+    assert started == ["e"]
+
+
+def test_references_resolve_and_add_dependencies():
+    results, _ = run([
+        {"id": "s1", "action": "lookup"},
+        {"id": "s2", "action": "use", "parameters": {"student_name": "$s1.data.0.name"}},
+    ], delays={"s1": 0.01})
+    assert results["s2"]["depends_on"] == ["s1"]
+    assert results["s2"]["parameters"] == {"student_name": "from s1"}
+
+
+def test_original_format_runs_in_order_past_failures():
+    results, started = run(["one", "two", "three"], outcomes={"s1": "failed"}, delays={"s1": 0.02})
+    assert started == ["s1", "s2", "s3"]
+    assert [results[i]["status"] for i in ("s1", "s2", "s3")] == ["failed", "completed", "completed"]
+    assert results["s3"]["timing"]["start_ms"] >= results["s1"]["timing"]["start_ms"] + results["s1"]["timing"]["duration_ms"]
+
+
+if __name__ == "__main__":
+    test_failed_dependency_skips_dependents_only()
+    test_cycles_and_unknown_dependencies_are_skipped()
+    test_references_resolve_and_add_dependencies()
+    test_original_format_runs_in_order_past_failures()
+    print("Plan runner tests passed")
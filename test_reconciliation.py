@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Statement reconciliation tests.
+
+An order id in the narration always wins. Without one, a credit matches on
+amount only when exactly one pending online order is closest in date; a tie is
+reported as ambiguous and nothing is marked paid. Each test uses its own
+amount so pending payments from other tests never match.
+Runs against a throwaway SQLite database: python test_reconciliation.py
+"""
+import os
+import tempfile
+from datetime import date, datetime, timedelta
+
+_db_file = os.path.join(tempfile.mkdtemp(), "reconciliation.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{_db_file}"
+
+from database.db import Session, init_db
+from models.models import Payment, Room, Student
+from schemas.payments import PaymentMethod, PaymentStatus
+from services.reconciliation_services import PendingPaymentIndex, reconcile_statement
+
+DAY = datetime(2025, 3, 10, 12, 0)
+
+
+def pending_orders(db, amount, days, method=PaymentMethod.online):
+    """One pending order of `amount` per offset in `days` (relative to DAY); returns their ids."""
+    room = Room(room_no=f"R{amount}", capacity=len(days), price=amount)
+    db.add(room)
+    db.flush()
+    payments = []
+    for offset in days:
+        student = Student(name=f"Payer {amount} {offset}", room_id=room.id)
+        db.add(student)
+        db.flush()
+        payments.append(Payment(
+            student_id=student.id, room_id=room.id, amount=amount, status=PaymentStatus.pending,
+            month=DAY.month, year=DAY.year, transaction_id=f"order_{amount:06d}{len(payments):04d}",
+            payment_method=method, date=DAY + timedelta(days=offset),
+        ))
+    db.add_all(payments)
+    db.commit()
+    return [payment.id for payment in payments]
+
+
+def statement(*rows):
+    return ["Date,Narration,Amount", *(",".join(row) for row in rows)]
+
+
+def status_of(db, payment_ids):
+    db.expire_all()
+    return [db.get(Payment, payment_id).status for payment_id in payment_ids]
+
+
+def test_tied_orders_are_reported_ambiguous():
+    init_db()
+    db = Session()
+    try:
+        ids = pending_orders(db, 1111, [0, 0])
+        report = reconcile_statement(statement((DAY.date().isoformat(), "UPI credit", "1111.00")), db)
+        assert report["matched"] == report["marked_paid"] == 0
+        assert report["unmatched"][0]["reason"] == "Ambiguous: 2 pending online payments match amount and date"
+        assert status_of(db, ids) == [PaymentStatus.pending] * 2
+    finally:
+        db.close()
+
+
+def test_closest_date_wins_over_a_farther_tie():
+    init_db()
+    db = Session()
+    try:
+        near, far_before, far_after = pending_orders(db, 2222, [1, -2, 2])
+        report = reconcile_statement(statement((DAY.date().isoformat(), "UPI credit", "2222.00")), db, window_days=3)
+        assert [(m["payment_id"], m["matched_by"]) for m in report["matches"]] == [(near, "amount_date")]
+        assert status_of(db, [near, far_before, far_after]) == [
+            PaymentStatus.paid, PaymentStatus.pending, PaymentStatus.pending
+        ]
+    finally:
+        db.close()
+
+
+def test_cash_rows_never_match_on_amount_and_order_ids_always_do():
+    init_db()
+    db = Session()
+    try:
+        cash = pending_orders(db, 3333, [0], method=PaymentMethod.cash)
+        online = pending_orders(db, 4444, [0, 0])
+        day = DAY.date().isoformat()
+        report = reconcile_statement(statement(
+            (day, "Cash deposit", "3333.00"),
+            (day, "UPI/order_0044440001/ref", "4444.00"),
+        ), db, dry_run=True)
+        assert [(m["payment_id"], m["matched_by"]) for m in report["matches"]] == [(online[1], "transaction_id")]
+        assert report["unmatched"][0]["reason"] == "No matching pending payment"
+        assert status_of(db, cash + online) == [PaymentStatus.pending] * 3  # dry run
+    finally:
+        db.close()
+
+
+def test_rows_without_a_date_only_match_by_reference():
+    index = PendingPaymentIndex([
+        (1, "order_a", 50.0, None, PaymentMethod.online),
+        (2, "order_b", 50.0, DAY, PaymentMethod.online),
+    ])
+    assert index.match_amount(5000, DAY.date(), 0) == (2, 1)
+    assert index.match_reference("order_a") == 1
+    assert index.match_amount(5000, date(2025, 3, 10), 5) == (None, 0)
+
+
+if __name__ == "__main__":
+    test_tied_orders_are_reported_ambiguous()
+    test_closest_date_wins_over_a_farther_tie()
+    test_cash_rows_never_match_on_amount_and_order_ids_always_do()
+    test_rows_without_a_date_only_match_by_reference()
+    print("Reconciliation tests passed")
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Batch room allocation tests.
+
+Keep-together groups land in one room, students already placed are skipped,
+groups asking for different floors are skipped, and a student placed by
+someone else while the batch was planned is reported instead of moved.
+Each test uses its own floor so the rooms never overlap.
+Runs against a throwaway SQLite database: python test_room_allocation.py
+"""
+import os
+import tempfile
+
+_db_file = os.path.join(tempfile.mkdtemp(), "room_allocation.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{_db_file}"
+
+from pydantic import ValidationError
+
+from database.db import Session, init_db
+from models.models import Room, Student
+from schemas.room import AllocationRequest, RoomBulkFilter
+import services.room_services as room_services
+from services.room_services import allocate_rooms
+
+
+def seed(db, rooms, student_count):
+    """Rooms as (room_no, capacity, price); returns the ids of new unassigned students."""
+    db.add_all(Room(room_no=room_no, capacity=capacity, price=price) for room_no, capacity, price in rooms)
+    students = [Student(name=f"Allocation student {i}") for i in range(student_count)]
+    db.add_all(students)
+    db.commit()
+    return [student.id for student in students]
+
+
+def room_of(db, student_id):
+    db.expire_all()
+    room_id = db.get(Student, student_id).room_id
+    return db.get(Room, room_id).room_no if room_id else None
+
+
+def test_group_shares_a_room_and_singles_fill_the_rest():
+    init_db()
+    db = Session()
+    try:
+        a, b, c, d = seed(db, [("X1", 2, 100), ("X2", 3, 200)], 4)
+        request = AllocationRequest(students=[{"student_id": sid} for sid in (a, b, c, d)], groups=[[a, b, c]], floor="X")
+        result = allocate_rooms(request, db)
+
+        assert not result.unassigned, result.unassigned
+        assert {r.student_id: r.room_no for r in result.assigned} == {a: "X2", b: "X2", c: "X2", d: "X1"}
+        assert [room_of(db, sid) for sid in (a, b, c, d)] == ["X2", "X2", "X2", "X1"]
+    finally:
+        db.close()
+
+
+def test_assigned_students_and_dry_runs_are_left_alone():
+    init_db()
+    db = Session()
+    try:
+        placed, fresh = seed(db, [("Y1", 4, 100)], 2)
+        allocate_rooms(AllocationRequest(students=[{"student_id": placed}], floor="Y"), db)
+
+        request = AllocationRequest(students=[{"student_id": placed}, {"student_id": fresh}], floor="Y", dry_run=True)
+        result = allocate_rooms(request, db)
+        assert [r.student_id for r in result.assigned] == [fresh]
+        assert [(s.student_id, s.reason) for s in result.unassigned] == [(placed, "Student is already assigned to a room")]
+        assert room_of(db, fresh) is None  # dry run wrote nothing
+    finally:
+        db.close()
+
+
+def test_group_with_conflicting_floors_is_skipped():
+    init_db()
+    db = Session()
+    try:
+        a, b = seed(db, [("W1", 4, 100), ("V1", 4, 100)], 2)
+        request = AllocationRequest(
+            students=[{"student_id": a, "floor": "W"}, {"student_id": b, "floor": "v"}],
+            groups=[[a, b]],
+        )
+        result = allocate_rooms(request, db)
+        assert not result.assigned
+        assert {s.student_id for s in result.unassigned} == {a, b}
+        assert all("different floors" in s.reason for s in result.unassigned)
+        assert room_of(db, a) is None and room_of(db, b) is None
+    finally:
+        db.close()
+
+
+def test_student_placed_meanwhile_is_reported_not_moved():
+    init_db()
+    db = Session()
+    try:
+        raced, other = seed(db, [("U1", 4, 100), ("T1", 4, 100)], 2)
+        elsewhere = db.query(Room.id).filter_by(room_no="T1").scalar()
+        take = room_services.FreeCapacityIndex.take
+
+        def take_after_concurrent_assignment(self, *args, **kwargs):
+            concurrent = Session()
+            concurrent.query(Student).filter_by(id=raced).update({"room_id": elsewhere})
+            concurrent.commit()
+            concurrent.close()
+            room_services.FreeCapacityIndex.take = take
+            return take(self, *args, **kwargs)
+
+        room_services.FreeCapacityIndex.take = take_after_concurrent_assignment
+        try:
+            request = AllocationRequest(students=[{"student_id": raced}, {"student_id": other}], floor="U")
+            result = allocate_rooms(request, db)
+        finally:
+            room_services.FreeCapacityIndex.take = take
+
+        assert [r.student_id for r in result.assigned] == [other]
+        assert [(s.student_id, s.reason) for s in result.unassigned] == [
+            (raced, "Student was assigned to a room meanwhile")
+        ]
+        assert room_of(db, raced) == "T1" and room_of(db, other) == "U1"
+    finally:
+        db.close()
+
+
+def test_floor_must_be_a_letter_or_a_number():
+    for floor in ("G", "2", "12"):
+        AllocationRequest(floor=floor)
+    for floor in ("%", "_", "G%", "1_", ""):
+        for schema in (AllocationRequest, RoomBulkFilter):
+            try:
+                schema(floor=floor)
+            except ValidationError:
+                continue
+            raise AssertionError(f"{schema.__name__} accepted floor {floor!r}")
+
+
+if __name__ == "__main__":
+    test_group_shares_a_room_and_singles_fill_the_rest()
+    test_assigned_students_and_dry_runs_are_left_alone()
+    test_group_with_conflicting_floors_is_skipped()
+    test_student_placed_meanwhile_is_reported_not_moved()
+    test_floor_must_be_a_letter_or_a_number()
+    print("Room allocation tests passed")
@@ -1,5 +1,5 @@
 #utils/auth.py
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
@@ -26,6 +26,16 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
 
 
 def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    return _user_from_token(token, db)
+
+
+def get_stream_user(token: str = Query(..., description="Access token; EventSource cannot send headers"),
+                    db: Session = Depends(get_db)):
+    """Authenticate long-lived streams (SSE) that pass the token in the query string."""
+    return _user_from_token(token, db)
+
+
+def _user_from_token(token: str, db: Session):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
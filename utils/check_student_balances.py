@@ -0,0 +1,26 @@
+# utils/check_student_balances.py
+import sys
+from database.db import Session
+from services.balance_services import check_balance_drift
+
+def check_balances(fix: bool = False) -> int:
+    session = Session()
+    try:
+        drift = check_balance_drift(session, fix=fix)
+    finally:
+        session.close()
+
+    for entry in drift:
+        print(f"Student {entry['student_id']}: {entry['field']} stored={entry['stored']} expected={entry['expected']}")
+    if not drift:
+        print("Student balances match payments.")
+    elif fix:
+        print(f"Rebuilt balances after {len(drift)} drifting field(s).")
+    else:
+        print(f"Found {len(drift)} drifting field(s); rerun with --fix to rebuild.")
+    return len(drift)
+
+if __name__ == "__main__":
+    fix = "--fix" in sys.argv[1:]
+    drifted = check_balances(fix=fix)
+    sys.exit(1 if drifted and not fix else 0)
@@ -0,0 +1,200 @@
+# utils/compression.py
+"""Negotiated gzip/brotli response compression.
+
+Small bodies (below `minimum_size`), responses that already carry a
+Content-Encoding, and media that is compressed already (PDF receipts, PNG QR
+codes, other images/archives) pass through untouched. Server-Sent Events are
+never buffered. Streaming responses such as the CSV export are compressed
+chunk by chunk. Byte counters are kept for the /metrics/compression endpoint.
+"""
+import threading
+import zlib
+from typing import Dict, Optional
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+MINIMUM_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # much faster than the default 11 at a small cost in ratio
+
+# Content types that are already compressed or must not be buffered
+SKIP_PREFIXES = ("image/", "video/", "audio/", "font/woff")
+SKIP_TYPES = {
+    "application/pdf", "application/zip", "application/gzip", "application/x-gzip",
+    "application/octet-stream", "text/event-stream",
+}
+
+_stats_lock = threading.Lock()
+_stats: Dict[str, int] = {
+    "responses_compressed": 0,
+    "responses_skipped": 0,
+    "bytes_in": 0,
+    "bytes_out": 0,
+}
+
+
+def _record(encoding: Optional[str], bytes_in: int = 0, bytes_out: int = 0) -> None:
+    with _stats_lock:
+        if encoding is None:
+            _stats["responses_skipped"] += 1
+            return
+        _stats["responses_compressed"] += 1
+        _stats[f"responses_{encoding}"] = _stats.get(f"responses_{encoding}", 0) + 1
+        _stats["bytes_in"] += bytes_in
+        _stats["bytes_out"] += bytes_out
+
+
+def compression_stats() -> Dict[str, int]:
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["bytes_saved"] = stats["bytes_in"] - stats["bytes_out"]
+    return stats
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick "br" or "gzip" from an Accept-Encoding header, honouring q-values."""
+    offered = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        offered[name.strip()] = quality
+    candidates = ["br", "gzip"] if brotli is not None else ["gzip"]
+    best, best_q = None, 0.0
+    for encoding in candidates:
+        quality = offered.get(encoding, offered.get("*", 0.0))
+        if quality > best_q:
+            best, best_q = encoding, quality
+    return best
+
+
+def _should_skip(headers: Headers) -> bool:
+    if "content-encoding" in headers:
+        return True
+    content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+    return content_type in SKIP_TYPES or content_type.startswith(SKIP_PREFIXES)
+
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        if encoding == "br":
+            self._engine = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._engine = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # wbits 31: gzip container
+        self.encoding = encoding
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._engine.process(data) + self._engine.flush()
+        return self._engine.compress(data) + self._engine.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._engine.finish()
+        return self._engine.flush()
+
+
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp, minimum_size: int = MINIMUM_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await _CompressedResponse(self.app, encoding, self.minimum_size)(scope, receive, send)
+
+
+class _CompressedResponse:
+    """Per-request state: decides on the first body chunk whether to compress."""
+
+    def __init__(self, app: ASGIApp, encoding: str, minimum_size: int):
+        self.app = app
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.start: Optional[Message] = None
+        self.mode: Optional[str] = None  # "passthrough", "buffered" or "streaming"
+        self.compressor: Optional[_Compressor] = None
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.send = send
+        await self.app(scope, receive, self.wrapped_send)
+
+    async def wrapped_send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.start = message
+            headers = Headers(raw=message["headers"])
+            if _should_skip(headers) or message["status"] in (204, 304):
+                self.mode = "passthrough"
+                _record(None)
+                await self.send(message)
+            return
+
+        if message["type"] != "http.response.body" or self.mode == "passthrough":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.mode is None:
+            if not more_body:
+                # Whole body in one message: compress only if it is worth it
+                if len(body) < self.minimum_size:
+                    self.mode = "passthrough"
+                    _record(None)
+                    await self.send(self.start)
+                    await self.send(message)
+                    return
+                compressor = _Compressor(self.encoding)
+                compressed = compressor.compress(body) + compressor.finish()
+                headers = self._compressed_headers()
+                headers["Content-Length"] = str(len(compressed))
+                _record(self.encoding, len(body), len(compressed))
+                await self.send(self.start)
+                await self.send({"type": "http.response.body", "body": compressed})
+                return
+            # Streaming response: compress each chunk as it arrives
+            self.mode = "streaming"
+            self.compressor = _Compressor(self.encoding)
+            headers = self._compressed_headers()
+            if "content-length" in headers:
+                del headers["Content-Length"]
+            await self.send(self.start)
+
+        chunk = self.compressor.compress(body) if body else b""
+        if not more_body:
+            chunk += self.compressor.finish()
+        self.bytes_in += len(body)
+        self.bytes_out += len(chunk)
+        if chunk or not more_body:
+            await self.send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+        if not more_body:
+            _record(self.encoding, self.bytes_in, self.bytes_out)
+
+    def _compressed_headers(self) -> MutableHeaders:
+        headers = MutableHeaders(raw=self.start["headers"])
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        if "etag" in headers and not headers["etag"].startswith("W/"):
+            # The representation changed, so a strong validator must be weakened
+            headers["ETag"] = "W/" + headers["etag"]
+        return headers
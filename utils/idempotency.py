@@ -0,0 +1,154 @@
+# utils/idempotency.py
+"""Idempotency-Key support for endpoints that create payments.
+
+The first request carrying a key claims a row in `idempotency_keys`, runs the
+handler and stores the JSON response. Retries with the same key get the stored
+response back without running the handler again. A small in-process LRU sits
+in front of the table so hot retries never touch the database.
+
+A claim whose handler never finished (the process died mid-request) blocks
+retries with 409 only for CLAIM_LEASE. After that, a retry with the same
+request takes the key over and runs the handler again.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Callable, Optional, Tuple
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy.exc import IntegrityError
+
+from database.db import Session
+from models.models import IdempotencyKey
+
+KEY_TTL = timedelta(hours=24)
+CLAIM_LEASE = timedelta(minutes=5)
+MAX_KEY_LENGTH = 255
+LRU_SIZE = 1024
+PURGE_INTERVAL = timedelta(hours=1)
+
+# key -> (expires_at, request_hash, status_code, body)
+_lru: "OrderedDict[str, Tuple[datetime, str, int, Any]]" = OrderedDict()
+_lock = threading.Lock()
+_last_purge = datetime.min
+
+
+def _fingerprint(payload: Any) -> str:
+    encoded = json.dumps(jsonable_encoder(payload), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+def _remember(key: str, entry: Tuple[datetime, str, int, Any]) -> None:
+    with _lock:
+        _lru[key] = entry
+        _lru.move_to_end(key)
+        while len(_lru) > LRU_SIZE:
+            _lru.popitem(last=False)
+
+
+def _lookup(key: str, db: Session) -> Optional[Tuple[datetime, str, Optional[int], Any]]:
+    now = datetime.utcnow()
+    with _lock:
+        entry = _lru.get(key)
+        if entry is not None:
+            if entry[0] > now:
+                _lru.move_to_end(key)
+                return entry
+            del _lru[key]
+
+    row = db.query(IdempotencyKey).filter_by(key=key).first()
+    if row is None:
+        return None
+    if row.expires_at <= now:
+        db.delete(row)
+        db.commit()
+        return None
+    body = json.loads(row.response_body) if row.response_body is not None else None
+    entry = (row.expires_at, row.request_hash, row.status_code, body)
+    if row.status_code is not None:
+        _remember(key, entry)
+    return entry
+
+
+def _replay(entry, fingerprint: str) -> JSONResponse:
+    _, request_hash, status_code, body = entry
+    if request_hash != fingerprint:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+    if status_code is None:
+        raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still being processed")
+    return JSONResponse(content=body, status_code=status_code, headers={"Idempotent-Replayed": "true"})
+
+
+def _take_over_stale_claim(key: str, fingerprint: str, db: Session) -> bool:
+    """Re-claim an unfinished key whose lease ran out; only one of several racing retries wins."""
+    now = datetime.utcnow()
+    taken = db.query(IdempotencyKey).filter(
+        IdempotencyKey.key == key,
+        IdempotencyKey.status_code.is_(None),
+        IdempotencyKey.request_hash == fingerprint,
+        IdempotencyKey.created_at <= now - CLAIM_LEASE,
+    ).update({"created_at": now, "expires_at": now + KEY_TTL}, synchronize_session=False)
+    db.commit()
+    return bool(taken)
+
+
+def purge_expired_keys(db: Session) -> int:
+    """Delete expired keys from the table; returns the number removed."""
+    removed = db.query(IdempotencyKey).filter(IdempotencyKey.expires_at <= datetime.utcnow()).delete()
+    db.commit()
+    return removed
+
+
+def run_idempotent(key: Optional[str], scope: str, payload: Any, handler: Callable[[], Any],
+                   db: Session, status_code: int = 200) -> Any:
+    """Run `handler` at most once per (scope, key) and replay its response afterwards."""
+    global _last_purge
+    if not key:
+        return handler()
+    if len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key must be at most {MAX_KEY_LENGTH} characters")
+
+    full_key = f"{scope}:{key}"
+    fingerprint = _fingerprint(payload)
+    entry = _lookup(full_key, db)
+    if entry is None:
+        # Claim the key before doing any work so concurrent duplicates are rejected
+        now = datetime.utcnow()
+        db.add(IdempotencyKey(key=full_key, request_hash=fingerprint, created_at=now, expires_at=now + KEY_TTL))
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            entry = _lookup(full_key, db)
+            if entry is None:
+                raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still being processed")
+    if entry is not None:
+        stale = entry[2] is None and entry[1] == fingerprint and _take_over_stale_claim(full_key, fingerprint, db)
+        if not stale:
+            return _replay(entry, fingerprint)
+    now = datetime.utcnow()
+
+    try:
+        result = handler()
+    except Exception:
+        # Failed attempts are not recorded, so the client may retry with the same key
+        db.rollback()
+        db.query(IdempotencyKey).filter_by(key=full_key).delete()
+        db.commit()
+        raise
+
+    body = jsonable_encoder(result)
+    db.query(IdempotencyKey).filter_by(key=full_key).update(
+        {"status_code": status_code, "response_body": json.dumps(body)}
+    )
+    db.commit()
+    _remember(full_key, (now + KEY_TTL, fingerprint, status_code, body))
+
+    if now - _last_purge > PURGE_INTERVAL:
+        _last_purge = now
+        purge_expired_keys(db)
+    return result
@@ -0,0 +1,14 @@
+# utils/rebuild_menu_rating_stats.py
+from database.db import Session
+from services.menu_stats_services import rebuild_menu_rating_stats
+
+def rebuild_stats():
+    session = Session()
+    try:
+        rows = rebuild_menu_rating_stats(session)
+    finally:
+        session.close()
+    print(f"Rebuilt menu rating stats: {rows} menu(s)")
+
+if __name__ == "__main__":
+    rebuild_stats()
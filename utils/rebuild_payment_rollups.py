@@ -0,0 +1,14 @@
+# utils/rebuild_payment_rollups.py
+from database.db import Session
+from services.rollup_services import rebuild_payment_rollups
+
+def rebuild_rollups():
+    session = Session()
+    try:
+        rows = rebuild_payment_rollups(session)
+    finally:
+        session.close()
+    print(f"Rebuilt payment rollups: {rows} row(s)")
+
+if __name__ == "__main__":
+    rebuild_rollups()
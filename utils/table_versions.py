@@ -0,0 +1,91 @@
+# utils/table_versions.py
+"""Per-table version counters used to build ETags for read-mostly endpoints.
+
+Counters live in process memory and are bumped whenever a session commits
+changes to a table, so they are only valid for the single-worker deployment
+(`python app.py`). A random epoch is mixed into every ETag so tags issued by a
+previous process never match after a restart.
+"""
+import hashlib
+import threading
+import uuid
+from collections import defaultdict
+from typing import Dict, Optional
+
+from fastapi import Request, Response
+from sqlalchemy import event
+from database.db import Session
+
+_EPOCH = uuid.uuid4().hex[:8]
+_versions: Dict[str, int] = defaultdict(int)
+_lock = threading.Lock()
+
+_PENDING_KEY = "changed_tables"
+
+
+def bump(*tables: str) -> None:
+    """Mark tables as changed so ETags derived from them are invalidated."""
+    with _lock:
+        for table in tables:
+            _versions[table] += 1
+
+
+def table_version(table: str) -> int:
+    return _versions[table]
+
+
+def make_etag(*tables: str, vary: str = "") -> str:
+    """Strong ETag from the current versions of `tables` plus request-specific parts."""
+    with _lock:
+        versions = ".".join(f"{table}{_versions[table]}" for table in tables)
+    digest = hashlib.sha1(f"{versions}|{vary}".encode()).hexdigest()[:16]
+    return f'"{_EPOCH}-{digest}"'
+
+
+def not_modified(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """Return a 304 response if the client already holds `etag`, else tag `response`."""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        # Weak comparison: compressed responses carry the W/ form of the tag
+        candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if etag in candidates or "*" in candidates:
+            return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
+
+
+# --------------------------
+# Session hooks: collect changed tables on flush, bump them on commit
+# --------------------------
+def _pending(session) -> set:
+    return session.info.setdefault(_PENDING_KEY, set())
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_flushed_tables(session, flush_context):
+    pending = _pending(session)
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        table = getattr(obj, "__tablename__", None)
+        if table:
+            pending.add(table)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_bulk_tables(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, "table", None)
+        if table is not None:
+            _pending(orm_execute_state.session).add(table.name)
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_committed_tables(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        bump(*pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_tables(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -1,4 +1,5 @@
 # utils/update_room_prices.py
+from sqlalchemy import case, update
 from database.db import Session
 from models.models import Room
 
@@ -23,17 +24,21 @@ def update_room_prices():
         "401": 5500, "402": 5500, "403": 5500, "404": 5500, "405": 5500
     }
 
-    updated_count = 0
-    for room_no, price in room_prices.items():
-        room = session.query(Room).filter_by(room_no=room_no).first()
-        if room:
-            room.price = price
-            updated_count += 1
-            print(f"Updated {room_no} with price ₹{price}")
+    # One UPDATE with a CASE over room_no instead of a query per room
+    result = session.execute(
+        update(Room)
+        .where(Room.room_no.in_(room_prices))
+        .values(price=case(room_prices, value=Room.room_no))
+        .returning(Room.room_no, Room.price),
+        execution_options={"synchronize_session": False},
+    )
+    updated = result.all()
+    for room_no, price in updated:
+        print(f"Updated {room_no} with price ₹{price:g}")
 
     session.commit()
     session.close()
-    print(f"Successfully updated {updated_count} rooms with rent prices!")
+    print(f"Successfully updated {len(updated)} rooms with rent prices!")
 
 if __name__ == "__main__":
     update_room_prices()